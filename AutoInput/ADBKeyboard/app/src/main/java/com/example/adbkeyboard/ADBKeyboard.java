@@ -1,14 +1,43 @@
 package com.example.adbkeyboard;
 
+import android.app.Activity;
 import android.content.BroadcastReceiver;
 import android.content.Context;
 import android.content.Intent;
 import android.util.Base64;
+import android.view.inputmethod.ExtractedText;
+import android.view.inputmethod.ExtractedTextRequest;
+import android.view.inputmethod.InputConnection;
 import android.view.inputmethod.InputMethodManager;
 import android.widget.Toast;
+import java.io.File;
+import java.io.FileInputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.Reader;
 import java.nio.charset.StandardCharsets;
+import java.util.HashMap;
+import java.util.Map;
+import java.util.TreeMap;
 
 public class ADBKeyboard extends BroadcastReceiver {
+    // Chunks further ahead than this are dropped unacknowledged; the sender retransmits them
+    private static final int MAX_PENDING = 256;
+
+    // Characters committed at a time when typing a pushed file
+    private static final int FILE_PIECE_CHARS = 4096;
+
+    // Editor the input method is bound to; ADBKeyboardService sets it in onStartInput and clears it in onFinishInput
+    static volatile InputConnection inputConnection;
+
+    // Delivery state of sequenced sends, keyed by the sender's session id
+    private static final Map<String, Session> sessions = new HashMap<>();
+
+    private static class Session {
+        int next = 0;
+        final TreeMap<Integer, String> pending = new TreeMap<>();
+    }
+
     @Override
     public void onReceive(Context context, Intent intent) {
         if (intent.getAction() == null) return;
@@ -18,21 +47,249 @@ public class ADBKeyboard extends BroadcastReceiver {
                 String base64Text = intent.getStringExtra("msg");
                 if (base64Text != null) {
                     try {
-                        // Decode base64 text
-                        byte[] decodedBytes = Base64.decode(base64Text, Base64.DEFAULT);
-                        String decodedText = new String(decodedBytes, StandardCharsets.UTF_8);
-                        
-                        // Get the input method manager
-                        InputMethodManager imm = (InputMethodManager) context.getSystemService(Context.INPUT_METHOD_SERVICE);
-                        if (imm != null) {
-                            // Send the decoded text
-                            imm.sendText(decodedText);
-                        }
+                        sendText(context, decode(base64Text));
                     } catch (Exception e) {
                         Toast.makeText(context, "Error decoding text: " + e.getMessage(), Toast.LENGTH_SHORT).show();
                     }
                 }
                 break;
+            case "ADB_INPUT_SEQ":
+                receiveSequenced(context, intent);
+                break;
+            case "ADB_INPUT_FILE":
+                receiveFile(context, intent);
+                break;
+            case "ADB_EDIT":
+                receiveEdits(intent);
+                break;
+        }
+    }
+
+    private static String decode(String base64Text) {
+        byte[] decodedBytes = Base64.decode(base64Text, Base64.DEFAULT);
+        return new String(decodedBytes, StandardCharsets.UTF_8);
+    }
+
+    private static void sendText(Context context, String text) {
+        // Get the input method manager
+        InputMethodManager imm = (InputMethodManager) context.getSystemService(Context.INPUT_METHOD_SERVICE);
+        if (imm != null) {
+            // Send the decoded text
+            imm.sendText(text);
+        }
+    }
+
+    /**
+     * Commits sequence-numbered chunks in order and acknowledges each one.
+     *
+     * Chunks may arrive out of order or more than once; later chunks wait
+     * until the gap before them is filled and repeats are only acknowledged
+     * again. The reply "ACK <session> <seq> <next>" goes back to `am
+     * broadcast` as result data, where <next> is the first sequence number
+     * not committed yet. "BUSY" asks for a retransmit later and "NAK"
+     * rejects the chunk.
+     */
+    private void receiveSequenced(Context context, Intent intent) {
+        String session = intent.getStringExtra("session");
+        String base64Text = intent.getStringExtra("msg");
+        int seq = intent.getIntExtra("seq", -1);
+        if (session == null || base64Text == null || seq < 0) {
+            setResultCode(Activity.RESULT_CANCELED);
+            setResultData("NAK " + session + " " + seq + " missing session, seq or msg");
+            return;
+        }
+
+        int next;
+        try {
+            String text = decode(base64Text);
+            synchronized (sessions) {
+                Session state = sessions.get(session);
+                if (state == null) {
+                    state = new Session();
+                    sessions.clear();  // Only the latest sender's session is kept
+                    sessions.put(session, state);
+                }
+                if (seq >= state.next + MAX_PENDING) {
+                    // The sender retransmits once the window has moved on
+                    setResultCode(Activity.RESULT_CANCELED);
+                    setResultData("BUSY " + session + " " + seq);
+                    return;
+                }
+                if (seq >= state.next && !state.pending.containsKey(seq)) {
+                    state.pending.put(seq, text);
+                }
+                while (!state.pending.isEmpty() && state.pending.firstKey() == state.next) {
+                    sendText(context, state.pending.pollFirstEntry().getValue());
+                    state.next++;
+                }
+                next = state.next;
+            }
+        } catch (Exception e) {
+            setResultCode(Activity.RESULT_CANCELED);
+            setResultData("NAK " + session + " " + seq + " " + e.getMessage());
+            return;
+        }
+        setResultCode(Activity.RESULT_OK);
+        setResultData("ACK " + session + " " + seq + " " + next);
+    }
+
+    /**
+     * Types the UTF-8 text file pushed by the sender with adb sync (extra "path").
+     *
+     * The file is read on a background thread and committed in pieces of
+     * FILE_PIECE_CHARS characters, so a whole book never has to fit in one
+     * string or one Intent. With the boolean extra "delete" the file is
+     * removed afterwards. The reply is "OK <characters committed>" or
+     * "ERR <characters committed> <message>".
+     */
+    private void receiveFile(final Context context, Intent intent) {
+        final String path = intent.getStringExtra("path");
+        final boolean delete = intent.getBooleanExtra("delete", false);
+        if (path == null) {
+            setResultCode(Activity.RESULT_CANCELED);
+            setResultData("ERR 0 missing path");
+            return;
+        }
+
+        final PendingResult pending = goAsync();
+        new Thread(new Runnable() {
+            @Override
+            public void run() {
+                File file = new File(path);
+                long committed = 0;
+                char[] buffer = new char[FILE_PIECE_CHARS];
+                try (Reader reader = new InputStreamReader(new FileInputStream(file), StandardCharsets.UTF_8)) {
+                    int carry = 0;
+                    int read;
+                    while ((read = reader.read(buffer, carry, buffer.length - carry)) != -1) {
+                        int length = carry + read;
+                        // Never split a surrogate pair between two pieces
+                        int end = Character.isHighSurrogate(buffer[length - 1]) ? length - 1 : length;
+                        sendText(context, new String(buffer, 0, end));
+                        committed += Character.codePointCount(buffer, 0, end);
+                        carry = length - end;
+                        if (carry > 0) {
+                            buffer[0] = buffer[length - 1];
+                        }
+                    }
+                    if (carry > 0) {
+                        sendText(context, new String(buffer, 0, carry));
+                        committed += carry;
+                    }
+                    pending.setResultCode(Activity.RESULT_OK);
+                    pending.setResultData("OK " + committed);
+                } catch (IOException e) {
+                    pending.setResultCode(Activity.RESULT_CANCELED);
+                    pending.setResultData("ERR " + committed + " " + e.getMessage());
+                } finally {
+                    if (delete) {
+                        file.delete();
+                    }
+                    pending.finish();
+                }
+            }
+        }).start();
+    }
+
+    /**
+     * Applies an edit script at the cursor (extra "ops"), for resending only what changed.
+     *
+     * Tokens are separated by ';': "L<n>" and "R<n>" move the cursor n UTF-16
+     * units left or right, "D<n>" deletes n units before the cursor and
+     * "I<base64>" inserts UTF-8 text. A script that would move or delete past
+     * either end of the text is rejected before anything changes, and the rest
+     * runs as one batch edit. The reply is "OK <tokens applied>" or
+     * "ERR <tokens applied> <message>".
+     */
+    private void receiveEdits(Intent intent) {
+        String ops = intent.getStringExtra("ops");
+        InputConnection ic = inputConnection;
+        if (ops == null || ic == null) {
+            setResultCode(Activity.RESULT_CANCELED);
+            setResultData("ERR 0 " + (ops == null ? "missing ops" : "no input field"));
+            return;
+        }
+
+        String[] tokens = ops.split(";");
+        char[] kinds = new char[tokens.length];
+        int[] counts = new int[tokens.length];
+        String[] inserts = new String[tokens.length];
+        // How much text the script needs on each side of the cursor
+        int before = 0, after = 0, neededBefore = 0, neededAfter = 0;
+        try {
+            for (int i = 0; i < tokens.length; i++) {
+                kinds[i] = tokens[i].charAt(0);
+                String argument = tokens[i].substring(1);
+                switch (kinds[i]) {
+                    case 'I':
+                        inserts[i] = decode(argument);
+                        before += inserts[i].length();
+                        break;
+                    case 'L':
+                        counts[i] = Integer.parseInt(argument);
+                        before -= counts[i];
+                        after += counts[i];
+                        break;
+                    case 'R':
+                        counts[i] = Integer.parseInt(argument);
+                        before += counts[i];
+                        after -= counts[i];
+                        break;
+                    case 'D':
+                        counts[i] = Integer.parseInt(argument);
+                        before -= counts[i];
+                        break;
+                    default:
+                        throw new IllegalArgumentException("unknown edit " + tokens[i]);
+                }
+                neededBefore = Math.max(neededBefore, -before);
+                neededAfter = Math.max(neededAfter, -after);
+            }
+        } catch (RuntimeException e) {
+            setResultCode(Activity.RESULT_CANCELED);
+            setResultData("ERR 0 " + e.getMessage());
+            return;
+        }
+        CharSequence textBefore = ic.getTextBeforeCursor(neededBefore, 0);
+        CharSequence textAfter = ic.getTextAfterCursor(neededAfter, 0);
+        ExtractedText extracted = ic.getExtractedText(new ExtractedTextRequest(), 0);
+        if (textBefore == null || textBefore.length() < neededBefore
+                || textAfter == null || textAfter.length() < neededAfter || extracted == null) {
+            setResultCode(Activity.RESULT_CANCELED);
+            setResultData("ERR 0 the text around the cursor is not the text sent before");
+            return;
+        }
+
+        int cursor = extracted.startOffset + extracted.selectionEnd;
+        int applied = 0;
+        ic.beginBatchEdit();
+        try {
+            ic.setSelection(cursor, cursor);
+            for (int i = 0; i < tokens.length; i++) {
+                switch (kinds[i]) {
+                    case 'I':
+                        ic.commitText(inserts[i], 1);
+                        cursor += inserts[i].length();
+                        break;
+                    case 'L':
+                        cursor -= counts[i];
+                        ic.setSelection(cursor, cursor);
+                        break;
+                    case 'R':
+                        cursor += counts[i];
+                        ic.setSelection(cursor, cursor);
+                        break;
+                    case 'D':
+                        ic.deleteSurroundingText(counts[i], 0);
+                        cursor -= counts[i];
+                        break;
+                }
+                applied++;
+            }
+        } finally {
+            ic.endBatchEdit();
         }
+        setResultCode(Activity.RESULT_OK);
+        setResultData("OK " + applied);
     }
-} 
\ No newline at end of file
+}
\ No newline at end of file
@@ -0,0 +1,32 @@
+package com.example.adbkeyboard;
+
+import android.inputmethodservice.InputMethodService;
+import android.view.inputmethod.EditorInfo;
+
+/**
+ * The input method ADBKeyboard runs as.
+ *
+ * Cursor edits (ADB_EDIT) need the InputConnection of the focused text field,
+ * which only the bound input method gets. It is handed to the receiver in
+ * ADBKeyboard.inputConnection while a field has focus and taken back when
+ * input finishes, so edits never reach a field that has lost focus.
+ */
+public class ADBKeyboardService extends InputMethodService {
+    @Override
+    public void onStartInput(EditorInfo attribute, boolean restarting) {
+        super.onStartInput(attribute, restarting);
+        ADBKeyboard.inputConnection = getCurrentInputConnection();
+    }
+
+    @Override
+    public void onFinishInput() {
+        ADBKeyboard.inputConnection = null;
+        super.onFinishInput();
+    }
+
+    @Override
+    public void onDestroy() {
+        ADBKeyboard.inputConnection = null;
+        super.onDestroy();
+    }
+}
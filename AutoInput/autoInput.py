@@ -1,46 +1,40 @@
+import time
+
+# Taken before the other imports, so the time to first frame includes them
+STARTED_AT = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog, simpledialog
 import subprocess
 import os
 import sys
-import json
 import threading
-import time
 from tkinter import font as tkfont
-import re
-import platform
-import base64
-import urllib.parse
-import unicodedata
-import random
-import winsound  # For Windows sound effects
-
-class TextEncoder:
-    @staticmethod
-    def encode_for_adb(text):
-        """Encode text for ADB command, handling all special characters and languages."""
-        # First normalize the text to handle any special Unicode characters
-        text = unicodedata.normalize('NFC', text)
-        
-        # Convert to base64 to handle all characters safely
-        text_bytes = text.encode('utf-8')
-        base64_text = base64.b64encode(text_bytes).decode('utf-8')
-        
-        # Create the ADB command with base64 encoded text
-        return f'adb shell am broadcast -a ADB_INPUT_B64 --es msg "{base64_text}"'
+import queue
 
-    @staticmethod
-    def encode_single_char(char):
-        """Encode a single character for ADB command."""
-        char = unicodedata.normalize('NFC', char)
-        char_bytes = char.encode('utf-8')
-        base64_char = base64.b64encode(char_bytes).decode('utf-8')
-        return f'adb shell am broadcast -a ADB_INPUT_B64 --es msg "{base64_char}"'
-
-    @staticmethod
-    def decode_preview(text):
-        """Decode text for preview, showing exactly how it will appear."""
-        return text
+from autoinput import (
+    AdbClient,
+    AdbError,
+    DEFAULT_ROUND_TRIP,
+    DeviceInfoCache,
+    DeviceWatcher,
+    FanOutSender,
+    KeyScript,
+    Metrics,
+    NullMetrics,
+    PersistentAdbShell,
+    RateMemory,
+    SendEstimate,
+    SendRecorder,
+    SendJournal,
+    SubprocessAdbShell,
+    TextChunker,
+    TextEncoder,
+    TextPages,
+    check_adb_installation,
+    make_timing_model,
+    open_text_sources,
+)
 
 class SuccessNotification(tk.Toplevel):
     def __init__(self, parent):
@@ -100,17 +94,66 @@ class SuccessNotification(tk.Toplevel):
     def play_success_sound(self):
         """Play a success sound effect."""
         try:
-            # Play a simple beep sound
+            # Play a simple beep sound (winsound only exists on Windows)
+            import winsound
             winsound.PlaySound("SystemExclamation", winsound.SND_ALIAS)
         except:
             # If sound fails, just continue silently
             pass
 
 class AutoInputApp:
+    # Send mode labels shown in the UI, mapped to TextChunker modes ("auto" sizes chunks
+    # adaptively and "push" transfers the text as a file)
+    SEND_MODES = {
+        "Per character": None,
+        "Chunks of N characters": "chars",
+        "Word boundaries": "words",
+        "Line boundaries": "lines",
+        "As fast as possible (adaptive)": "auto",
+        "Push as a file (large text)": "push",
+    }
+    # Unacknowledged chunks in flight per device with acknowledged delivery
+    ACK_WINDOW = 8
+    # Timing model labels mapped to autoinput.timing model names
+    TIMING_MODES = {
+        "Uniform": "uniform",
+        "Log-normal (human-like)": "lognormal",
+        "Bigram-aware": "bigram",
+    }
+    # Worker threads queue UI updates; the Tk thread applies them at most this often
+    UI_UPDATE_INTERVAL_MS = 33
+    # Directory for the send path trace and Prometheus metrics; unset turns instrumentation off
+    METRICS_DIR_ENV = "AUTOINPUT_METRICS_DIR"
+    TRACE_DIR_ENV = "AUTOINPUT_TRACE_DIR"
+    STATUS_ICONS = {
+        "info": "🟢",    # Green circle
+        "warning": "🟡",  # Yellow circle
+        "error": "🔴",    # Red circle
+        "typing": "⌨️",   # Keyboard
+        "success": "✅",  # Check mark
+        "stopped": "⏹️"   # Stop symbol
+    }
+    STATUS_BACKGROUNDS = {
+        "info": "#f8f9fa",     # Light gray
+        "warning": "#fff3cd",   # Light yellow
+        "error": "#f8d7da",     # Light red
+        "typing": "#cce5ff",    # Light blue
+        "success": "#d4edda",   # Light green
+        "stopped": "#e2e3e5"    # Light gray
+    }
+    STATUS_COLORS = {
+        "info": "#495057",      # Dark gray
+        "warning": "#856404",   # Dark yellow
+        "error": "#721c24",     # Dark red
+        "typing": "#004085",    # Dark blue
+        "success": "#155724",   # Dark green
+        "stopped": "#383d41"    # Dark gray
+    }
+
     def __init__(self, root):
         self.root = root
         self.root.title("Auto Input for Android")
-        self.root.geometry("800x600")
+        self.root.geometry("800x790")
         self.root.configure(bg="#f0f0f0")
         
         # Initialize variables
@@ -123,6 +166,34 @@ class AutoInputApp:
         self.max_typing_speed = tk.DoubleVar(value=150)  # Default max speed: 150ms
         self.is_typing = False
         self.typing_thread = None
+        self.use_persistent_shell = tk.BooleanVar(value=True)
+        self.use_acknowledged = tk.BooleanVar(value=False)
+        self.use_key_markup = tk.BooleanVar(value=False)
+        self.send_mode = tk.StringVar(value="Per character")
+        self.chunk_size = tk.IntVar(value=500)
+        self.timing_mode = tk.StringVar(value="Uniform")
+        self.devices = {}
+        self.device_events = queue.Queue()
+        self.device_watcher = None
+        self.adb_probe = None
+        self.first_frame_seconds = None
+        self.adb = AdbClient()
+        self.device_shells = {}
+        self.device_cache = DeviceInfoCache(self.adb)
+        self.journal = SendJournal()
+        self.rate_memory = RateMemory()
+        self.metrics_dir = os.environ.get(self.METRICS_DIR_ENV)
+        self.metrics = self.create_metrics()
+        self.trace_dir = os.environ.get(self.TRACE_DIR_ENV)
+        # Opened on first use, see history
+        self.history_lock = threading.Lock()
+        self.history_store = None
+        self.history_opened = False
+        self.history_window = None
+        self.fanout = None
+        self.last_send_stats = None
+        self.ui_events = queue.Queue()
+        self.status_type = None
         
         # Set custom font
         self.custom_font = tkfont.Font(family="Segoe UI", size=10)
@@ -245,6 +316,107 @@ class AutoInputApp:
         )
         self.speed_label.pack(pady=(5, 0))
         
+        # Timing model control
+        timing_frame = ttk.Frame(speed_frame)
+        timing_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(
+            timing_frame,
+            text="Timing Model:",
+            font=self.custom_font
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.timing_mode_combo = ttk.Combobox(
+            timing_frame,
+            textvariable=self.timing_mode,
+            values=list(self.TIMING_MODES),
+            state="readonly",
+            width=24
+        )
+        self.timing_mode_combo.pack(side=tk.LEFT)
+        
+        # Transport selection
+        self.persistent_shell_toggle = ttk.Checkbutton(
+            speed_frame,
+            text="Use persistent ADB shell",
+            variable=self.use_persistent_shell
+        )
+        self.persistent_shell_toggle.pack(pady=(5, 0))
+        
+        # Acknowledged, pipelined delivery (needs ADBKeyboard with ADB_INPUT_SEQ)
+        self.acknowledged_toggle = ttk.Checkbutton(
+            speed_frame,
+            text="Acknowledged delivery for chunked modes",
+            variable=self.use_acknowledged
+        )
+        self.acknowledged_toggle.pack(pady=(5, 0))
+        
+        # Special keys such as {TAB} or {ENTER} in the text, sent as key events
+        self.key_markup_toggle = ttk.Checkbutton(
+            speed_frame,
+            text="Type {ENTER}, {TAB}, {BACKSPACE} ... as keys",
+            variable=self.use_key_markup
+        )
+        self.key_markup_toggle.pack(pady=(5, 0))
+        
+        # Send mode control
+        mode_frame = ttk.Frame(speed_frame)
+        mode_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(
+            mode_frame,
+            text="Send Mode:",
+            font=self.custom_font
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.send_mode_combo = ttk.Combobox(
+            mode_frame,
+            textvariable=self.send_mode,
+            values=list(self.SEND_MODES),
+            state="readonly",
+            width=24
+        )
+        self.send_mode_combo.pack(side=tk.LEFT)
+        
+        ttk.Label(
+            mode_frame,
+            text="Chunk Size (chars):",
+            font=self.custom_font
+        ).pack(side=tk.LEFT, padx=(20, 10))
+        
+        self.chunk_size_spinbox = ttk.Spinbox(
+            mode_frame,
+            from_=1,
+            to=100000,
+            increment=100,
+            textvariable=self.chunk_size,
+            width=8
+        )
+        self.chunk_size_spinbox.pack(side=tk.LEFT)
+        
+        # Create target device frame
+        devices_frame = ttk.LabelFrame(self.main_frame, text="Target Devices", padding="10")
+        devices_frame.pack(fill=tk.X, pady=(0, 20))
+        
+        # One row per connected device; selected rows receive the text
+        self.device_tree = ttk.Treeview(
+            devices_frame,
+            columns=("model", "progress", "speed", "status"),
+            height=3,
+            selectmode="extended"
+        )
+        self.device_tree.heading("#0", text="Serial")
+        self.device_tree.heading("model", text="Model")
+        self.device_tree.heading("progress", text="Progress")
+        self.device_tree.heading("speed", text="Speed")
+        self.device_tree.heading("status", text="Status")
+        self.device_tree.column("#0", width=160)
+        self.device_tree.column("model", width=160)
+        self.device_tree.column("progress", width=80, anchor=tk.E)
+        self.device_tree.column("speed", width=100, anchor=tk.E)
+        self.device_tree.column("status", width=200)
+        self.device_tree.pack(fill=tk.X)
+        
         # Create button frame
         button_frame = ttk.Frame(self.main_frame)
         button_frame.pack(fill=tk.X, pady=(0, 10))
@@ -267,6 +439,34 @@ class AutoInputApp:
         )
         self.send_button.pack(side=tk.LEFT)
         
+        # Send changes button (types only what changed since the last send)
+        self.send_changes_button = ttk.Button(
+            button_frame,
+            text="Send Changes",
+            command=self.send_changes,
+            style="Accent.TButton",
+            state="disabled"
+        )
+        self.send_changes_button.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Send file button (streams the file without loading it into the editor)
+        self.send_file_button = ttk.Button(
+            button_frame,
+            text="Send File...",
+            command=self.send_file,
+            style="Accent.TButton"
+        )
+        self.send_file_button.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # History button (sends stored texts and snippets without the editor)
+        self.history_button = ttk.Button(
+            button_frame,
+            text="History...",
+            command=self.show_history,
+            style="Accent.TButton"
+        )
+        self.history_button.pack(side=tk.LEFT, padx=(10, 0))
+        
         # Stop button
         self.stop_button = ttk.Button(
             button_frame,
@@ -359,101 +559,298 @@ class AutoInputApp:
         # Configure styles
         self.configure_styles()
         
-        # Start periodic connection check
-        self.start_connection_check()
+        # Apply UI updates posted by worker threads
+        self.root.after(self.UI_UPDATE_INTERVAL_MS, self.process_ui_events)
         
-        # Initial connection check
+        # Report when the window is first painted
+        self.root.bind("<Map>", self.on_first_map, add="+")
+        
+        # Initial connection check; runs in the background so the window shows right away
         self.check_adb_connection()
 
+    def on_first_map(self, event):
+        if event.widget is not self.root:
+            return
+        self.root.unbind("<Map>")
+        # Idle callbacks run after the pending redraws, i.e. once the first frame is painted
+        self.root.after_idle(self.report_first_frame)
+
+    def report_first_frame(self):
+        """Record the time from process start to the first painted window."""
+        self.first_frame_seconds = time.perf_counter() - STARTED_AT
+        if self.metrics:
+            self.metrics.observe("first_frame", self.first_frame_seconds)
+        print(f"AutoInput: first frame after {self.first_frame_seconds * 1000:.0f} ms", file=sys.stderr)
+
     def configure_styles(self):
         style = ttk.Style()
         style.configure("Accent.TButton", font=self.custom_font)
         style.configure("TLabelframe.Label", font=self.custom_font)
+        
+        # One status frame style per status type, so switching is just a style name change
+        for status_type, background in self.STATUS_BACKGROUNDS.items():
+            style.configure(f"{status_type}.Status.TFrame", background=background)
+
+    def post_ui(self, callback, *args):
+        """Run callback on the Tk thread at the next UI refresh (safe to call from any thread)."""
+        self.ui_events.put((callback, args))
+
+    def post_progress(self, result):
+        """FanOutSender progress hook: only queues the result for the Tk thread."""
+        self.ui_events.put((None, result))
+
+    def create_metrics(self):
+        """Send path instrumentation, on when METRICS_DIR_ENV names a directory for its output."""
+        if not self.metrics_dir:
+            return NullMetrics()
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            return Metrics(os.path.join(self.metrics_dir, "trace.jsonl"))
+        except OSError:
+            return NullMetrics()
+
+    def create_recorder(self, options):
+        """A trace of one send, when TRACE_DIR_ENV names a directory to keep it in (see `autoinput replay`)."""
+        if not self.trace_dir:
+            return None
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            path = os.path.join(self.trace_dir, time.strftime("send-%Y%m%d-%H%M%S.jsonl"))
+            return SendRecorder(
+                path,
+                chunk_mode=options["chunk_mode"],
+                chunk_size=options["chunk_size"],
+                delay_range=options["delay_range"],
+                timing=options["timing"]
+            )
+        except OSError:
+            return None
+
+    @property
+    def history(self):
+        """open_history(), run once by whichever thread needs the history first."""
+        with self.history_lock:
+            if not self.history_opened:
+                self.history_store = self.open_history()
+                self.history_opened = True
+        return self.history_store
+
+    def open_history(self):
+        """The store of sent texts and snippets, or None if it cannot be opened."""
+        # Imported here: sqlite3 is slow to import and the window comes up before the history is needed
+        import sqlite3
+
+        from autoinput.history import TextStore
+
+        try:
+            return TextStore()
+        except (OSError, sqlite3.Error):
+            return None
+
+    def remember_text(self, text):
+        """Keep a text about to be sent in the history (runs on the worker thread); returns its key or None.
 
-    def start_connection_check(self):
-        def check_loop():
+        The send goes on without it if the history cannot be used.
+        """
+        if self.history is None:
+            return None
+        # Already loaded by open_history()
+        import sqlite3
+
+        try:
+            return self.history.add(text)
+        except sqlite3.Error:
+            return None
+
+    def write_metrics(self):
+        if self.metrics:
+            try:
+                self.metrics.write_prometheus(os.path.join(self.metrics_dir, "autoinput.prom"))
+            except OSError:
+                pass
+
+    def process_ui_events(self):
+        """Apply queued UI updates, rendering progress at most once per refresh."""
+        progressed = {}
+        started = time.perf_counter()
+        handled = 0
+        try:
+            while True:
+                try:
+                    callback, payload = self.ui_events.get_nowait()
+                except queue.Empty:
+                    break
+                handled += 1
+                if callback is None:
+                    # Results are live objects, so the latest one per device is enough
+                    progressed[payload.serial] = payload
+                    continue
+                # Keep the order of progress and other updates
+                if progressed:
+                    self.render_progress(progressed.values())
+                    progressed = {}
+                callback(*payload)
+            if progressed:
+                self.render_progress(progressed.values())
+        finally:
+            if handled and self.metrics:
+                self.metrics.observe("ui", time.perf_counter() - started)
+            self.root.after(self.UI_UPDATE_INTERVAL_MS, self.process_ui_events)
+
+    def start_device_watcher(self):
+        """Watch for device changes in the background and apply them on the Tk thread."""
+        self.device_watcher = DeviceWatcher(self.adb, self.device_events, self.device_cache)
+        self.device_watcher.start()
+        self.root.after(100, self.process_device_events)
+
+    def process_device_events(self):
+        """Drain device events posted by the watcher thread (runs on the Tk thread)."""
+        latest = None
+        try:
             while True:
-                self.check_adb_connection(silent=True)
-                time.sleep(5)  # Check every 5 seconds
+                latest = self.device_events.get_nowait()
+        except queue.Empty:
+            pass
         
-        thread = threading.Thread(target=check_loop, daemon=True)
-        thread.start()
+        # Only the most recent snapshot matters
+        if latest is not None:
+            kind, payload = latest
+            if kind == "devices":
+                self.apply_devices(payload, silent=True)
+            else:
+                self.show_adb_unavailable(silent=True)
+        self.root.after(100, self.process_device_events)
 
-    def get_device_info(self):
+    def get_device_info(self, serial=None):
+        """Return cached properties for serial (default: the first online device)."""
         try:
-            # Get device model
-            model = subprocess.run(
-                ["adb", "shell", "getprop", "ro.product.model"],
-                capture_output=True,
-                text=True
-            ).stdout.strip()
-            
-            # Get Android version
-            version = subprocess.run(
-                ["adb", "shell", "getprop", "ro.build.version.release"],
-                capture_output=True,
-                text=True
-            ).stdout.strip()
-            
-            # Get device ID
-            devices = subprocess.run(
-                ["adb", "devices"],
-                capture_output=True,
-                text=True
-            ).stdout.strip()
-            
-            device_id = re.search(r'(\S+)\s+device', devices)
-            device_id = device_id.group(1) if device_id else "Unknown"
-            
-            return {
-                "model": model,
-                "version": version,
-                "id": device_id
-            }
+            if serial is None:
+                serials = [serial for serial, state in self.adb.devices() if state == "device"]
+                if not serials:
+                    return {}
+                serial = serials[0]
+            return self.device_cache.get(serial)
         except Exception:
             return {}
 
     def check_adb_connection(self, silent=False):
+        """Probe adb and the connected devices on a worker thread; results are applied on the Tk thread."""
+        if self.adb_probe is not None and self.adb_probe.is_alive():
+            return
+        if not self.devices:
+            self.device_label.config(text="Connecting...")
+            self.update_status("Connecting to ADB...", "info")
+        self.refresh_button.config(state="disabled")
+        self.adb_probe = threading.Thread(target=self.probe_adb, args=(silent,), daemon=True)
+        self.adb_probe.start()
+
+    def probe_adb(self, silent):
+        """Start the adb server if needed and read every online device (runs on a worker thread)."""
+        started = time.perf_counter()
         try:
-            result = subprocess.run(
-                ["adb", "devices"],
-                capture_output=True,
-                text=True
-            )
-            
-            if "device" in result.stdout:
-                self.is_connected = True
-                self.device_info = self.get_device_info()
-                device_text = f"Connected: {self.device_info.get('model', 'Unknown')} (Android {self.device_info.get('version', 'Unknown')})"
-                self.device_label.config(text=device_text)
+            if not check_adb_installation():
+                self.post_ui(self.show_adb_unavailable, silent)
+                return
+            online = [serial for serial, state in self.adb.devices() if state == "device"]
+            self.device_cache.retain(online)
+            devices = {serial: self.get_device_info(serial) for serial in online}
+        except AdbError:
+            self.post_ui(self.show_adb_unavailable, silent)
+            return
+        finally:
+            self.post_ui(self.refresh_button.config, {"state": "normal"})
+        if self.metrics:
+            self.metrics.observe("adb_probe", time.perf_counter() - started)
+        self.post_ui(self.apply_devices, devices, silent)
+        if self.device_watcher is None:
+            # Follow device connect/disconnect events once adb is known to be up
+            self.post_ui(self.start_device_watcher)
+
+    def apply_devices(self, devices, silent=False):
+        """Update connection state and widgets from a {serial: info} mapping."""
+        self.devices = devices
+        self.update_device_tree()
+        
+        # Drop warm shells of devices that went away
+        for serial in set(self.device_shells) - set(devices):
+            self.device_shells.pop(serial).close()
+        if devices:
+            self.is_connected = True
+            self.device_info = devices[sorted(devices)[0]]
+            device_text = self.describe_device(self.device_info)
+            if len(devices) > 1:
+                device_text += f" +{len(devices) - 1} more"
+            self.device_label.config(text=device_text)
+            if not self.is_typing:
                 self.update_status("Device connected", "success")
-                self.send_button.config(state="normal")
-                self.preview_button.config(state="normal")
-            else:
-                self.is_connected = False
-                self.device_label.config(text="No device connected")
-                self.update_status("Waiting for device...", "warning")
-                self.send_button.config(state="disabled")
-                self.preview_button.config(state="disabled")
-                if not silent:
-                    messagebox.showwarning(
-                        "Connection Error",
-                        "Please connect your Android device and ensure ADB is enabled"
-                    )
-        except FileNotFoundError:
+                self.set_send_buttons("normal")
+        else:
             self.is_connected = False
-            self.device_label.config(text="ADB not found")
-            self.update_status("ADB not installed", "error")
-            self.send_button.config(state="disabled")
-            self.preview_button.config(state="disabled")
+            self.device_info = {}
+            self.device_label.config(text="No device connected")
+            self.update_status("Waiting for device...", "warning")
+            self.set_send_buttons("disabled")
             if not silent:
-                messagebox.showerror(
-                    "Error",
-                    "ADB is not installed or not in system PATH"
+                messagebox.showwarning(
+                    "Connection Error",
+                    "Please connect your Android device and ensure ADB is enabled"
                 )
 
+    def update_device_tree(self):
+        """Sync the target device table with the connected devices, keeping the selection."""
+        for serial in self.device_tree.get_children():
+            if serial not in self.devices:
+                self.device_tree.delete(serial)
+        for serial in sorted(self.devices):
+            model = self.devices[serial].get("model") or "Unknown"
+            if self.device_tree.exists(serial):
+                self.device_tree.set(serial, "model", model)
+            else:
+                self.device_tree.insert("", tk.END, iid=serial, text=serial, values=(model, "", "", "Ready"))
+        if self.devices and not self.device_tree.selection():
+            self.device_tree.selection_set(sorted(self.devices)[0])
+
+    def get_device_shell(self, serial, persistent=True):
+        """Return the shell transport for serial, keeping persistent shells warm between sends."""
+        if not persistent:
+            return SubprocessAdbShell(serial)
+        shell = self.device_shells.get(serial)
+        if shell is None:
+            shell = PersistentAdbShell(serial, client=self.adb)
+            self.device_shells[serial] = shell
+        return shell
+
+    @staticmethod
+    def describe_device(info):
+        details = [f"Android {info.get('version') or 'Unknown'}"]
+        if info.get("sdk"):
+            details.append(f"SDK {info['sdk']}")
+        if info.get("abi"):
+            details.append(info["abi"])
+        if info.get("density"):
+            details.append(f"{info['density']} dpi")
+        return f"Connected: {info.get('model') or 'Unknown'} ({', '.join(details)})"
+
+    def show_adb_unavailable(self, silent=False):
+        self.is_connected = False
+        self.devices = {}
+        self.device_info = {}
+        self.device_label.config(text="ADB not found")
+        self.update_status("ADB not installed", "error")
+        self.set_send_buttons("disabled")
+        if not silent:
+            messagebox.showerror(
+                "Error",
+                "ADB is not installed or not in system PATH.\n\n"
+                "Please install Android Platform Tools and add it to your system PATH."
+            )
+
+    def input_text(self):
+        """The text to send, read from the editor once."""
+        return self.text_input.get("1.0", "end-1c").strip()
+
     def show_preview(self):
-        text = self.text_input.get("1.0", tk.END).strip()
+        text = self.input_text()
         if not text:
             messagebox.showwarning("Warning", "Please enter some text to preview")
             return
@@ -463,7 +860,7 @@ class AutoInputApp:
             
         self.preview_window = tk.Toplevel(self.root)
         self.preview_window.title("Text Preview")
-        self.preview_window.geometry("400x300")
+        self.preview_window.geometry("520x420")
         
         # Create preview frame
         preview_frame = ttk.Frame(self.preview_window, padding="20")
@@ -476,6 +873,28 @@ class AutoInputApp:
             font=self.custom_font
         ).pack(pady=(0, 10))
         
+        # Send estimates, filled in once they are computed in the background
+        estimates_label = ttk.Label(preview_frame, text="Calculating send estimates...", justify=tk.LEFT)
+        estimates_label.pack(anchor=tk.W, pady=(0, 10))
+        
+        # Close button
+        ttk.Button(
+            preview_frame,
+            text="Close",
+            command=self.preview_window.destroy
+        ).pack(side=tk.BOTTOM, pady=(10, 0))
+        
+        # Only one page of the text is in the widget at a time
+        pages = TextPages(text)
+        page_frame = ttk.Frame(preview_frame)
+        page_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(10, 0))
+        previous_button = ttk.Button(page_frame, text="< Previous")
+        previous_button.pack(side=tk.LEFT)
+        next_button = ttk.Button(page_frame, text="Next >")
+        next_button.pack(side=tk.RIGHT)
+        page_label = ttk.Label(page_frame, anchor=tk.CENTER)
+        page_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
         # Preview text
         preview_text = scrolledtext.ScrolledText(
             preview_frame,
@@ -483,15 +902,53 @@ class AutoInputApp:
             font=self.custom_font
         )
         preview_text.pack(fill=tk.BOTH, expand=True)
-        preview_text.insert("1.0", text)
-        preview_text.config(state="disabled")
         
-        # Close button
-        ttk.Button(
-            preview_frame,
-            text="Close",
-            command=self.preview_window.destroy
-        ).pack(pady=(10, 0))
+        def show_page(index):
+            preview_text.config(state="normal")
+            preview_text.delete("1.0", tk.END)
+            preview_text.insert("1.0", pages.page(index))
+            preview_text.config(state="disabled")
+            first, last = pages.span(index)
+            page_label.config(text=f"Page {index + 1} of {len(pages)} (characters {first + 1}-{last} of {len(text)})")
+            previous_button.config(state="normal" if index > 0 else "disabled",
+                                   command=lambda: show_page(index - 1))
+            next_button.config(state="normal" if index + 1 < len(pages) else "disabled",
+                               command=lambda: show_page(index + 1))
+        
+        show_page(0)
+        
+        # Read the settings here; the estimate runs on a worker thread
+        try:
+            chunk_size = self.chunk_size.get()
+        except tk.TclError:  # Spinbox left empty or invalid
+            chunk_size = 500
+        delay_range = (self.min_typing_speed.get(), self.max_typing_speed.get())
+        round_trip = DEFAULT_ROUND_TRIP
+        if self.last_send_stats:
+            means = [stats["mean_ms"] for stats in self.last_send_stats.values() if stats["count"]]
+            if means:
+                round_trip = max(means) / 1000.0
+        threading.Thread(
+            target=self.estimate_send,
+            args=(text, chunk_size, delay_range, round_trip, self.preview_window, estimates_label),
+            daemon=True
+        ).start()
+
+    def estimate_send(self, text, chunk_size, delay_range, round_trip, window, label):
+        """Compute send estimates for the preview (runs on a worker thread)."""
+        estimate = SendEstimate(text, chunk_size, delay_range, round_trip)
+        self.post_ui(self.show_estimates, estimate, window, label)
+
+    def show_estimates(self, estimate, window, label):
+        if window is not self.preview_window or not window.winfo_exists():
+            return  # The preview was closed in the meantime
+        lines = [f"{estimate.graphemes} characters, {estimate.bytes} bytes as UTF-8"]
+        for name, chunk_mode in self.SEND_MODES.items():
+            if chunk_mode == "auto":
+                lines.append(f"{name}: depends on the device")
+            else:
+                lines.append(f"{name}: {estimate.describe(chunk_mode)}")
+        label.config(text="\n".join(lines))
 
     def update_speed_labels(self, *args):
         """Update the speed labels when sliders are moved."""
@@ -509,50 +966,17 @@ class AutoInputApp:
 
     def update_status(self, message, status_type="info"):
         """Update status with different types of messages."""
-        # Update status icon based on type
-        icons = {
-            "info": "🟢",    # Green circle
-            "warning": "🟡",  # Yellow circle
-            "error": "🔴",    # Red circle
-            "typing": "⌨️",   # Keyboard
-            "success": "✅",  # Check mark
-            "stopped": "⏹️"   # Stop symbol
-        }
-        
-        # Update status frame background based on type
-        backgrounds = {
-            "info": "#f8f9fa",     # Light gray
-            "warning": "#fff3cd",   # Light yellow
-            "error": "#f8d7da",     # Light red
-            "typing": "#cce5ff",    # Light blue
-            "success": "#d4edda",   # Light green
-            "stopped": "#e2e3e5"    # Light gray
-        }
-        
-        # Update status text color based on type
-        colors = {
-            "info": "#495057",      # Dark gray
-            "warning": "#856404",   # Dark yellow
-            "error": "#721c24",     # Dark red
-            "typing": "#004085",    # Dark blue
-            "success": "#155724",   # Dark green
-            "stopped": "#383d41"    # Dark gray
-        }
-        
-        # Update status frame background
-        self.status_frame.configure(style="Status.TFrame")
-        style = ttk.Style()
-        style.configure(
-            "Status.TFrame",
-            background=backgrounds.get(status_type, "#f8f9fa")
-        )
+        self.status_label.config(text=message)
+        if status_type == self.status_type:
+            return
+        self.status_type = status_type
         
-        # Update status icon and text
-        self.status_icon.config(text=icons.get(status_type, "🟢"))
-        self.status_label.config(
-            text=message,
-            foreground=colors.get(status_type, "#495057")
-        )
+        # Styles are created once in configure_styles; only switch between them
+        if status_type not in self.STATUS_BACKGROUNDS:
+            status_type = "info"
+        self.status_frame.configure(style=f"{status_type}.Status.TFrame")
+        self.status_icon.config(text=self.STATUS_ICONS[status_type])
+        self.status_label.config(foreground=self.STATUS_COLORS[status_type])
         
         # Show success message without auto-hiding
         if status_type == "success":
@@ -564,12 +988,21 @@ class AutoInputApp:
         """Hide the success message."""
         self.success_label.pack_forget()
 
+    def set_send_buttons(self, state):
+        """Enable or disable every control that starts a send."""
+        self.send_button.config(state=state)
+        # Only useful once something has been sent, with the cursor still after it
+        self.send_changes_button.config(state=state if self.last_sent_text else "disabled")
+        self.send_file_button.config(state=state)
+        self.preview_button.config(state=state)
+
     def stop_typing(self):
         """Stop the current typing operation."""
         self.is_typing = False
+        if self.fanout:
+            self.fanout.stop()
         self.stop_button.config(state="disabled")
-        self.send_button.config(state="normal")
-        self.preview_button.config(state="normal")
+        self.set_send_buttons("normal")
         self.update_status("Typing stopped", "stopped")
         self.progress_bar.pack_forget()  # Hide progress bar
 
@@ -578,94 +1011,438 @@ class AutoInputApp:
         if self.show_notifications.get():
             SuccessNotification(self.root)
 
-    def type_text(self, text):
-        """Type text character by character with random delays within the specified range."""
+    def update_device_progress(self, result):
+        """Show the progress of one device in the device list."""
+        if result.error:
+            status = f"Failed: {result.error}"
+        elif result.reconnecting:
+            status = f"Reconnecting (retry {result.retries})"
+        elif result.finished:
+            status = "Stopped" if result.stopped else "Done"
+        else:
+            status = "Typing"
+        progress = result.progress
+        self.device_tree.item(result.serial, values=(
+            self.device_tree.set(result.serial, "model"),
+            f"{result.sent_chars} chars" if progress is None else f"{progress * 100:.0f}%",
+            f"{result.chars_per_second:.1f} chars/s",
+            status
+        ))
+
+    def render_progress(self, results):
+        """Show progress of the given devices and of the whole fleet (runs on the Tk thread)."""
+        for result in results:
+            if self.device_tree.exists(result.serial):
+                self.update_device_progress(result)
+        if not self.is_typing or self.fanout is None:
+            return
+        
+        # Streamed input has no known length, so report what has been sent
+        results = self.fanout.results.values()
+        sent_chars = sum(r.sent_chars for r in results)
+        fractions = [r.progress for r in results]
+        if None not in fractions:
+            self.progress_var.set(sum(fractions) / len(fractions) * 100)
+        self.update_status(
+            f"Typing: {sent_chars} characters sent "
+            f"({self.fanout.aggregate_rate():.1f} chars/s across {len(results)} device(s))",
+            "typing"
+        )
+
+    def type_text(self, text, serials, options, path=None):
+        """Type text character by character with random delays within the specified range.
+
+        Runs on a worker thread: every serial gets its own worker; in bulk
+        modes the text is sent as chunked broadcasts back to back instead.
+        With `path` the file is streamed to the devices and `text` is
+        ignored; with options["stored"] the text is read from the history
+        here and, in bulk modes, sent as its cached broadcasts. Settings
+        come in `options` and all UI updates go through
+        post_ui(), since Tk must only be used from its own thread.
+        """
+        use_persistent_shell = options["persistent"]
+        transport_label = "persistent shell" if use_persistent_shell else "subprocess per command"
+        chunk_mode = options["chunk_mode"]
+        if options["ack_window"] and chunk_mode is not None:
+            transport_label = f"acknowledged, window {options['ack_window']}"
+        if chunk_mode == "push":
+            transport_label = "pushed as a file"
+        previous = options.get("previous")
+        if previous is not None:
+            transport_label = "changes only"
+        keys = options.get("keys")
+        stored = options.get("stored")
+        timing = make_timing_model(options["timing"], options["delay_range"])
+        recorder = self.create_recorder(options)
+        remembered = None
+        
+        try:
+            controllers = None
+            rate_keys = {}
+            if chunk_mode == "auto":
+                # Start every device from the rate remembered for its model
+                chunk_mode = "chars"
+                transport_label = "adaptive"
+                rate_keys = {serial: self.rate_key(serial) for serial in serials}
+                controllers = {serial: self.rate_memory.controller(key) for serial, key in rate_keys.items()}
+            if stored is not None:
+                if keys or controllers or options["ack_window"] or chunk_mode not in TextChunker.MODES:
+                    # Only bulk broadcasts are cached; the other modes send the text itself
+                    text = self.history.get(stored)
+                    stored = None
+                    if text is None:
+                        raise ValueError("The text is no longer in the history")
+            elif path is None and not keys:
+                remembered = self.remember_text(text)
+
+            self.fanout = FanOutSender(
+                {serial: self.get_device_shell(serial, use_persistent_shell) for serial in serials},
+                chunk_mode=chunk_mode,
+                chunk_size=options["chunk_size"],
+                on_progress=self.post_progress,
+                timing=timing,
+                ack_window=options["ack_window"],
+                journal=self.journal,
+                metrics=self.metrics,
+                controllers=controllers,
+                recorder=recorder
+            )
+            if previous is not None:
+                results = self.fanout.run_edits(previous, text)
+            elif keys:
+                results = self.fanout.run_keys(text)
+            elif stored is not None:
+                results = self.fanout.run_payload(
+                    self.history.payload(stored, chunk_mode, options["chunk_size"]),
+                    job_id=self.journal.digest_job_id(stored),
+                    resume=options["resume"]
+                )
+            elif path is None:
+                results = self.fanout.run(text, resume=options["resume"])
+            else:
+                sources = open_text_sources(path, len(serials))
+                results = self.fanout.run_sources(
+                    dict(zip(serials, sources)),
+                    job_id=self.journal.file_job_id(path),
+                    resume=options["resume"]
+                )
+            self.last_send_stats = {serial: result.stats.summary() for serial, result in results.items()}
+            for serial, key in rate_keys.items():
+                if results[serial].adaptive:
+                    self.rate_memory.remember(key, results[serial].adaptive)
+            
+            used_key = options["stored"] if options.get("stored") is not None else remembered
+            if used_key is not None and any(result.completed for result in results.values()):
+                self.history.used(used_key)
+            failed = [result for result in results.values() if result.error]
+            if failed:
+                self.post_ui(self.update_status, f"Error sending text to {len(failed)}/{len(results)} device(s)", "error")
+                error_msg = "\n".join(f"{result.serial}: {result.error}" for result in failed)
+                if any(isinstance(result.error, subprocess.CalledProcessError) for result in failed):
+                    error_msg += "\n\nPlease ensure ADBKeyboard is installed and set as the default keyboard on your device."
+                if previous is None and not keys:
+                    error_msg += "\n\nSend the same text again to resume where it stopped."
+                self.post_ui(messagebox.showerror, "Error", f"Failed to send text:\n{error_msg}")
+            elif self.is_typing:  # Only update status if typing wasn't stopped
+                unit = "char" if chunk_mode is None else "chunk"
+                if len(results) == 1:
+                    result = next(iter(results.values()))
+                    message = f"Text sent successfully! {result.stats.describe(transport_label, unit)}"
+                    if result.timing.targets:
+                        message += f"; {result.timing.describe()}"
+                    if result.delivery:
+                        message += f"; {result.delivery.retransmits} chunk(s) retransmitted"
+                    if result.adaptive:
+                        message += f"; {result.adaptive.describe()}"
+                    if result.edits:
+                        message = f"Changes sent successfully! {result.edits.describe()}"
+                    if result.keys:
+                        message = f"Text sent successfully! {result.keys.describe()}"
+                else:
+                    message = (
+                        f"Text sent to {len(results)} devices! "
+                        f"{self.fanout.aggregate_rate():.1f} chars/s across the fleet"
+                    )
+                self.post_ui(self.update_status, message, "success")
+                if path is None and not keys:
+                    self.last_sent_text = text if stored is None else self.history.get(stored)
+                
+        except Exception as e:
+            self.post_ui(self.update_status, "Error sending text", "error")
+            self.post_ui(messagebox.showerror, "Error", f"An unexpected error occurred: {str(e)}")
+        finally:
+            if recorder:
+                recorder.close()
+            self.write_metrics()
+            self.post_ui(self.finish_typing)
+
+    def rate_key(self, serial):
+        """Device model key for remembered adaptive rates (runs on the worker thread)."""
+        try:
+            return self.rate_memory.device_key(self.device_cache.get(serial))
+        except AdbError:
+            return serial
+
+    def finish_typing(self):
+        """Reset the controls once a send is over."""
+        self.is_typing = False
+        self.stop_button.config(state="disabled")
+        self.set_send_buttons("normal")
+        self.progress_bar.pack_forget()  # Hide progress bar
+
+    def selected_serials(self):
+        """Return the selected target devices, warning the user if there are none."""
+        if not self.is_connected:
+            messagebox.showerror("Error", "No Android device connected")
+            return []
+        serials = [serial for serial in self.device_tree.selection() if serial in self.devices]
+        if not serials:
+            messagebox.showwarning("Warning", "Please select at least one target device")
+        return serials
+
+    def ask_resume(self, job_id, serials):
+        """Offer to resume an interrupted send; returns True, False or None to cancel."""
+        offsets = [self.journal.offset(job_id, serial)[0] for serial in serials]
+        if not any(offsets):
+            return False
+        return messagebox.askyesnocancel(
+            "Resume",
+            f"An earlier send of this text stopped on {sum(1 for offset in offsets if offset)} device(s), "
+            f"after up to {max(offsets)} characters.\n\n"
+            "Resume where it left off? Choose No to start over."
+        )
+
+    def start_typing(self, text, serials, path=None, resume=False, previous=None, stored=None):
         self.is_typing = True
         self.stop_button.config(state="normal")
-        self.send_button.config(state="disabled")
-        self.preview_button.config(state="disabled")
+        self.set_send_buttons("disabled")
         
         # Show progress bar
         self.progress_bar.pack(side=tk.LEFT)
         self.progress_var.set(0)
+        self.update_status("Typing...", "typing")
         
+        # Read the settings here; the worker must not touch Tk variables
         try:
-            total_chars = len(text)
-            for i, char in enumerate(text, 1):
-                if not self.is_typing:
-                    break
-                    
-                # Update progress
-                progress = (i / total_chars) * 100
-                self.progress_var.set(progress)
-                self.update_status(f"Typing: {i}/{total_chars} characters", "typing")
-                
-                # Send single character
-                command = self.text_encoder.encode_single_char(char)
-                result = subprocess.run(command, shell=True, capture_output=True, text=True)
-                
-                if result.returncode != 0:
-                    raise subprocess.CalledProcessError(result.returncode, command, result.stderr)
-                
-                # Generate random delay within the specified range
-                min_delay = self.min_typing_speed.get()
-                max_delay = self.max_typing_speed.get()
-                delay = random.uniform(min_delay, max_delay)
-                
-                # Wait for the random delay
-                time.sleep(delay / 1000.0)  # Convert ms to seconds
-                
-            if self.is_typing:  # Only update status if typing wasn't stopped
-                self.update_status("Text sent successfully!", "success")
-                self.last_sent_text = text
-                
-        except subprocess.CalledProcessError as e:
-            self.update_status("Error sending text", "error")
-            error_msg = str(e)
-            if "ADBKeyboard" in error_msg:
-                error_msg += "\n\nPlease ensure ADBKeyboard is installed and set as the default keyboard on your device."
-            messagebox.showerror("Error", f"Failed to send text: {error_msg}")
-        except Exception as e:
-            self.update_status("Error sending text", "error")
-            messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
-        finally:
-            self.is_typing = False
-            self.stop_button.config(state="disabled")
-            self.send_button.config(state="normal")
-            self.preview_button.config(state="normal")
-            self.progress_bar.pack_forget()  # Hide progress bar
+            chunk_size = self.chunk_size.get()
+        except tk.TclError:  # Spinbox left empty or invalid
+            chunk_size = 500
+        options = {
+            "persistent": self.use_persistent_shell.get(),
+            "chunk_mode": self.SEND_MODES.get(self.send_mode.get()),
+            "chunk_size": chunk_size,
+            "delay_range": (self.min_typing_speed.get(), self.max_typing_speed.get()),
+            "timing": self.TIMING_MODES.get(self.timing_mode.get(), "uniform"),
+            "ack_window": self.ACK_WINDOW if self.use_acknowledged.get() else None,
+            "resume": resume,
+            "previous": previous,
+            "keys": self.use_key_markup.get() and path is None and previous is None,
+            "stored": stored,
+        }
+        
+        # Start typing in a separate thread
+        self.typing_thread = threading.Thread(target=self.type_text, args=(text, serials, options, path))
+        self.typing_thread.daemon = True
+        self.typing_thread.start()
 
     def send_text(self):
         if not self.is_connected:
             messagebox.showerror("Error", "No Android device connected")
             return
             
-        text = self.text_input.get("1.0", tk.END).strip()
+        text = self.input_text()
         if not text:
             messagebox.showwarning("Warning", "Please enter some text")
             return
-            
-        # Start typing in a separate thread
-        self.typing_thread = threading.Thread(target=self.type_text, args=(text,))
-        self.typing_thread.daemon = True
-        self.typing_thread.start()
+        
+        serials = self.selected_serials()
+        if not serials:
+            return
+        if self.use_key_markup.get():
+            # Key sends are not journaled; check the markup before anything is typed
+            try:
+                KeyScript.from_markup(text)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            self.start_typing(text, serials)
+            return
+        resume = self.ask_resume(self.journal.text_job_id(text), serials)
+        if resume is not None:
+            self.start_typing(text, serials, resume=resume)
 
-def check_adb_installation():
-    try:
-        subprocess.run(["adb", "version"], capture_output=True, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
+    def send_changes(self):
+        """Edit the text sent last time into the current text, typing only what changed.
 
-def main():
-    if not check_adb_installation():
-        messagebox.showerror(
-            "Error",
-            "ADB is not installed or not in system PATH.\n\n"
-            "Please install Android Platform Tools and add it to your system PATH."
+        The device cursor must still be right after the text sent last time.
+        """
+        text = self.input_text()
+        if text == self.last_sent_text:
+            messagebox.showinfo("Send Changes", "Nothing has changed since the last send")
+            return
+        serials = self.selected_serials()
+        if serials:
+            self.start_typing(text, serials, previous=self.last_sent_text)
+
+    def send_file(self):
+        """Stream a text file to the selected devices without loading it into the editor."""
+        serials = self.selected_serials()
+        if not serials:
+            return
+        path = filedialog.askopenfilename(
+            title="Send File",
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
         )
-        return
+        if not path:
+            return
+        resume = self.ask_resume(self.journal.file_job_id(path), serials)
+        if resume is not None:
+            self.start_typing(None, serials, path, resume)
+
+    def show_history(self):
+        """List sent texts and snippets; a stored text is sent without going through the editor."""
+        if self.history is None:
+            from autoinput.history import DEFAULT_HISTORY_PATH
+
+            messagebox.showerror("Error", f"The history could not be opened: {DEFAULT_HISTORY_PATH}")
+            return
+        if self.history_window and self.history_window.winfo_exists():
+            self.history_window.lift()
+            return
+        
+        window = self.history_window = tk.Toplevel(self.root)
+        window.title("History and Snippets")
+        window.geometry("680x420")
+        
+        history_frame = ttk.Frame(window, padding="20")
+        history_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Size of the store, filled in by refresh()
+        size_label = ttk.Label(history_frame, font=self.custom_font)
+        size_label.pack(anchor=tk.W, pady=(0, 10))
+        
+        # Action buttons
+        history_buttons = ttk.Frame(history_frame)
+        history_buttons.pack(side=tk.BOTTOM, fill=tk.X, pady=(10, 0))
+        
+        # Snippets first, then the texts sent most recently
+        tree = ttk.Treeview(
+            history_frame,
+            columns=("name", "size", "used", "preview"),
+            show="headings",
+            selectmode="browse"
+        )
+        tree.heading("name", text="Snippet")
+        tree.heading("size", text="Size")
+        tree.heading("used", text="Last Used")
+        tree.heading("preview", text="Text")
+        tree.column("name", width=110)
+        tree.column("size", width=90, anchor=tk.E)
+        tree.column("used", width=120)
+        tree.column("preview", width=320)
+        tree.pack(fill=tk.BOTH, expand=True)
+        
+        def refresh():
+            tree.delete(*tree.get_children())
+            for entry in self.history.entries():
+                tree.insert("", tk.END, iid=entry["key"], values=(
+                    entry["name"] or "",
+                    f"{entry['chars']} chars",
+                    time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"])),
+                    entry["preview"].replace("\n", " ")
+                ))
+            size_label.config(text=f"{self.history.size() / 1024 / 1024:.1f} MB of "
+                                   f"{self.history.max_bytes / 1024 / 1024:.0f} MB used")
+        
+        def selected_key():
+            selection = tree.selection()
+            if not selection:
+                messagebox.showwarning("Warning", "Please select a text", parent=window)
+                return None
+            return selection[0]
+        
+        def send():
+            key = selected_key()
+            if key:
+                self.send_stored(key)
+        
+        def load():
+            key = selected_key()
+            text = self.history.get(key) if key else None
+            if text is not None:
+                self.text_input.delete("1.0", tk.END)
+                self.text_input.insert("1.0", text)
+        
+        def add_file():
+            path = filedialog.askopenfilename(
+                title="Add File",
+                filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+                parent=window
+            )
+            if path:
+                threading.Thread(
+                    target=self.add_history_file,
+                    args=(path, lambda: window.winfo_exists() and refresh()),
+                    daemon=True
+                ).start()
+        
+        def rename():
+            key = selected_key()
+            if not key:
+                return
+            name = simpledialog.askstring(
+                "Snippet Name",
+                "Name for this text (leave empty to make it plain history again):",
+                initialvalue=tree.set(key, "name"),
+                parent=window
+            )
+            if name is not None:
+                self.history.rename(key, name.strip())
+                refresh()
+        
+        def delete():
+            key = selected_key()
+            if key and messagebox.askyesno("Delete", "Delete this text from the history?", parent=window):
+                self.history.remove(key)
+                refresh()
         
+        for text, command in (("Send", send), ("Load into Editor", load), ("Add File...", add_file),
+                              ("Name...", rename), ("Delete", delete)):
+            ttk.Button(history_buttons, text=text, command=command).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(history_buttons, text="Close", command=window.destroy).pack(side=tk.RIGHT)
+        tree.bind("<Double-1>", lambda event: send())
+        
+        refresh()
+
+    def add_history_file(self, path, on_added):
+        """Store a text file in the history (runs on a worker thread, so large files do not block Tk)."""
+        # Already loaded: the history window is open
+        import sqlite3
+
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.history.add(f.read())
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.post_ui(messagebox.showerror, "Error", f"Could not add the file: {e}")
+            return
+        self.post_ui(on_added)
+
+    def send_stored(self, key):
+        """Send a text from the history to the selected devices, reading it on the worker thread."""
+        if self.is_typing:
+            messagebox.showwarning("Warning", "Wait for the current send to finish")
+            return
+        serials = self.selected_serials()
+        if not serials:
+            return
+        resume = False
+        if not self.use_key_markup.get():
+            resume = self.ask_resume(self.journal.digest_job_id(key), serials)
+        if resume is not None:
+            self.start_typing(None, serials, resume=resume, stored=key)
+
+def main():
+    # ADB is checked in the background once the window is up
     root = tk.Tk()
     app = AutoInputApp(root)
     root.mainloop()
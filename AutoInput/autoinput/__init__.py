@@ -0,0 +1,72 @@
+"""Type text on Android devices through ADBKeyboard, from a GUI, a script or the command line."""
+from .adaptive import AimdController, RateMemory
+from .adb import AdbClient, AdbError, DeviceInfoCache, DeviceWatcher, check_adb_installation
+from .diff import EditScript
+from .encoding import MAX_BROADCAST_COMMAND_LENGTH, TextChunker, TextEncoder, iter_graphemes, last_safe_boundary
+from .fanout import DeviceSendResult, FanOutSender
+from .journal import SendJournal
+from .keys import KEYCODES, KeyScript
+from .metrics import Metrics, NullMetrics
+from .plan import CommandPlan
+from .preview import DEFAULT_ROUND_TRIP, SendEstimate, TextPages
+from .protocol import AdbBroadcastTransport, DeliveryStats, ProtocolError, WindowedSender, parse_ack, send_acknowledged
+from .sender import SEND_MODES, Sender
+from .stream import TextSource, open_text_sources, skip_chars, skip_units, tee_source
+from .timing import TIMING_MODELS, BigramTiming, DeadlineScheduler, LogNormalTiming, TimingDrift, UniformTiming, make_timing_model
+from .trace import ReplayResult, SendRecorder, TraceReplayer, load_trace
+from .transport import CommandTimeout, LatencyStats, PersistentAdbShell, SubprocessAdbShell
+
+__all__ = [
+    "AdbBroadcastTransport",
+    "AdbClient",
+    "AdbError",
+    "AimdController",
+    "BigramTiming",
+    "CommandPlan",
+    "CommandTimeout",
+    "DEFAULT_ROUND_TRIP",
+    "DeadlineScheduler",
+    "DeliveryStats",
+    "DeviceInfoCache",
+    "DeviceSendResult",
+    "DeviceWatcher",
+    "EditScript",
+    "FanOutSender",
+    "KEYCODES",
+    "KeyScript",
+    "LatencyStats",
+    "LogNormalTiming",
+    "MAX_BROADCAST_COMMAND_LENGTH",
+    "Metrics",
+    "NullMetrics",
+    "PersistentAdbShell",
+    "ProtocolError",
+    "RateMemory",
+    "ReplayResult",
+    "SEND_MODES",
+    "SendEstimate",
+    "SendJournal",
+    "SendRecorder",
+    "Sender",
+    "SubprocessAdbShell",
+    "TIMING_MODELS",
+    "TextChunker",
+    "TextEncoder",
+    "TextPages",
+    "TextSource",
+    "TimingDrift",
+    "TraceReplayer",
+    "UniformTiming",
+    "WindowedSender",
+    "check_adb_installation",
+    "iter_graphemes",
+    "last_safe_boundary",
+    "load_trace",
+    "make_timing_model",
+    "open_text_sources",
+    "parse_ack",
+    "send_acknowledged",
+    "skip_chars",
+    "skip_units",
+    "tee_source",
+]
@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import time
+
+DEFAULT_RATES_PATH = os.path.join(os.path.expanduser("~"), ".autoinput", "rates.json")
+
+class AimdController:
+    """Finds the fastest pace a device keeps up with by growing and shrinking chunks (AIMD).
+
+    After every confirmed broadcast the chunk size doubles until the first
+    sign of congestion (slow start), and afterwards grows by `increase`
+    characters. Congestion is a failed broadcast, or a round trip longer than
+    `max_rtt` seconds or `rtt_tolerance` times the smoothed round trip; it
+    cuts the chunk size by `decrease`. Once chunks are down to `min_chunk`
+    characters, congestion doubles a delay between broadcasts instead (from
+    `interval_step` seconds up to `max_interval`), which shrinks again by a
+    sixteenth per confirmed broadcast.
+    """
+
+    def __init__(self, chunk_size=1, interval=0.0, threshold=None, min_chunk=1, max_chunk=2000, increase=4,
+                 decrease=0.5, max_rtt=0.25, rtt_tolerance=3.0, interval_step=0.002, max_interval=0.5):
+        self.chunk_size = max(min_chunk, min(max_chunk, int(chunk_size)))
+        self.interval = interval
+        self.threshold = threshold
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.increase = increase
+        self.decrease = decrease
+        self.max_rtt = max_rtt
+        self.rtt_tolerance = rtt_tolerance
+        self.interval_step = interval_step
+        self.max_interval = max_interval
+        self.lock = threading.Lock()
+        self.srtt = None
+        self.rate = 0.0
+        self.average_chunk = float(self.chunk_size)
+        self.samples = 0
+        self.slowdowns = 0
+        self.last_success = None
+
+    @classmethod
+    def from_state(cls, state, **kwargs):
+        """Controller that starts at a remembered chunk size and interval, skipping slow start."""
+        chunk_size = int(state.get("chunk_size", 1))
+        return cls(chunk_size, float(state.get("interval", 0.0)), threshold=chunk_size, **kwargs)
+
+    def state(self):
+        """Converged settings worth remembering: the average chunk size rather than the last one."""
+        with self.lock:
+            return {
+                "chunk_size": max(self.min_chunk, round(self.average_chunk)),
+                "interval": self.interval,
+                "rate": self.rate,
+            }
+
+    def on_success(self, rtt, chars):
+        """A broadcast of `chars` characters was confirmed after `rtt` seconds."""
+        with self.lock:
+            self.samples += 1
+            congested = rtt > self.max_rtt or (self.srtt is not None and rtt > self.rtt_tolerance * self.srtt)
+            self.srtt = rtt if self.srtt is None else self.srtt + (rtt - self.srtt) / 8
+            # Achieved rate from one confirmation to the next, including the work between broadcasts
+            now = time.monotonic()
+            spent = rtt + self.interval if self.last_success is None else now - self.last_success
+            self.last_success = now
+            rate = chars / spent if spent > 0 else 0.0
+            self.rate = rate if self.samples == 1 else self.rate + (rate - self.rate) / 8
+            if congested:
+                self.slow_down()
+            elif self.interval > 0:
+                self.interval -= self.interval / 16
+                if self.interval < self.interval_step / 2:
+                    self.interval = 0.0
+            elif self.threshold is None or self.chunk_size < self.threshold:
+                limit = self.max_chunk if self.threshold is None else self.threshold
+                self.chunk_size = min(limit, self.chunk_size * 2)
+            else:
+                self.chunk_size = min(self.max_chunk, self.chunk_size + self.increase)
+            self.average_chunk += (self.chunk_size - self.average_chunk) / 16
+
+    def on_failure(self):
+        """A broadcast failed; back off before it is retried."""
+        with self.lock:
+            self.slow_down()
+
+    @property
+    def throttled(self):
+        """True once congestion has pushed the delay between broadcasts to its maximum."""
+        return self.chunk_size <= self.min_chunk and self.interval >= self.max_interval
+
+    def slow_down(self):
+        self.slowdowns += 1
+        if self.chunk_size > self.min_chunk:
+            self.chunk_size = max(self.min_chunk, int(self.chunk_size * self.decrease))
+            self.threshold = self.chunk_size
+        else:
+            self.interval = min(self.max_interval, max(self.interval_step, self.interval * 2))
+
+    def describe(self):
+        return (f"adaptive rate {self.rate:.0f} chars/s, {self.chunk_size} chars per broadcast, "
+                f"{self.interval * 1000:.0f} ms apart, {self.slowdowns} slowdowns")
+
+class RateMemory:
+    """Remembers the settings AimdController converged to for each device model.
+
+    The next send to the same kind of device starts from there instead of
+    probing from one character again. Sends shorter than `min_samples`
+    broadcasts are not remembered, since they had no time to converge.
+    """
+
+    def __init__(self, path=DEFAULT_RATES_PATH, min_samples=20):
+        self.path = path
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+        self.rates = None
+
+    @staticmethod
+    def device_key(info):
+        """Key for a DeviceInfoCache entry: manufacturer, model and Android version."""
+        key = " ".join(part for part in (info.get("manufacturer"), info.get("model")) if part)
+        if info.get("version"):
+            key += f" (Android {info['version']})"
+        return key or info.get("id", "")
+
+    def load(self):
+        with self.lock:
+            return self._load()
+
+    def _load(self):
+        if self.rates is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.rates = json.load(f)
+            except (OSError, ValueError):
+                self.rates = {}
+        return self.rates
+
+    def controller(self, key, **kwargs):
+        """AimdController for a device model, seeded with its remembered rate if there is one."""
+        state = self.load().get(key)
+        if state:
+            return AimdController.from_state(state, **kwargs)
+        return AimdController(**kwargs)
+
+    def remember(self, key, controller):
+        if controller.samples < self.min_samples:
+            return
+        with self.lock:
+            self._load()[key] = dict(controller.state(), updated=time.time())
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.rates, f, indent=2)
+                os.replace(temp_path, self.path)
+            except OSError:
+                # Losing a remembered rate only costs a slower start next time
+                pass
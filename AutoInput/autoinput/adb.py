@@ -0,0 +1,307 @@
+import os
+import re
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+class AdbError(Exception):
+    """Raised when the adb server rejects a request or closes the connection."""
+
+class AdbClient:
+    """Client for the adb server's smart-socket protocol (localhost:5037 by default).
+
+    Talks to the already-running adb server directly instead of spawning the
+    `adb` executable, so device queries and shell commands cost one local TCP
+    connection rather than a process.
+    """
+    # Largest DATA packet of the sync protocol
+    SYNC_DATA_MAX = 64 * 1024
+
+    def __init__(self, host="127.0.0.1", port=None, timeout=10.0):
+        self.host = host
+        self.port = port or int(os.environ.get("ANDROID_ADB_SERVER_PORT", 5037))
+        self.timeout = timeout
+
+    def connect(self):
+        try:
+            return socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise AdbError(f"Cannot reach adb server on {self.host}:{self.port}: {e}")
+
+    @staticmethod
+    def send_request(sock, request):
+        data = request.encode("utf-8")
+        sock.sendall(f"{len(data):04x}".encode("ascii") + data)
+
+    @staticmethod
+    def read_exact(sock, size):
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise AdbError("adb server closed the connection")
+            data += chunk
+        return data
+
+    @classmethod
+    def read_string(cls, sock):
+        """Read a hex length-prefixed string as sent by the adb server."""
+        size = int(cls.read_exact(sock, 4), 16)
+        return cls.read_exact(sock, size).decode("utf-8", errors="replace")
+
+    @classmethod
+    def read_status(cls, sock):
+        status = cls.read_exact(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(cls.read_string(sock))
+        raise AdbError(f"Unexpected adb server response: {status!r}")
+
+    @staticmethod
+    def read_all(sock):
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def host_request(self, request):
+        """Send a host: service request and return its length-prefixed reply."""
+        with self.connect() as sock:
+            self.send_request(sock, request)
+            self.read_status(sock)
+            return self.read_string(sock)
+
+    def version(self):
+        return int(self.host_request("host:version"), 16)
+
+    def devices(self):
+        """Return a list of (serial, state) tuples, like `adb devices`."""
+        return self.parse_devices(self.host_request("host:devices"))
+
+    @staticmethod
+    def parse_devices(payload):
+        devices = []
+        for line in payload.splitlines():
+            parts = line.split()
+            if len(parts) >= 2:
+                devices.append((parts[0], parts[1]))
+        return devices
+
+    def transport(self, serial=None):
+        """Open a connection bound to one device; the caller owns the socket."""
+        sock = self.connect()
+        try:
+            self.send_request(sock, f"host:transport:{serial}" if serial else "host:transport-any")
+            self.read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def open_service(self, service, serial=None):
+        sock = self.transport(serial)
+        try:
+            self.send_request(sock, service)
+            self.read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def shell(self, command, serial=None):
+        """Run a shell command on the device and return its output."""
+        with self.open_service(f"shell:{command}", serial) as sock:
+            return self.read_all(sock).decode("utf-8", errors="replace")
+
+    def open_shell(self, serial=None):
+        """Open a raw `sh` session whose stdin and stdout are the returned socket."""
+        return self.open_service("shell:sh", serial)
+
+    def push(self, blocks, remote_path, serial=None, mode=0o644):
+        """Stream an iterable of bytes to remote_path on the device, like `adb push`; returns the size.
+
+        Uses the sync protocol, so nothing is base64-encoded or passed on a
+        command line. If `blocks` raises, the connection is dropped and the
+        device discards the partial file.
+        """
+        size = 0
+        with self.open_service("sync:", serial) as sock:
+            spec = f"{remote_path},{0o100000 | mode}".encode("utf-8")
+            sock.sendall(b"SEND" + struct.pack("<I", len(spec)) + spec)
+            for block in blocks:
+                for start in range(0, len(block), self.SYNC_DATA_MAX):
+                    data = block[start:start + self.SYNC_DATA_MAX]
+                    sock.sendall(b"DATA" + struct.pack("<I", len(data)) + data)
+                    size += len(data)
+            sock.sendall(b"DONE" + struct.pack("<I", int(time.time())))
+            status = self.read_exact(sock, 4)
+            length = struct.unpack("<I", self.read_exact(sock, 4))[0]
+            if status == b"FAIL":
+                raise AdbError(f"push to {remote_path} failed: "
+                               f"{self.read_exact(sock, length).decode('utf-8', errors='replace')}")
+            if status != b"OKAY":
+                raise AdbError(f"Unexpected sync response: {status!r}")
+            sock.sendall(b"QUIT" + struct.pack("<I", 0))
+        return size
+
+    def open_track_devices(self):
+        """Open a host:track-devices stream; read updates with read_string()."""
+        sock = self.connect()
+        try:
+            self.send_request(sock, "host:track-devices")
+            self.read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        # Updates only arrive when something changes, so never time out
+        sock.settimeout(None)
+        return sock
+
+class DeviceInfoCache:
+    """Device properties keyed by serial, read with a single `getprop` call.
+
+    Entries stay cached until the serial disconnects (see `retain`), so
+    monitoring code can read device details without touching the device.
+    """
+    # Info field -> candidate getprop keys, first non-empty value wins
+    PROPERTIES = {
+        "model": ("ro.product.model",),
+        "manufacturer": ("ro.product.manufacturer",),
+        "version": ("ro.build.version.release",),
+        "sdk": ("ro.build.version.sdk",),
+        "abi": ("ro.product.cpu.abi",),
+        "density": ("ro.sf.lcd_density", "qemu.sf.lcd_density"),
+    }
+    PROP_LINE = re.compile(r"^\[(.+?)\]: \[(.*)\]$")
+
+    def __init__(self, client):
+        self.client = client
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def parse_getprop(cls, output):
+        props = {}
+        for line in output.splitlines():
+            match = cls.PROP_LINE.match(line.strip())
+            if match:
+                props[match.group(1)] = match.group(2)
+        return props
+
+    def fetch(self, serial):
+        """Read every property in one round trip and build the info dict."""
+        props = self.parse_getprop(self.client.shell("getprop", serial))
+        info = {"id": serial}
+        for field, keys in self.PROPERTIES.items():
+            info[field] = next((props[key] for key in keys if props.get(key)), "")
+        return info
+
+    def get(self, serial):
+        """Return cached info for serial, fetching it on first use."""
+        with self.lock:
+            info = self.entries.get(serial)
+        if info is None:
+            info = self.fetch(serial)
+            with self.lock:
+                self.entries[serial] = info
+        return info
+
+    def peek(self, serial):
+        with self.lock:
+            return self.entries.get(serial)
+
+    def retain(self, serials):
+        """Forget every serial that is no longer connected."""
+        with self.lock:
+            for serial in set(self.entries) - set(serials):
+                del self.entries[serial]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class DeviceWatcher:
+    """Follows the adb server's host:track-devices stream on a background thread.
+
+    Whenever the set of online devices changes, properties for new serials
+    are loaded into `cache` and a snapshot is put on `events` as
+    ("devices", {serial: info}). If the adb server goes away an
+    ("adb_unavailable", message) event is posted and the stream is reopened
+    with a growing backoff. The watcher never touches Tk widgets.
+    """
+
+    def __init__(self, client, events, cache, max_backoff=10.0):
+        self.client = client
+        self.events = events
+        self.cache = cache
+        self.max_backoff = max_backoff
+        self.running = False
+        self.socket = None
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.socket is not None:
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self):
+        backoff = 0.5
+        known = None
+        while self.running:
+            try:
+                self.socket = self.client.open_track_devices()
+                backoff = 0.5
+                while self.running:
+                    devices = AdbClient.parse_devices(AdbClient.read_string(self.socket))
+                    online = sorted(serial for serial, state in devices if state == "device")
+                    if online == known:
+                        continue
+                    known = online
+                    self.cache.retain(online)
+                    snapshot = {}
+                    for serial in online:
+                        try:
+                            snapshot[serial] = self.cache.get(serial)
+                        except AdbError:
+                            # Device vanished or is still booting; retried on the next change
+                            snapshot[serial] = {"id": serial}
+                    self.events.put(("devices", snapshot))
+            except (OSError, AdbError) as e:
+                if not self.running:
+                    break
+                known = None
+                self.cache.clear()
+                self.events.put(("adb_unavailable", str(e)))
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                if self.socket is not None:
+                    self.socket.close()
+                    self.socket = None
+
+def check_adb_installation():
+    """Check that an adb server is reachable, starting it with the adb binary if needed."""
+    try:
+        AdbClient().version()
+        return True
+    except AdbError:
+        pass
+    try:
+        subprocess.run(["adb", "start-server"], capture_output=True, check=True)
+        AdbClient().version()
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError, AdbError):
+        return False
@@ -0,0 +1,472 @@
+import argparse
+import random
+import sys
+import time
+
+from .adaptive import RateMemory
+from .adb import AdbClient, AdbError, DeviceInfoCache, check_adb_installation
+from .journal import SendJournal
+from .metrics import Metrics
+from .sender import SEND_MODES, Sender
+from .timing import TIMING_MODELS, BigramTiming, make_timing_model
+from .trace import SendRecorder, TraceReplayer, load_trace
+from .transport import PersistentAdbShell
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="autoinput",
+        description="Type text on Android devices through ADBKeyboard."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    send = commands.add_parser("send", help="type text on one or more devices")
+    source = send.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="UTF-8 text file to send ('-' reads stdin)")
+    source.add_argument("--text", help="text to send")
+    source.add_argument("--stored", metavar="NAME",
+                        help="send a text from the history: a snippet name or the start of its key")
+    send.add_argument("--serial", action="append",
+                      help="target device serial; repeat for several devices (default: all connected)")
+    send.add_argument("--mode", choices=list(SEND_MODES), default="char",
+                      help="one broadcast per character, bulk chunks, auto: as fast as each device "
+                           "keeps up, remembered per device model, or push: transfer the text as a file "
+                           "and type it with one broadcast (default: char)")
+    send.add_argument("--chunk-size", type=int, default=500,
+                      help="characters per chunk in bulk modes (default: 500)")
+    send.add_argument("--min-delay", type=float, default=50,
+                      help="minimum delay between characters in ms (default: 50)")
+    send.add_argument("--max-delay", type=float, default=150,
+                      help="maximum delay between characters in ms (default: 150)")
+    send.add_argument("--timing", choices=list(TIMING_MODELS), default="uniform",
+                      help="distribution of the delays between characters (default: uniform)")
+    send.add_argument("--timing-table",
+                      help='JSON file of per-bigram delays in ms, e.g. {"th": 80}, for --timing bigram')
+    send.add_argument("--seed", type=int, help="seed for the random delays, so they repeat from run to run")
+    send.add_argument("--ack-window", type=int, metavar="N",
+                      help="bulk modes: pipeline up to N chunks, each acknowledged by ADBKeyboard "
+                           "(needs ADBKeyboard with ADB_INPUT_SEQ)")
+    send.add_argument("--changes-from", metavar="PATH",
+                      help="UTF-8 file with the text sent last time: type only the changes from it, "
+                           "with the cursor still after that text (needs ADBKeyboard with ADB_EDIT)")
+    send.add_argument("--keys", action="store_true",
+                      help='interpret special keys in the text, e.g. "{TAB}", "{ENTER}" or "{BACKSPACE 3}" '
+                           '("{{" types a literal brace); text goes out in chunks of --chunk-size')
+    send.add_argument("--resume", action="store_true",
+                      help="continue an interrupted send of the same text or file where each device left off")
+    send.add_argument("--subprocess", action="store_true",
+                      help="spawn one adb process per command instead of a persistent shell "
+                           "(push mode still transfers the file through the adb server)")
+    send.add_argument("--metrics-jsonl", metavar="PATH",
+                      help="append a JSON line per timed stage and counter update to PATH")
+    send.add_argument("--metrics-prom", metavar="PATH",
+                      help="write stage histograms and counters to PATH in the Prometheus text format")
+    send.add_argument("--record", metavar="PATH",
+                      help="write every unit sent, with its time, device and outcome, to a JSONL trace "
+                           "for the replay command")
+    send.add_argument("--no-history", action="store_true", help="do not keep --text in the history")
+    send.add_argument("--quiet", action="store_true", help="do not print progress")
+
+    commands.add_parser("devices", help="list connected devices")
+
+    replay = commands.add_parser("replay", help="send a recorded trace again, e.g. as a load test")
+    replay.add_argument("trace", help="JSONL trace written by send --record")
+    pace = replay.add_mutually_exclusive_group()
+    pace.add_argument("--speed", type=float, default=1.0,
+                      help="replay N times faster than recorded (default: 1, the recorded pace)")
+    pace.add_argument("--max-speed", action="store_true", help="send back to back, ignoring the recorded timing")
+    replay.add_argument("--map", action="append", metavar="OLD=NEW",
+                        help="replay the events of trace device OLD on device NEW; repeat to drive "
+                             "several devices (default: every device replays its own events)")
+    replay.add_argument("--record", metavar="PATH", help="record the replay as a new trace")
+
+    history = commands.add_parser("history", help="list and manage sent texts and snippets (~/.autoinput/history.sqlite3)")
+    actions = history.add_subparsers(dest="action", required=True)
+    actions.add_parser("list", help="snippets first, then texts by most recent use")
+    add = actions.add_parser("add", help="store a text, optionally as a named snippet")
+    text = add.add_mutually_exclusive_group(required=True)
+    text.add_argument("--file", help="UTF-8 text file to store ('-' reads stdin)")
+    text.add_argument("--text", help="text to store")
+    add.add_argument("--name", help="snippet name for send --stored")
+    for action, description in (("show", "print a stored text"), ("remove", "delete a stored text")):
+        actions.add_parser(action, help=description).add_argument("reference", help="snippet name or key prefix")
+    name = actions.add_parser("name", help="name a stored text, making it a snippet")
+    name.add_argument("reference", help="snippet name or key prefix")
+    name.add_argument("name", help="new name ('' makes it plain history again)")
+
+    daemon = commands.add_parser("daemon", help="keep warm connections to all devices and take send jobs "
+                                                "over a Unix socket and/or localhost HTTP")
+    daemon.add_argument("--socket",
+                        help="Unix socket for JSON-line requests (default: ~/.autoinput/daemon.sock; '' to disable)")
+    daemon.add_argument("--http-port", type=int, metavar="PORT",
+                        help="also serve the HTTP job API on 127.0.0.1:PORT")
+    return parser
+
+def ensure_adb_server(client):
+    """Make sure the adb server answers, starting it with the adb binary only if needed."""
+    try:
+        client.version()
+        return True
+    except AdbError:
+        return check_adb_installation()
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+class ProgressPrinter:
+    """Prints aggregate progress to stderr at most every `interval` seconds."""
+
+    def __init__(self, sender, interval=0.2):
+        self.sender = sender
+        self.interval = interval
+        self.last_print = 0.0
+
+    def __call__(self, result):
+        now = time.monotonic()
+        if now - self.last_print < self.interval and not result.finished:
+            return
+        self.last_print = now
+        fanout = self.sender.fanout
+        results = fanout.results.values()
+        sent = sum(r.sent_chars for r in results)
+        sent_bytes = sum(r.sent_bytes for r in results)
+        progress = [r.progress for r in results]
+        done = f" ({min(progress) * 100:.0f}% on the slowest device)" if None not in progress else ""
+        sys.stderr.write(
+            f"\rSent {sent} characters, {format_bytes(sent_bytes)}{done}, "
+            f"{fanout.aggregate_rate():.1f} chars/s across {len(results)} device(s)"
+        )
+        sys.stderr.flush()
+
+def read_text(args, store=None):
+    """The whole text from --text, --stored or --file, for modes that cannot stream it."""
+    if args.text is not None:
+        return args.text
+    if getattr(args, "stored", None) is not None:
+        return store.get(store.resolve(args.stored))
+    if args.file == "-":
+        return sys.stdin.read()
+    with open(args.file, encoding="utf-8") as f:
+        return f.read()
+
+def cmd_send(args):
+    if args.text == "":
+        print("Nothing to send", file=sys.stderr)
+        return 1
+    if args.keys and args.changes_from:
+        print("--keys cannot be combined with --changes-from", file=sys.stderr)
+        return 2
+
+    client = AdbClient()
+    if not ensure_adb_server(client):
+        print("ADB is not installed or not in system PATH", file=sys.stderr)
+        return 1
+
+    delay_range = (args.min_delay, max(args.min_delay, args.max_delay))
+    try:
+        intervals = BigramTiming.load_intervals(args.timing_table) if args.timing_table else None
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"Error: cannot read timing table: {e}", file=sys.stderr)
+        return 1
+    rng = random.Random(args.seed) if args.seed is not None else None
+    recorder = None
+    if args.record:
+        try:
+            recorder = SendRecorder(
+                args.record,
+                mode=args.mode,
+                chunk_size=args.chunk_size,
+                delay_range=delay_range,
+                timing=args.timing,
+                seed=args.seed
+            )
+        except OSError as e:
+            print(f"Error: cannot open trace: {e}", file=sys.stderr)
+            return 1
+    metrics = None
+    if args.metrics_jsonl or args.metrics_prom:
+        try:
+            metrics = Metrics(args.metrics_jsonl)
+        except OSError as e:
+            print(f"Error: cannot open metrics trace: {e}", file=sys.stderr)
+            return 1
+
+    store = None
+    store_errors = ()
+    if args.stored is not None or (args.text is not None and not args.no_history):
+        # Imported here: sqlite3 is slow to import and only sends that use the history need it
+        import sqlite3
+
+        from .history import TextStore
+
+        store_errors = (sqlite3.Error,)
+        try:
+            store = TextStore()
+            # Kept even if the send fails, so it can be sent again with --stored
+            key = store.resolve(args.stored) if args.stored is not None else store.add(args.text)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error: cannot open history: {e}", file=sys.stderr)
+            return 1
+        except KeyError as e:
+            print(f"Error: {e.args[0]}", file=sys.stderr)
+            store.close()
+            return 1
+
+    sender = Sender(
+        serials=args.serial,
+        mode=args.mode,
+        chunk_size=args.chunk_size,
+        delay_range=delay_range,
+        persistent=not args.subprocess,
+        client=client,
+        timing=make_timing_model(args.timing, delay_range, intervals, rng),
+        ack_window=args.ack_window,
+        journal=SendJournal(),
+        metrics=metrics,
+        rate_memory=RateMemory(),
+        recorder=recorder
+    )
+    if not args.quiet:
+        sender.on_progress = ProgressPrinter(sender)
+
+    try:
+        if args.changes_from:
+            with open(args.changes_from, encoding="utf-8") as f:
+                previous = f.read()
+            results = sender.send_changes(previous, read_text(args, store))
+        elif args.keys:
+            results = sender.send_keys(read_text(args, store))
+        elif args.stored is not None:
+            results = sender.send_stored(store, key, resume=args.resume)
+        elif args.text is not None:
+            results = sender.send(args.text, resume=args.resume)
+            if store and any(result.completed for result in results.values()):
+                store.used(key)
+        else:
+            results = sender.send_file(args.file, resume=args.resume)
+    except (OSError, AdbError, ValueError, *store_errors) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        sender.stop()
+        print("\nTyping stopped", file=sys.stderr)
+        return 130
+    finally:
+        sender.close()
+        if store:
+            store.close()
+        if recorder:
+            recorder.close()
+        if metrics:
+            metrics.close()
+            if args.metrics_prom:
+                try:
+                    metrics.write_prometheus(args.metrics_prom)
+                except OSError as e:
+                    print(f"Error: cannot write metrics: {e}", file=sys.stderr)
+
+    if not args.quiet:
+        sys.stderr.write("\n")
+    unit = "char" if SEND_MODES[args.mode] is None else "chunk"
+    label = "subprocess per command" if args.subprocess else "persistent shell"
+    failed = 0
+    for serial, result in sorted(results.items()):
+        if result.resumed_from:
+            print(f"{serial}: resumed after {result.resumed_from} characters")
+        if result.retries:
+            print(f"{serial}: {result.retries} retries while the device was unreachable")
+        if result.error:
+            failed += 1
+            print(f"{serial}: failed after {result.sent_chars} characters: {result.error}")
+            if not (args.changes_from or args.keys):
+                print(f"{serial}: run the same command with --resume to continue", file=sys.stderr)
+        elif args.changes_from:
+            print(f"{serial}: {result.edits.describe()}, {result.stats.describe(label, 'broadcast')}")
+        elif args.keys:
+            print(f"{serial}: sent {result.keys.describe()}, {result.stats.describe(label, 'line')}")
+        else:
+            print(f"{serial}: sent {result.sent_chars} characters ({format_bytes(result.sent_bytes)}), "
+                  f"{result.stats.describe(label, unit)}")
+            if result.timing.targets:
+                print(f"{serial}: {result.timing.describe()}")
+            if result.delivery:
+                print(f"{serial}: {result.delivery.describe()}")
+            if result.adaptive:
+                print(f"{serial}: {result.adaptive.describe()}")
+    if len(results) > 1:
+        print(f"Total: {sender.fanout.aggregate_rate():.1f} chars/s across {len(results)} devices")
+    if metrics and not args.quiet:
+        print(metrics.describe())
+    return 1 if failed else 0
+
+def cmd_devices(args):
+    client = AdbClient()
+    if not ensure_adb_server(client):
+        print("ADB is not installed or not in system PATH", file=sys.stderr)
+        return 1
+    cache = DeviceInfoCache(client)
+    for serial, state in client.devices():
+        if state != "device":
+            print(f"{serial}\t{state}")
+            continue
+        info = cache.get(serial)
+        print(f"{serial}\t{state}\t{info['model']} (Android {info['version']}, SDK {info['sdk']}, {info['abi']})")
+    return 0
+
+def cmd_daemon(args):
+    # Imported here: the socket and HTTP servers are slow to import and only the daemon needs them
+    from .daemon import DEFAULT_SOCKET_PATH, SendDaemon, UnixJobServer
+
+    if args.socket is None:
+        args.socket = DEFAULT_SOCKET_PATH
+    client = AdbClient()
+    if not ensure_adb_server(client):
+        print("ADB is not installed or not in system PATH", file=sys.stderr)
+        return 1
+    if UnixJobServer is None:
+        args.socket = ""
+    if not args.socket and args.http_port is None:
+        print("Nothing to listen on: give --socket or --http-port", file=sys.stderr)
+        return 2
+    daemon = SendDaemon(client)
+    daemon.start()
+    try:
+        if args.socket:
+            daemon.serve_unix(args.socket)
+            print(f"Listening on {args.socket}")
+        if args.http_port is not None:
+            server = daemon.serve_http(args.http_port)
+            print(f"Listening on http://127.0.0.1:{server.server_address[1]}")
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+    return 0
+
+def cmd_history(args):
+    import sqlite3
+
+    from .history import TextStore
+
+    try:
+        store = TextStore()
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error: cannot open history: {e}", file=sys.stderr)
+        return 1
+    try:
+        if args.action == "list":
+            for entry in store.entries():
+                used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"]))
+                preview = entry["preview"].replace("\n", " ")
+                print(f"{entry['key'][:12]}\t{entry['name'] or '-'}\t{entry['chars']} chars\t"
+                      f"{used}\t{entry['uses']}x\t{preview}")
+            print(f"{format_bytes(store.size())} of {format_bytes(store.max_bytes)} used", file=sys.stderr)
+        elif args.action == "add":
+            text = read_text(args)
+            if not text:
+                print("Nothing to store", file=sys.stderr)
+                return 1
+            print(store.add(text, name=args.name))
+        else:
+            key = store.resolve(args.reference)
+            if args.action == "show":
+                sys.stdout.write(store.get(key))
+            elif args.action == "remove":
+                store.remove(key)
+            else:
+                store.rename(key, args.name)
+    except KeyError as e:
+        print(f"Error: {e.args[0]}", file=sys.stderr)
+        return 1
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    return 0
+
+def cmd_replay(args):
+    try:
+        header, events = load_trace(args.trace)
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read trace: {e}", file=sys.stderr)
+        return 1
+    targets = {}
+    for mapping in args.map or []:
+        old, sep, new = mapping.partition("=")
+        if not sep or not old or not new:
+            print(f"Error: --map expects OLD=NEW, got {mapping!r}", file=sys.stderr)
+            return 2
+        targets.setdefault(old, []).append(new)
+    if not targets:
+        targets = {serial: [serial] for serial in sorted({event["serial"] for event in events})}
+
+    client = AdbClient()
+    if not ensure_adb_server(client):
+        print("ADB is not installed or not in system PATH", file=sys.stderr)
+        return 1
+    online = {serial for serial, state in client.devices() if state == "device"}
+    serials = sorted({serial for news in targets.values() for serial in news})
+    missing = [serial for serial in serials if serial not in online]
+    if missing:
+        print(f"Error: device not connected: {', '.join(missing)} (use --map OLD=NEW to replay elsewhere)",
+              file=sys.stderr)
+        return 1
+
+    recorder = None
+    try:
+        if args.record:
+            recorder = SendRecorder(args.record, replay_of=args.trace)
+    except OSError as e:
+        print(f"Error: cannot open trace: {e}", file=sys.stderr)
+        return 1
+    shells = {serial: PersistentAdbShell(serial, client=client) for serial in serials}
+    replayer = TraceReplayer(
+        events,
+        shells,
+        targets=targets,
+        speed=None if args.max_speed else args.speed,
+        recorder=recorder
+    )
+    try:
+        # Open the sessions first, so the first events are not late
+        for shell in shells.values():
+            shell.run("true")
+        results = replayer.run()
+    except (OSError, AdbError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        replayer.stop()
+        print("\nReplay stopped", file=sys.stderr)
+        return 130
+    finally:
+        for shell in shells.values():
+            shell.close()
+        if recorder:
+            recorder.close()
+
+    failed = 0
+    for serial, result in sorted(results.items()):
+        print(f"{serial}: {result.describe()}")
+        if result.error:
+            failed += 1
+            print(f"{serial}: stopped: {result.error}")
+    return 1 if failed else 0
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "send":
+        return cmd_send(args)
+    if args.command == "daemon":
+        return cmd_daemon(args)
+    if args.command == "replay":
+        return cmd_replay(args)
+    if args.command == "history":
+        return cmd_history(args)
+    return cmd_devices(args)
@@ -0,0 +1,508 @@
+import collections
+import http.server
+import itertools
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+
+from .adaptive import RateMemory
+from .adb import AdbClient, AdbError, DeviceInfoCache, DeviceWatcher
+from .fanout import FanOutSender
+from .keys import KeyScript
+from .sender import SEND_MODES
+from .timing import TIMING_MODELS, make_timing_model
+from .transport import PersistentAdbShell
+
+DEFAULT_SOCKET_PATH = os.path.join(os.path.expanduser("~"), ".autoinput", "daemon.sock")
+
+# Finished jobs kept for status queries before the oldest are forgotten
+MAX_FINISHED_JOBS = 1000
+
+class JobError(ValueError):
+    """A job request is malformed or names an unknown job or device."""
+
+class SendJob:
+    """One request to type text on some devices, tracked from the queue to the last device.
+
+    `devices` maps each target serial to its state ("queued", "running",
+    "done", "failed" or "cancelled"), characters sent and error. Every change
+    bumps `version` and wakes up wait(), which is how status is streamed.
+    """
+    FINISHED = ("done", "failed", "cancelled")
+
+    def __init__(self, job_id, text, serials, options, priority=0):
+        self.id = job_id
+        self.text = text
+        self.options = options
+        self.priority = priority
+        self.created = time.time()
+        self.devices = {
+            serial: {"state": "queued", "sent_chars": 0, "total_chars": len(text), "error": None}
+            for serial in serials
+        }
+        self.fanouts = {}  # serial -> FanOutSender while that device is sending; guarded by `changed`
+        self.cancelled = False
+        self.version = 0
+        self.changed = threading.Condition()
+
+    @property
+    def state(self):
+        states = [device["state"] for device in self.devices.values()]
+        if "running" in states or "queued" in states:
+            if self.cancelled:
+                return "cancelling"
+            return "running" if "running" in states else "queued"
+        if self.cancelled:
+            return "cancelled"
+        return "failed" if "failed" in states else "done"
+
+    @property
+    def finished(self):
+        return self.state in self.FINISHED
+
+    def update(self, serial, **fields):
+        with self.changed:
+            self.devices[serial].update(fields)
+            self.version += 1
+            self.changed.notify_all()
+
+    def snapshot(self):
+        with self.changed:
+            return {
+                "job": self.id,
+                "state": self.state,
+                "priority": self.priority,
+                "created": self.created,
+                "devices": {serial: dict(device) for serial, device in self.devices.items()},
+            }
+
+    def wait(self, version, timeout=None):
+        """Block until the job changes from `version`; returns (snapshot, version)."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            return self.snapshot(), self.version
+
+    def follow(self, heartbeat=15.0):
+        """Yield snapshots as the job changes, ending with its final state.
+
+        Changes that happen while the caller is busy are coalesced into one
+        snapshot. With nothing new for `heartbeat` seconds the current state
+        is repeated, so clients can tell the stream is alive.
+        """
+        version = -1
+        while True:
+            snapshot, version = self.wait(version, heartbeat)
+            yield snapshot
+            if snapshot["state"] in self.FINISHED:
+                return
+
+    def cancel(self):
+        """Stop the devices that are sending; queued devices skip the job."""
+        with self.changed:
+            self.cancelled = True
+            fanouts = list(self.fanouts.values())
+            self.version += 1
+            self.changed.notify_all()
+        for fanout in fanouts:
+            fanout.stop()
+
+class DeviceWorker:
+    """Warm shell and job queue of one device; jobs run one at a time, highest priority first."""
+
+    def __init__(self, serial, daemon):
+        self.serial = serial
+        self.daemon = daemon
+        self.shell = PersistentAdbShell(serial, client=daemon.client)
+        self.jobs = queue.PriorityQueue()
+        self.order = itertools.count()
+        self.current = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def put(self, job):
+        # Equal priorities run in the order they were submitted
+        self.jobs.put((-job.priority, next(self.order), job))
+
+    def stop(self):
+        self.jobs.put((float("-inf"), -1, None))
+
+    def run(self):
+        try:
+            # Open the session now, so the first job does not wait for it
+            self.shell.run("true")
+        except AdbError:
+            pass
+        while True:
+            _, _, job = self.jobs.get()
+            if job is None:
+                break
+            self.current = job
+            try:
+                self.daemon.run_job(job, self)
+            except Exception as e:
+                # One broken job must not leave every later job of this device queued forever
+                job.update(self.serial, state="failed", error=str(e) or type(e).__name__)
+            finally:
+                self.current = None
+        self.shell.close()
+
+class SendDaemon:
+    """Long-running sender: warm shells to every connected device and per-device job queues.
+
+    Devices are followed with a DeviceWatcher; each online device gets a
+    DeviceWorker with a persistent shell, so jobs pay no process spawn or
+    connection setup. submit() takes a request dict (see handle()) and
+    queues the job on every target device, where higher `priority` jobs run
+    first. Job status can be polled with status() or followed with watch().
+    serve_unix() and serve_http() expose the same requests over a Unix
+    socket (JSON lines) and a localhost HTTP endpoint.
+    """
+
+    def __init__(self, client=None, rate_memory=None, metrics=None, max_finished_jobs=MAX_FINISHED_JOBS):
+        self.client = client or AdbClient()
+        self.rate_memory = rate_memory or RateMemory()
+        self.metrics = metrics
+        self.max_finished_jobs = max_finished_jobs
+        self.cache = DeviceInfoCache(self.client)
+        self.events = queue.Queue()
+        self.watcher = DeviceWatcher(self.client, self.events, self.cache)
+        self.lock = threading.Lock()
+        self.workers = {}
+        self.online = {}
+        self.jobs = collections.OrderedDict()
+        self.job_ids = itertools.count(1)
+        self.servers = []
+
+    def start(self):
+        self.watcher.start()
+        threading.Thread(target=self.follow_devices, daemon=True).start()
+
+    def follow_devices(self):
+        while True:
+            kind, payload = self.events.get()
+            if kind is None:
+                return
+            with self.lock:
+                self.online = payload if kind == "devices" else {}
+                for serial in self.online:
+                    if serial not in self.workers:
+                        worker = self.workers[serial] = DeviceWorker(serial, self)
+                        worker.start()
+
+    def wait_for_devices(self, timeout=5.0):
+        """Wait until the first device list has arrived; returns the online serials."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                if self.online:
+                    return sorted(self.online)
+            time.sleep(0.05)
+        return []
+
+    @staticmethod
+    def job_options(request):
+        mode = request.get("mode", "chunk")
+        if mode not in SEND_MODES:
+            raise JobError(f"unknown mode {mode!r}; choose one of {', '.join(SEND_MODES)}")
+        timing = request.get("timing", "uniform")
+        if timing not in TIMING_MODELS:
+            raise JobError(f"unknown timing {timing!r}; choose one of {', '.join(TIMING_MODELS)}")
+        try:
+            chunk_size = int(request.get("chunk_size", 500))
+            min_delay = float(request.get("min_delay", 50))
+            max_delay = max(min_delay, float(request.get("max_delay", 150)))
+        except (TypeError, ValueError) as e:
+            raise JobError(f"bad number: {e}") from e
+        return {
+            "mode": mode,
+            "chunk_size": chunk_size,
+            "delay_range": (min_delay, max_delay),
+            "timing": timing,
+            "keys": bool(request.get("keys", False)),
+        }
+
+    def submit(self, request):
+        """Queue a send job from a request dict; returns the SendJob."""
+        text = request.get("text")
+        if not isinstance(text, str) or not text:
+            raise JobError("text must be a non-empty string")
+        try:
+            priority = int(request.get("priority", 0))
+        except (TypeError, ValueError) as e:
+            raise JobError(f"bad priority: {e}") from e
+        options = self.job_options(request)
+        if options["keys"]:
+            try:
+                KeyScript.from_markup(text)
+            except ValueError as e:
+                raise JobError(str(e)) from e
+        with self.lock:
+            serials = request.get("serials") or sorted(self.online)
+            if not serials:
+                raise JobError("no devices/emulators found")
+            offline = [serial for serial in serials if serial not in self.online]
+            if offline:
+                raise JobError(f"device not connected: {', '.join(offline)}")
+            job = SendJob(f"job-{next(self.job_ids)}", text, serials, options, priority)
+            self.jobs[job.id] = job
+            self.forget_finished()
+            for serial in serials:
+                self.workers[serial].put(job)
+        return job
+
+    def forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise JobError(f"unknown job {job_id!r}")
+        return job
+
+    def run_job(self, job, worker):
+        """Send one job on one device (runs on the device's worker thread)."""
+        serial = worker.serial
+        if job.cancelled:
+            job.update(serial, state="cancelled")
+            return
+        options = job.options
+        controllers = None
+        rate_key = None
+        if options["mode"] == "auto":
+            try:
+                rate_key = self.rate_memory.device_key(self.cache.get(serial))
+            except AdbError:
+                rate_key = serial
+            controllers = {serial: self.rate_memory.controller(rate_key)}
+
+        def on_progress(result):
+            job.update(serial, sent_chars=result.sent_chars)
+            if job.cancelled:
+                # A cancel that came before run() started has been cleared by it
+                fanout.stop()
+
+        fanout = FanOutSender(
+            {serial: worker.shell},
+            chunk_mode=SEND_MODES[options["mode"]],
+            chunk_size=options["chunk_size"],
+            delay_range=options["delay_range"],
+            on_progress=on_progress,
+            timing=make_timing_model(options["timing"], options["delay_range"]),
+            metrics=self.metrics,
+            controllers=controllers
+        )
+        with job.changed:
+            job.fanouts[serial] = fanout
+        job.update(serial, state="running", total_chars=len(job.text))
+        try:
+            results = fanout.run_keys(job.text) if options["keys"] else fanout.run(job.text)
+            result = results[serial]
+        finally:
+            with job.changed:
+                del job.fanouts[serial]
+        if result.adaptive and rate_key:
+            self.rate_memory.remember(rate_key, result.adaptive)
+        state = "cancelled" if result.stopped else "failed" if result.error else "done"
+        job.update(
+            serial,
+            state=state,
+            sent_chars=result.sent_chars,
+            total_chars=result.total_chars,
+            error=str(result.error) if result.error else None,
+            elapsed=round(result.elapsed, 6)
+        )
+
+    def cancel(self, job_id):
+        job = self.job(job_id)
+        job.cancel()
+        return job
+
+    def devices(self):
+        devices = []
+        with self.lock:
+            for serial, info in sorted(self.online.items()):
+                worker = self.workers[serial]
+                current = worker.current  # Read once: the worker thread clears it between jobs
+                devices.append({
+                    "serial": serial,
+                    "model": info.get("model", ""),
+                    "queued": worker.jobs.qsize(),
+                    "running": current.id if current else None,
+                })
+        return devices
+
+    def watch(self, job_id, heartbeat=15.0):
+        """Iterator of job snapshots as the job changes, ending with its final state (see SendJob.follow()).
+
+        An unknown job raises JobError here, before anything is iterated.
+        """
+        return self.job(job_id).follow(heartbeat)
+
+    def handle(self, request):
+        """Answer one request dict; returns the reply dict.
+
+        Requests are {"op": "send", "text": ..., "serials": [...], "mode":
+        ..., "priority": ...}, {"op": "status", "job": id}, {"op": "cancel",
+        "job": id} and {"op": "devices"}. A send with "keys": true reads
+        "{ENTER}"-style special keys in the text (see autoinput.keys).
+        Replies have "ok" and either the result or "error".
+        """
+        try:
+            op = request.get("op")
+            if op == "send":
+                return dict(self.submit(request).snapshot(), ok=True)
+            if op == "status":
+                return dict(self.job(request.get("job")).snapshot(), ok=True)
+            if op == "cancel":
+                return dict(self.cancel(request.get("job")).snapshot(), ok=True)
+            if op == "devices":
+                return {"ok": True, "devices": self.devices()}
+            raise JobError(f"unknown op {op!r}")
+        except JobError as e:
+            return {"ok": False, "error": str(e)}
+
+    def serve_unix(self, path=DEFAULT_SOCKET_PATH):
+        """Accept JSON-line requests on a Unix socket at path (only the current user may connect)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.unlink(path)  # Left behind by a daemon that did not shut down cleanly
+        server = UnixJobServer(path, UnixRequestHandler)
+        os.chmod(path, 0o600)
+        return self.serve(server)
+
+    def serve_http(self, port, host="127.0.0.1"):
+        """Accept requests over HTTP on localhost; returns the server (its port is server_address[1])."""
+        return self.serve(HttpJobServer((host, port), HttpRequestHandler))
+
+    def serve(self, server):
+        server.send_daemon = self
+        self.servers.append(server)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def close(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+            if isinstance(server.server_address, str) and os.path.exists(server.server_address):
+                os.unlink(server.server_address)
+        self.servers = []
+        self.watcher.stop()
+        self.events.put((None, None))
+        with self.lock:
+            for job in self.jobs.values():
+                if not job.finished:
+                    job.cancel()
+            for worker in self.workers.values():
+                worker.stop()
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class UnixJobServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:  # Windows: only the HTTP endpoint is available
+    UnixJobServer = None
+
+class HttpJobServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+class UnixRequestHandler(socketserver.StreamRequestHandler):
+    """One JSON request per line and one JSON reply line each.
+
+    {"op": "watch", "job": id} streams a reply line per job change until the
+    job has finished. A connection can be kept open for any number of
+    requests.
+    """
+
+    def handle(self):
+        daemon = self.server.send_daemon
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise JobError("request must be a JSON object")
+                if request.get("op") == "watch":
+                    for snapshot in daemon.watch(request.get("job")):
+                        self.reply(dict(snapshot, ok=True))
+                    continue
+                self.reply(daemon.handle(request))
+            except (ValueError, JobError) as e:
+                self.reply({"ok": False, "error": str(e)})
+
+    def reply(self, message):
+        self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+class HttpRequestHandler(http.server.BaseHTTPRequestHandler):
+    """REST-style routes over the same requests.
+
+    POST /jobs (JSON body as for "send"), GET /jobs/<id>, DELETE /jobs/<id>,
+    GET /jobs/<id>/events (newline-delimited JSON until the job finishes)
+    and GET /devices. Connections are kept alive between requests.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self.send_json({"ok": False, "error": "not found"}, 404)
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise JobError("request must be a JSON object")
+        except (ValueError, JobError) as e:
+            return self.send_json({"ok": False, "error": str(e)}, 400)
+        reply = self.server.send_daemon.handle(dict(request, op="send"))
+        self.send_json(reply, 201 if reply["ok"] else 400)
+
+    def do_GET(self):
+        daemon = self.server.send_daemon
+        parts = self.path.strip("/").split("/")
+        if parts == ["devices"]:
+            return self.send_json(daemon.handle({"op": "devices"}))
+        if len(parts) == 2 and parts[0] == "jobs":
+            reply = daemon.handle({"op": "status", "job": parts[1]})
+            return self.send_json(reply, 200 if reply["ok"] else 404)
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+            try:
+                # Resolve the job before the 200 goes out
+                snapshots = daemon.watch(parts[1])
+            except JobError as e:
+                return self.send_json({"ok": False, "error": str(e)}, 404)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            for snapshot in snapshots:
+                self.wfile.write((json.dumps(dict(snapshot, ok=True)) + "\n").encode("utf-8"))
+                self.wfile.flush()
+            return
+        self.send_json({"ok": False, "error": "not found"}, 404)
+
+    def do_DELETE(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "jobs":
+            return self.send_json({"ok": False, "error": "not found"}, 404)
+        reply = self.server.send_daemon.handle({"op": "cancel", "job": parts[1]})
+        self.send_json(reply, 200 if reply["ok"] else 404)
+
+    def send_json(self, message, status=200):
+        body = json.dumps(message).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
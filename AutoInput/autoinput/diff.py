@@ -0,0 +1,181 @@
+import base64
+import itertools
+import unicodedata
+
+from .encoding import MAX_BROADCAST_COMMAND_LENGTH, TextChunker, TextEncoder, iter_graphemes
+
+# Edit distance above which diff() stops searching and replaces the changed middle wholesale
+DEFAULT_MAX_COST = 2000
+
+def utf16_length(text):
+    """Length of text in UTF-16 code units, the unit Android cursor positions are counted in."""
+    return len(text) + sum(1 for char in text if ord(char) > 0xFFFF)
+
+def _myers(a, b, max_cost):
+    """Shortest edit path from sequence a to b (Myers' O(ND) algorithm).
+
+    Returns the (x, y) steps of the path that insert or delete one element,
+    in order, or None if more than max_cost edits are needed.
+    """
+    n, m = len(a), len(b)
+    v = {1: 0}
+    trace = []
+    for d in range(min(n + m, max_cost) + 1):
+        trace.append(v.copy())
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return None
+
+def _backtrack(trace, x, y):
+    steps = []
+    for d in range(len(trace) - 1, 0, -1):
+        v = trace[d]
+        k = x - y
+        previous_k = k + 1 if k == -d or (k != d and v[k - 1] < v[k + 1]) else k - 1
+        previous_x = v[previous_k]
+        previous_y = previous_x - previous_k
+        # One insertion (down) or deletion (right), then a run of matches up to (x, y)
+        if previous_k == k + 1:
+            steps.append((previous_x, previous_y, previous_x, previous_y + 1))
+        else:
+            steps.append((previous_x, previous_y, previous_x + 1, previous_y))
+        x, y = previous_x, previous_y
+    steps.reverse()
+    return steps
+
+def diff(old, new, max_cost=DEFAULT_MAX_COST):
+    """Hunks that turn sequence old into new: (old_start, old_end, new_start, new_end) tuples.
+
+    Each hunk replaces old[old_start:old_end] with new[new_start:new_end];
+    hunks are in order and do not overlap. The common prefix and suffix are
+    trimmed first, so a small change in a long text costs little more than
+    comparing it once. If the texts need more than `max_cost` single-element
+    edits, the differing middle is replaced as one hunk.
+    """
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    old_end, new_end = len(old) - suffix, len(new) - suffix
+    if prefix == old_end and prefix == new_end:
+        return []
+    steps = _myers(old[prefix:old_end], new[prefix:new_end], max_cost)
+    if steps is None:
+        return [(prefix, old_end, prefix, new_end)]
+    hunks = []
+    for x0, y0, x1, y1 in steps:
+        if hunks and hunks[-1][1] == prefix + x0 and hunks[-1][3] == prefix + y0:
+            hunks[-1][1], hunks[-1][3] = prefix + x1, prefix + y1
+        else:
+            hunks.append([prefix + x0, prefix + x1, prefix + y0, prefix + y1])
+    return [tuple(hunk) for hunk in hunks]
+
+class EditScript:
+    """Cursor moves, deletions and insertions that turn text typed earlier into new text.
+
+    The device cursor is assumed to sit right after the old text, where
+    typing left it. `ops` are ("left", n), ("right", n), ("delete", n) and
+    ("insert", text); moves and deletions count UTF-16 code units, like
+    Android's editor, and deletions remove text before the cursor. Hunks
+    are applied from the last to the first, so earlier positions never
+    shift, and the cursor ends up after the new text again.
+    """
+
+    def __init__(self, ops, hunks=()):
+        self.ops = ops
+        self.hunks = list(hunks)
+
+    @classmethod
+    def from_texts(cls, old, new, max_cost=DEFAULT_MAX_COST):
+        """Diff two texts by user-perceived character and build the script."""
+        old = list(iter_graphemes(unicodedata.normalize('NFC', old)))
+        new = list(iter_graphemes(unicodedata.normalize('NFC', new)))
+        hunks = diff(old, new, max_cost)
+        positions = [0] + list(itertools.accumulate(utf16_length(grapheme) for grapheme in old))
+        ops = []
+        cursor = positions[-1]
+        for old_start, old_end, new_start, new_end in reversed(hunks):
+            cls.append_op(ops, "left", cursor - positions[old_end])
+            cls.append_op(ops, "delete", positions[old_end] - positions[old_start])
+            inserted = "".join(new[new_start:new_end])
+            cls.append_op(ops, "insert", inserted)
+            cursor = positions[old_start] + utf16_length(inserted)
+        if hunks:
+            cls.append_op(ops, "right", utf16_length("".join(new)) - cursor)
+        return cls(ops, hunks)
+
+    @staticmethod
+    def append_op(ops, kind, value):
+        if not value:
+            return
+        if ops and ops[-1][0] == kind:
+            ops[-1] = (kind, ops[-1][1] + value)
+        else:
+            ops.append((kind, value))
+
+    @property
+    def inserted_chars(self):
+        return sum(len(value) for kind, value in self.ops if kind == "insert")
+
+    @property
+    def deleted_units(self):
+        return sum(value for kind, value in self.ops if kind == "delete")
+
+    def tokens(self, max_command_length=MAX_BROADCAST_COMMAND_LENGTH):
+        """Yield (ADB_EDIT token, characters inserted) for the ops; each token fits one command on its own.
+
+        Tokens are "L<n>", "R<n>", "D<n>" and "I<base64>"; long insertions are
+        split between grapheme clusters.
+        """
+        overhead = len(TextEncoder.encode_edits([""])) + len("I")
+        # TextChunker budgets for an ADB_INPUT_B64 command; give it the room an insert token has
+        chunker = TextChunker(
+            MAX_BROADCAST_COMMAND_LENGTH,
+            "chars",
+            max_command_length - overhead + len(TextEncoder.encode_broadcast(""))
+        )
+        for kind, value in self.ops:
+            if kind == "insert":
+                for chunk in chunker.stream_chunks([value]):
+                    yield "I" + base64.b64encode(chunk.encode('utf-8')).decode('ascii'), len(chunk)
+            else:
+                yield {"left": "L", "right": "R", "delete": "D"}[kind] + str(value), 0
+
+    def batches(self, max_command_length=MAX_BROADCAST_COMMAND_LENGTH):
+        """The script as few ADB_EDIT broadcasts as fit the length limit: (command, characters inserted) pairs."""
+        overhead = len(TextEncoder.encode_edits([]))
+        batches, batch, length, inserted = [], [], overhead, 0
+        for token, chars in self.tokens(max_command_length):
+            if batch and length + len(token) + 1 > max_command_length:
+                batches.append((TextEncoder.encode_edits(batch), inserted))
+                batch, length, inserted = [], overhead, 0
+            batch.append(token)
+            length += len(token) + 1
+            inserted += chars
+        if batch:
+            batches.append((TextEncoder.encode_edits(batch), inserted))
+        return batches
+
+    def commands(self, max_command_length=MAX_BROADCAST_COMMAND_LENGTH):
+        """Device-side ADB_EDIT broadcasts carrying the whole script."""
+        return [command for command, _ in self.batches(max_command_length)]
+
+    def describe(self):
+        if not self.hunks:
+            return "no changes"
+        return (f"{len(self.hunks)} change(s): {self.deleted_units} characters deleted, "
+                f"{self.inserted_chars} inserted")
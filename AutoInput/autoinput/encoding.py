@@ -0,0 +1,286 @@
+import base64
+import functools
+import itertools
+import re
+import unicodedata
+
+# Longest device-side command line we build. Older adbd versions cap a shell
+# service request at 4096 bytes, so stay below that with some headroom.
+MAX_BROADCAST_COMMAND_LENGTH = 4000
+
+# Per-character commands memoized by TextEncoder.encode_grapheme; texts repeat a few distinct clusters
+GRAPHEME_CACHE_SIZE = 4096
+
+def _is_grapheme_extend(char):
+    """True for code points that never start a new user-perceived character."""
+    code = ord(char)
+    return (
+        unicodedata.category(char) in ("Mn", "Me", "Mc")
+        or code in (0x200C, 0x200D)             # ZWNJ, ZWJ
+        or 0xFE00 <= code <= 0xFE0F             # Variation selectors
+        or 0x1F3FB <= code <= 0x1F3FF           # Emoji skin tone modifiers
+        or 0xE0020 <= code <= 0xE007F           # Emoji tag sequences
+        or 0xE0100 <= code <= 0xE01EF           # Variation selectors supplement
+    )
+
+def _hangul_type(char):
+    code = ord(char)
+    if 0x1100 <= code <= 0x115F or 0xA960 <= code <= 0xA97C:
+        return "L"
+    if 0x1160 <= code <= 0x11A7 or 0xD7B0 <= code <= 0xD7C6:
+        return "V"
+    if 0x11A8 <= code <= 0x11FF or 0xD7CB <= code <= 0xD7FB:
+        return "T"
+    if 0xAC00 <= code <= 0xD7A3:
+        return "LV" if (code - 0xAC00) % 28 == 0 else "LVT"
+    return None
+
+def _is_regional_indicator(char):
+    return 0x1F1E6 <= ord(char) <= 0x1F1FF
+
+def _joins(previous, char, regional_run):
+    """True if char continues the grapheme cluster that ends with previous.
+
+    `regional_run` is the number of regional indicators directly before char.
+    """
+    if previous == "\r" and char == "\n":
+        return True
+    if previous in ("\r", "\n"):
+        return False
+    if _is_grapheme_extend(char):
+        return True
+    if previous == "\u200d" and unicodedata.category(char) == "So":
+        return True
+    if _is_regional_indicator(previous) and _is_regional_indicator(char):
+        return regional_run % 2 == 1
+    hangul_prev, hangul_next = _hangul_type(previous), _hangul_type(char)
+    if hangul_prev == "L":
+        return hangul_next in ("L", "V", "LV", "LVT")
+    if hangul_prev in ("LV", "V"):
+        return hangul_next in ("V", "T")
+    if hangul_prev in ("LVT", "T"):
+        return hangul_next == "T"
+    return False
+
+def _ranges_class(codes):
+    runs = []
+    for code in codes:
+        if runs and runs[-1][1] == code - 1:
+            runs[-1][1] = code
+        else:
+            runs.append([code, code])
+    return "[" + "".join(
+        re.escape(chr(first)) if first == last else f"{re.escape(chr(first))}-{re.escape(chr(last))}"
+        for first, last in runs
+    ) + "]"
+
+def _char_class(codes):
+    """Regex matching any of the given code points (in ascending order).
+
+    The re module only tests a class against a bitmap when the whole class is
+    in the BMP, so code points above it go into a second class behind a
+    quick range check.
+    """
+    bmp = [code for code in codes if code <= 0xFFFF]
+    astral = [code for code in codes if code > 0xFFFF]
+    if not astral:
+        return _ranges_class(bmp)
+    return f"(?:{_ranges_class(bmp)}|(?=[\\U00010000-\\U0010FFFF]){_ranges_class(astral)})"
+
+@functools.lru_cache(maxsize=None)
+def grapheme_patterns():
+    """Compiled regexes for segmenting text, by the same rules as _joins().
+
+    Returns (cluster, joining): `cluster` matches one grapheme cluster and
+    `joining` finds the first code point that can be part of a cluster of
+    more than one, so text without any is split by code point directly.
+    Built on first use, which scans the Unicode database once (well under
+    0.2 s), and cached for the life of the process. Planes 4 to 13 hold no
+    assigned characters and are not scanned.
+    """
+    extend, symbol = [], []
+    for start, stop in ((0, 0x40000), (0xE0000, 0xE1000)):
+        for code, category in zip(range(start, stop), map(unicodedata.category, map(chr, range(start, stop)))):
+            if category == "So":
+                symbol.append(code)
+            # The extenders outside Mn/Me/Mc are format characters or modifier symbols
+            elif category in ("Mn", "Me", "Mc", "Cf", "Sk") and _is_grapheme_extend(chr(code)):
+                extend.append(code)
+    hangul = {}
+    joining = extend + [ord("\r")]
+    for start, stop in ((0x1100, 0x1200), (0xA960, 0xA980), (0xAC00, 0xD800)):
+        for code in range(start, stop):
+            kind = _hangul_type(chr(code))
+            if kind:
+                hangul.setdefault(kind, []).append(code)
+                joining.append(code)
+    L, V, T, LV, LVT = (_char_class(hangul[kind]) for kind in ("L", "V", "T", "LV", "LVT"))
+    syllable = f"{L}*(?:{LV}{V}*|{V}+|{LVT}){T}*|{L}+|{T}+"
+    regional = "[\U0001F1E6-\U0001F1FF]{2}"
+    # After a ZWJ a symbol joins, and regional indicators pair up again
+    joined = f"(?<=\u200d)(?:{regional}|{_char_class(symbol)})"
+    joining.extend(range(0x1F1E6, 0x1F200))
+    return (
+        re.compile(f"\r\n|[\r\n]|(?:{regional}|{syllable}|[^\r\n])(?:{_char_class(extend)}|{joined})*"),
+        re.compile(_char_class(sorted(joining)))
+    )
+
+def iter_graphemes(text):
+    """Yield user-perceived characters (extended grapheme clusters) of text.
+
+    Covers the cases that matter for typing: CR LF, combining marks, emoji
+    modifier/ZWJ/tag sequences, flag pairs and Hangul jamo sequences.
+    """
+    cluster, joining = grapheme_patterns()
+    if joining.search(text) is None:
+        return iter(text)
+    return iter(cluster.findall(text))
+
+def last_safe_boundary(text):
+    """Index of the last position where text can be cut for streaming.
+
+    Cutting there splits no grapheme cluster, and NFC-normalizing both sides
+    separately gives the same result as normalizing the whole text. Returns 0
+    if there is no such position.
+    """
+    for i in range(len(text) - 1, 0, -1):
+        char = text[i]
+        # Flag pairs depend on how many indicators came before; skip past them
+        if unicodedata.combining(char) or _is_regional_indicator(char):
+            continue
+        if not _joins(text[i - 1], char, 0):
+            return i
+    return 0
+
+class TextChunker:
+    """Split text into payloads for bulk ADB_INPUT_B64 broadcasts.
+
+    Chunks hold at most `size` user-perceived characters and always fit in
+    one `am broadcast` command line. In "words" and "lines" mode chunks end
+    on a word or line boundary unless a single word or line is too long.
+    """
+    MODES = ("chars", "words", "lines")
+
+    def __init__(self, size=500, mode="chars", max_command_length=MAX_BROADCAST_COMMAND_LENGTH):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown chunk mode: {mode}")
+        overhead = len(TextEncoder.encode_broadcast(""))
+        max_base64 = max_command_length - overhead
+        if max_base64 < 8:
+            raise ValueError("max_command_length is too small for a broadcast")
+        self.size = max(1, int(size))
+        self.mode = mode
+        # Base64 turns every 3 payload bytes into 4 characters
+        self.max_bytes = max_base64 // 4 * 3
+
+    def tokens(self, text):
+        if self.mode == "words":
+            return re.findall(r"\S+\s*|\s+", text)
+        if self.mode == "lines":
+            return text.splitlines(keepends=True)
+        return [text]
+
+    def is_complete(self, token):
+        """Whether a trailing token can be chunked without seeing more text."""
+        if self.mode == "words":
+            return token[-1:].isspace()
+        if self.mode == "lines":
+            return token.splitlines() != [token]
+        return True
+
+    def chunks(self, text):
+        """Yield NFC-normalized chunks of text, in order."""
+        return self.stream_chunks([unicodedata.normalize('NFC', text)])
+
+    def stream_chunks(self, pieces):
+        """Yield chunks from an iterable of NFC text pieces, such as a TextSource.
+
+        Pieces must end on grapheme boundaries. A word or line that spans a
+        piece boundary is carried over, so memory is bounded by the piece and
+        chunk sizes rather than by the input.
+        """
+        pending, pending_count, pending_bytes = [], 0, 0
+        carry = ""
+        for piece in itertools.chain(pieces, [None]):
+            if piece is None:
+                tokens = [carry] if carry else []
+            else:
+                tokens = self.tokens(carry + piece)
+                carry = ""
+                # Hold back an unfinished word or line, unless it is too long to keep together anyway
+                if tokens and not self.is_complete(tokens[-1]) and len(tokens[-1].encode('utf-8')) <= self.max_bytes:
+                    carry = tokens.pop()
+            for token in tokens:
+                graphemes = list(iter_graphemes(token))
+                token_bytes = len(token.encode('utf-8'))
+                if self.mode != "chars" and len(graphemes) <= self.size and token_bytes <= self.max_bytes:
+                    # Keep the whole word or line together when it fits
+                    if pending_count + len(graphemes) > self.size or pending_bytes + token_bytes > self.max_bytes:
+                        yield "".join(pending)
+                        pending, pending_count, pending_bytes = [], 0, 0
+                    pending.append(token)
+                    pending_count += len(graphemes)
+                    pending_bytes += token_bytes
+                    continue
+                for grapheme in graphemes:
+                    grapheme_bytes = len(grapheme.encode('utf-8'))
+                    if pending and (pending_count + 1 > self.size or pending_bytes + grapheme_bytes > self.max_bytes):
+                        yield "".join(pending)
+                        pending, pending_count, pending_bytes = [], 0, 0
+                    pending.append(grapheme)
+                    pending_count += 1
+                    pending_bytes += grapheme_bytes
+        if pending:
+            yield "".join(pending)
+
+class TextEncoder:
+    @staticmethod
+    def encode_broadcast(text):
+        """Build the device-side `am broadcast` command for text (without the `adb shell` prefix)."""
+        text = unicodedata.normalize('NFC', text)
+        base64_text = base64.b64encode(text.encode('utf-8')).decode('utf-8')
+        return f'am broadcast -a ADB_INPUT_B64 --es msg "{base64_text}"'
+
+    @staticmethod
+    @functools.lru_cache(maxsize=GRAPHEME_CACHE_SIZE)
+    def encode_grapheme(grapheme):
+        """encode_broadcast() for one grapheme cluster, memoized in a bounded LRU cache."""
+        return TextEncoder.encode_broadcast(grapheme)
+
+    @staticmethod
+    def encode_sequenced(text, session, seq):
+        """Build the device-side broadcast for chunk `seq` of an acknowledged send (see autoinput.protocol)."""
+        text = unicodedata.normalize('NFC', text)
+        base64_text = base64.b64encode(text.encode('utf-8')).decode('utf-8')
+        return f'am broadcast -a ADB_INPUT_SEQ --es session {session} --ei seq {seq} --es msg "{base64_text}"'
+
+    @staticmethod
+    def encode_file_broadcast(path, delete=True):
+        """Build the broadcast that has ADBKeyboard type the UTF-8 file at path on the device."""
+        return f'am broadcast -a ADB_INPUT_FILE --es path "{path}" --ez delete {"true" if delete else "false"}'
+
+    @staticmethod
+    def encode_edits(tokens):
+        """Build the ADB_EDIT broadcast that applies edit tokens at the cursor (see autoinput.diff)."""
+        return f'am broadcast -a ADB_EDIT --es ops "{";".join(tokens)}"'
+
+    @staticmethod
+    def encode_for_adb(text):
+        """Encode text for ADB command, handling all special characters and languages."""
+        # Normalization and base64 encoding happen in encode_broadcast
+        return f'adb shell {TextEncoder.encode_broadcast(text)}'
+
+    @staticmethod
+    def encode_chunks(text, size=500, mode="chars"):
+        """Encode text as a list of ADB commands, one broadcast per chunk."""
+        return [TextEncoder.encode_for_adb(chunk) for chunk in TextChunker(size, mode).chunks(text)]
+
+    @staticmethod
+    def encode_single_char(char):
+        """Encode a single user-perceived character (a grapheme cluster from iter_graphemes) for ADB command."""
+        return f'adb shell {TextEncoder.encode_broadcast(char)}'
+
+    @staticmethod
+    def decode_preview(text):
+        """Decode text for preview, showing exactly how it will appear."""
+        return text
@@ -0,0 +1,612 @@
+import itertools
+import subprocess
+import threading
+import time
+import unicodedata
+import uuid
+
+from .adb import AdbClient, AdbError
+from .diff import EditScript
+from .encoding import MAX_BROADCAST_COMMAND_LENGTH, TextChunker, TextEncoder, iter_graphemes
+from .keys import KeyScript
+from .metrics import NULL_METRICS
+from .plan import CommandPlan
+from .protocol import ACK_PATTERN, SEQUENCE_OVERHEAD, AdbBroadcastTransport, ProtocolError, WindowedSender
+from .stream import skip_chars, skip_units
+from .timing import DeadlineScheduler, TimingDrift, UniformTiming
+from .transport import CommandTimeout, LatencyStats
+
+# Where pushed text is staged on the device; ADBKeyboard can read its own external files directory
+PUSH_DIRECTORY = "/sdcard/Android/data/com.example.adbkeyboard/files"
+
+class DeviceSendResult:
+    """Progress and outcome of sending text to one device.
+
+    For streamed input `total_chars` is None; `total_bytes` is set instead
+    when the input size is known. A resumed send starts with `sent_chars`
+    and `sent_bytes` at the journaled offset, `resumed_from`.
+    """
+
+    def __init__(self, serial, total_chars=None, total_bytes=None):
+        self.serial = serial
+        self.total_chars = total_chars
+        self.total_bytes = total_bytes
+        self.sent_chars = 0
+        self.sent_bytes = 0
+        self.resumed_from = 0
+        self.retries = 0
+        self.reconnecting = False
+        self.elapsed = 0.0
+        self.error = None
+        self.finished = False
+        self.stopped = False
+        self.stats = LatencyStats()
+        self.timing = TimingDrift()
+        self.delivery = None
+        self.adaptive = None
+        self.edits = None
+        self.keys = None
+
+    @property
+    def chars_per_second(self):
+        sent = self.sent_chars - self.resumed_from
+        return sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def progress(self):
+        """Fraction of the input sent, or None when the input length is unknown."""
+        if self.total_chars:
+            return self.sent_chars / self.total_chars
+        if self.total_bytes:
+            return min(self.sent_bytes / self.total_bytes, 1.0)
+        return None
+
+    @property
+    def completed(self):
+        """True when the worker finished without an error or a stop request."""
+        return self.finished and self.error is None and not self.stopped
+
+class FanOutSender:
+    """Types the same text on several devices at once, one worker thread per device.
+
+    `shells` maps serials to shell transports (PersistentAdbShell or
+    SubprocessAdbShell). A slow or failing device only holds up its own
+    worker; the error is recorded on its result and the others carry on.
+    In per-character mode keys are paced by `timing` (a model from
+    autoinput.timing), or uniformly within `delay_range` in ms. In bulk
+    modes `ack_window` switches to acknowledged delivery (see
+    autoinput.protocol) with up to that many chunks in flight per device.
+
+    When a device goes away mid-send its worker retries the unsent part
+    with exponential backoff (`retry_delay` doubling up to `max_retry_delay`
+    seconds, `max_retries` times) and carries on from the last confirmed
+    character. With a `journal` (SendJournal) confirmed offsets are also
+    kept on disk, so an interrupted job can be resumed in a later run.
+
+    `metrics` (autoinput.metrics.Metrics) times every stage of the send
+    path per device; without it nothing is measured.
+
+    With chunk_mode "push" the whole text is streamed as raw UTF-8 to a file
+    on the device over the adb sync protocol, and a single ADB_INPUT_FILE
+    broadcast has ADBKeyboard type it; progress is confirmed once, at the end.
+    This always goes through the adb server socket (the shell's client, or
+    a default AdbClient), whichever shell transport the devices use.
+
+    run_edits() types only the difference between two texts: an
+    EditScript (autoinput.diff) of cursor moves, deletions and insertions
+    applied by ADBKeyboard's ADB_EDIT action.
+
+    run_keys() types text with special keys in "{ENTER}" markup (see
+    autoinput.keys): text in chunks of `chunk_size` and keys as `input
+    keyevent` calls, packed several to a shell command line.
+
+    With a `recorder` (autoinput.trace.SendRecorder) every broadcast,
+    edit and key line is written to a trace with its time, device and
+    outcome, for replay; pushed and acknowledged sends are not recorded.
+
+    `controllers` maps serials to AimdControllers (autoinput.adaptive) for
+    sending as fast as each device allows: the controller picks the size of
+    every chunk and the delay before it, and learns from round trips and
+    failed broadcasts. Those devices ignore `chunk_size`, `timing` and
+    `ack_window`.
+    """
+
+    def __init__(self, shells, chunk_mode=None, chunk_size=500, delay_range=None, on_progress=None,
+                 timing=None, ack_window=None, journal=None, max_retries=6, retry_delay=0.5,
+                 max_retry_delay=16.0, metrics=None, controllers=None, recorder=None):
+        self.shells = shells
+        self.chunk_mode = chunk_mode
+        self.chunk_size = chunk_size
+        self.delay_range = delay_range
+        self.timing = timing or (UniformTiming(*delay_range) if delay_range else None)
+        self.on_progress = on_progress
+        self.ack_window = ack_window if chunk_mode is not None else None
+        self.journal = journal
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.metrics = metrics or NULL_METRICS
+        self.controllers = controllers or {}
+        self.recorder = recorder
+        self.job_id = None
+        self.stop_event = threading.Event()
+        self.results = {}
+        self.elapsed = 0.0
+
+    def units(self, pieces):
+        """User-perceived characters in per-character mode, broadcast chunks otherwise.
+
+        A per-character unit is a whole grapheme cluster, so an emoji ZWJ
+        sequence or a letter with combining accents is one broadcast and
+        never shows up half-typed.
+        """
+        if self.chunk_mode is None:
+            return itertools.chain.from_iterable(map(iter_graphemes, pieces))
+        max_command_length = MAX_BROADCAST_COMMAND_LENGTH
+        if self.ack_window:
+            # Leave room for the session and sequence number extras
+            max_command_length -= SEQUENCE_OVERHEAD
+        return TextChunker(self.chunk_size, self.chunk_mode, max_command_length).stream_chunks(pieces)
+
+    @staticmethod
+    def adaptive_units(pieces, controller, returned):
+        """Character chunks sized by controller, which is asked again before every chunk.
+
+        Text appended to the list `returned` (a rejected chunk) is chunked
+        again at the current size before anything new.
+        """
+        chunker = TextChunker(controller.chunk_size, "chars")
+        chunks = chunker.stream_chunks(pieces)
+        while True:
+            if returned:
+                graphemes = list(iter_graphemes(returned.pop()))
+                if len(graphemes) > controller.chunk_size:
+                    returned.append("".join(graphemes[controller.chunk_size:]))
+                yield "".join(graphemes[:controller.chunk_size])
+                continue
+            chunker.size = controller.chunk_size
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def timed_units(self, units, serial):
+        """Yield units while timing how long each takes to read and chunk."""
+        metrics = self.metrics
+        units = iter(units)
+        while True:
+            read_at = time.perf_counter()
+            unit = next(units, None)
+            if unit is None:
+                return
+            metrics.observe("read", time.perf_counter() - read_at, serial=serial)
+            yield unit
+
+    def stop(self):
+        self.stop_event.set()
+
+    def report(self, result, force=False):
+        """Record confirmed progress in the journal and tell on_progress."""
+        metrics = self.metrics
+        if self.journal and self.job_id:
+            written_at = time.perf_counter()
+            self.journal.record(self.job_id, result.serial, result.sent_chars, result.sent_bytes, force)
+            if metrics:
+                metrics.observe("journal", time.perf_counter() - written_at, serial=result.serial)
+        if self.on_progress:
+            reported_at = time.perf_counter()
+            self.on_progress(result)
+            if metrics:
+                metrics.observe("progress", time.perf_counter() - reported_at, serial=result.serial)
+
+    def backoff(self, attempt, result, error):
+        """Wait before retry number `attempt`; returns False to give up.
+
+        Gives up after too many tries, when stopped, and on errors a retry
+        cannot fix (ProtocolError) or could repeat text (CommandTimeout).
+        """
+        if attempt > self.max_retries or isinstance(error, (ProtocolError, CommandTimeout)):
+            return False
+        result.retries += 1
+        self.metrics.count("retries", serial=result.serial)
+        if self.journal and self.job_id:
+            self.journal.record(self.job_id, result.serial, result.sent_chars, result.sent_bytes, force=True)
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** (attempt - 1))
+        result.reconnecting = True
+        if self.on_progress:
+            self.on_progress(result)
+        waited_at = time.perf_counter()
+        try:
+            return not self.stop_event.wait(delay)
+        finally:
+            result.reconnecting = False
+            self.metrics.observe("backoff", time.perf_counter() - waited_at, serial=result.serial)
+
+    def send_to_device(self, source, send, result):
+        """Worker for one device: send(source, result, started), then record how it ended."""
+        started = time.perf_counter()
+        try:
+            send(source, result, started)
+        except Exception as e:
+            result.error = e
+            self.metrics.count("device_errors", serial=result.serial)
+        finally:
+            close = getattr(source, "close", None)
+            if close:
+                close()
+            result.elapsed = time.perf_counter() - started
+            result.finished = True
+            if self.journal and self.job_id:
+                if result.completed:
+                    self.journal.complete(self.job_id, result.serial)
+                else:
+                    self.journal.record(self.job_id, result.serial, result.sent_chars, result.sent_bytes, force=True)
+            if self.on_progress:
+                self.on_progress(result)
+
+    def send_text(self, pieces, result, started):
+        """Send text pieces the way chunk_mode, ack_window and the device's controller ask for."""
+        # Skip what the device already has before anything is chunked or encoded
+        source = skip_chars(pieces, result.resumed_from) if result.resumed_from else pieces
+        if self.chunk_mode == "push":
+            self.send_pushed(source, result)
+        elif self.ack_window and result.serial not in self.controllers:
+            self.send_with_acks(source, result, started)
+        else:
+            self.send_each(source, result, started)
+
+    def send_payload(self, payload, result, started):
+        """Send prepared (unit, command) broadcasts back to back, skipping what the device already has."""
+        self.send_each((), result, started, plan=skip_units(payload, result.resumed_from))
+
+    def send_each(self, pieces, result, started, plan=None):
+        """Send one broadcast per unit, retrying a unit until its device confirms it.
+
+        Outside adaptive mode the units are read, chunked and encoded ahead
+        of time by a CommandPlan, so this loop only waits, sends and counts;
+        a ready `plan` of (unit, command) pairs replaces pieces altogether.
+        """
+        serial = result.serial
+        shell = self.shells[serial]
+        metrics = self.metrics
+        controller = self.controllers.get(serial)
+        result.adaptive = controller
+        # Bulk chunks go out back to back
+        scheduler = None
+        if self.timing and self.chunk_mode is None and controller is None:
+            scheduler = DeadlineScheduler(self.timing, result.timing)
+        returned = []
+        if plan is None:
+            units = self.adaptive_units(pieces, controller, returned) if controller else self.units(pieces)
+            if metrics:
+                units = self.timed_units(units, serial)
+            if controller:
+                # The controller sizes every chunk after the previous round trip, so nothing can be encoded ahead
+                plan = ((unit, None) for unit in units)
+            else:
+                plan = CommandPlan(units, self.chunk_mode is None, metrics=metrics, serial=serial)
+        try:
+            for unit, command in plan:
+                if self.stop_event.is_set():
+                    result.stopped = True
+                    return
+                if scheduler:
+                    waited_at = time.perf_counter()
+                    if not scheduler.wait(unit, self.stop_event):
+                        result.stopped = True
+                        return
+                    if metrics:
+                        metrics.observe("wait", time.perf_counter() - waited_at, serial=serial)
+                elif controller and controller.interval:
+                    waited_at = time.perf_counter()
+                    if self.stop_event.wait(controller.interval):
+                        result.stopped = True
+                        return
+                    if metrics:
+                        metrics.observe("wait", time.perf_counter() - waited_at, serial=serial)
+                if command is None:
+                    encoded_at = time.perf_counter()
+                    command = TextEncoder.encode_broadcast(unit)
+                    if metrics:
+                        metrics.observe("encode", time.perf_counter() - encoded_at, serial=serial)
+                attempt = 0
+                while True:
+                    sent_at = time.perf_counter()
+                    try:
+                        if metrics:
+                            metrics.count("broadcasts", serial=serial)
+                        returncode, output = shell.run(command)
+                        if returncode != 0:
+                            raise subprocess.CalledProcessError(returncode, command, output)
+                        round_trip = time.perf_counter() - sent_at
+                        result.stats.add(round_trip)
+                        if metrics:
+                            metrics.observe("roundtrip", round_trip, serial=serial)
+                        if controller:
+                            controller.on_success(round_trip, len(unit))
+                        if self.recorder:
+                            self.recorder.record(serial, sent_at, round_trip, unit=unit)
+                        break
+                    except (AdbError, OSError, subprocess.CalledProcessError) as e:
+                        if self.recorder:
+                            self.recorder.record(serial, sent_at, unit=unit, error=e)
+                        if controller:
+                            controller.on_failure()
+                            if isinstance(e, subprocess.CalledProcessError) and not controller.throttled:
+                                # The device refused the chunk: send it again smaller or later, not after a reconnect delay
+                                if len(list(iter_graphemes(unit))) > controller.chunk_size:
+                                    returned.append(unit)
+                                    break
+                                if self.stop_event.wait(controller.interval):
+                                    result.stopped = True
+                                    return
+                                continue
+                        attempt += 1
+                        if not self.backoff(attempt, result, e):
+                            if self.stop_event.is_set():
+                                result.stopped = True
+                                return
+                            raise
+                if returned and returned[-1] is unit:
+                    continue
+                size = len(unit.encode('utf-8'))
+                result.sent_chars += len(unit)
+                result.sent_bytes += size
+                if metrics:
+                    metrics.count("chars_sent", len(unit), serial=serial)
+                    metrics.count("bytes_sent", size, serial=serial)
+                result.elapsed = time.perf_counter() - started
+                self.report(result)
+        finally:
+            if isinstance(plan, CommandPlan):
+                plan.close()
+
+    def send_pushed(self, pieces, result):
+        """Push the text to a file on the device and have ADBKeyboard type it with one broadcast.
+
+        The file goes over the adb server's sync protocol, so this path always
+        talks to the adb server socket, even with SubprocessAdbShell. The file
+        is removed here unless ADBKeyboard got to it, which deletes it itself.
+        """
+        serial = result.serial
+        client = getattr(self.shells[serial], "client", None) or AdbClient()
+        metrics = self.metrics
+        remote_path = f"{PUSH_DIRECTORY}/autoinput-{uuid.uuid4().hex[:12]}.txt"
+
+        def blocks():
+            for piece in pieces:
+                if self.stop_event.is_set():
+                    raise InterruptedError("send stopped")
+                yield piece.encode('utf-8')
+
+        handed_over = False
+        try:
+            pushed_at = time.perf_counter()
+            try:
+                size = client.push(blocks(), remote_path, serial)
+            except InterruptedError:
+                result.stopped = True
+                return
+            if metrics:
+                metrics.observe("push", time.perf_counter() - pushed_at, serial=serial)
+                metrics.count("broadcasts", serial=serial)
+
+            sent_at = time.perf_counter()
+            output = client.shell(TextEncoder.encode_file_broadcast(remote_path), serial)
+            result.stats.add(time.perf_counter() - sent_at)
+            match = ACK_PATTERN.search(output)
+            reply = match.group(2) if match else None
+            if not reply or not reply.startswith(("OK ", "ERR ")):
+                raise ProtocolError("ADBKeyboard did not type the pushed file; "
+                                    "please install a version that supports ADB_INPUT_FILE")
+            handed_over = True
+            kind, committed, message = (reply.split(" ", 2) + [""])[:3]
+            result.sent_chars += int(committed)
+            if kind == "ERR":
+                raise ProtocolError(f"ADBKeyboard stopped typing the pushed file after {committed} characters: {message}")
+            result.sent_bytes += size
+            if metrics:
+                metrics.observe("roundtrip", time.perf_counter() - sent_at, serial=serial)
+                metrics.count("chars_sent", int(committed), serial=serial)
+                metrics.count("bytes_sent", size, serial=serial)
+            self.report(result)
+        finally:
+            if not handed_over:
+                try:
+                    client.shell(f'rm -f "{remote_path}"', serial)
+                except (AdbError, OSError):
+                    # The device is gone; so is the chance to clean up
+                    pass
+
+    def send_edits(self, script, result, started):
+        """Apply an EditScript on the device, one ADB_EDIT broadcast per batch of edits.
+
+        Edits are not retried: a batch whose reply was lost may already have
+        been applied, and applying it twice would garble the text.
+        """
+        serial = result.serial
+        client = getattr(self.shells[serial], "client", None) or AdbClient()
+        metrics = self.metrics
+        result.edits = script
+        for command, inserted in script.batches():
+            if self.stop_event.is_set():
+                result.stopped = True
+                return
+            if metrics:
+                metrics.count("broadcasts", serial=serial)
+            sent_at = time.perf_counter()
+            output = client.shell(command, serial)
+            round_trip = time.perf_counter() - sent_at
+            result.stats.add(round_trip)
+            if self.recorder:
+                self.recorder.record(serial, sent_at, round_trip, command=command)
+            match = ACK_PATTERN.search(output)
+            reply = match.group(2) if match else None
+            if not reply or not reply.startswith(("OK ", "ERR ")):
+                raise ProtocolError("ADBKeyboard did not apply the changes; "
+                                    "please install a version that supports ADB_EDIT")
+            if reply.startswith("ERR "):
+                raise ProtocolError(f"ADBKeyboard could not apply the changes: {reply.split(' ', 2)[-1]}")
+            result.sent_chars += inserted
+            if metrics:
+                metrics.observe("roundtrip", round_trip, serial=serial)
+                metrics.count("chars_sent", inserted, serial=serial)
+            result.elapsed = time.perf_counter() - started
+            self.report(result)
+
+    def send_keys(self, script, result, started):
+        """Run a KeyScript on the device's shell, one command line per batch.
+
+        The commands in a line are joined with "&&", so the first failing
+        one stops the line and its status fails the whole batch. Lines are
+        not retried: part of a failed line may already have been typed, and
+        typing it again would repeat text or keys.
+        """
+        serial = result.serial
+        shell = self.shells[serial]
+        metrics = self.metrics
+        result.keys = script
+        for command, chars in script.batches(self.chunk_size):
+            if self.stop_event.is_set():
+                result.stopped = True
+                return
+            sent_at = time.perf_counter()
+            returncode, output = shell.run(command)
+            round_trip = time.perf_counter() - sent_at
+            if returncode != 0:
+                error = subprocess.CalledProcessError(returncode, command, output)
+                if self.recorder:
+                    self.recorder.record(serial, sent_at, command=command, error=error)
+                raise error
+            result.stats.add(round_trip)
+            if self.recorder:
+                self.recorder.record(serial, sent_at, round_trip, command=command)
+            result.sent_chars += chars
+            if metrics:
+                metrics.observe("roundtrip", round_trip, serial=serial)
+                metrics.count("chars_sent", chars, serial=serial)
+            result.elapsed = time.perf_counter() - started
+            self.report(result)
+
+    def send_with_acks(self, pieces, result, started):
+        """Pipeline chunks over a dedicated shell session, each acknowledged by ADBKeyboard.
+
+        If the session breaks, a new one is opened after a backoff and the
+        send carries on where the device's acknowledgements left off.
+        """
+        # Imported here: asyncio is slow to import and only acknowledged sends need it
+        import asyncio
+
+        client = getattr(self.shells[result.serial], "client", None)
+        units = self.units(pieces)
+        sender = WindowedSender(None, self.ack_window, metrics=self.metrics)
+        attempt = 0
+        while True:
+            sender.transport = AdbBroadcastTransport(result.serial, client)
+            try:
+                asyncio.run(sender.deliver(
+                    units,
+                    result=result,
+                    on_progress=self.report,
+                    stop_event=self.stop_event,
+                    resume=attempt > 0
+                ))
+                break
+            except (AdbError, OSError) as e:
+                attempt += 1
+                if not self.backoff(attempt, result, e):
+                    if self.stop_event.is_set():
+                        break
+                    raise
+            finally:
+                result.elapsed = time.perf_counter() - started
+        result.stopped = self.stop_event.is_set()
+
+    def run(self, text, job_id=None, resume=False):
+        """Send text to every device and wait for all workers; returns {serial: DeviceSendResult}.
+
+        With a journal, progress is recorded under `job_id` (by default
+        derived from the text) and `resume` continues where each device
+        left off last time.
+        """
+        text = unicodedata.normalize('NFC', text)
+        if self.journal and job_id is None:
+            job_id = self.journal.text_job_id(text)
+        return self.run_sources(
+            {serial: [text] for serial in self.shells},
+            total_chars=len(text),
+            job_id=job_id,
+            resume=resume
+        )
+
+    def run_edits(self, old_text, new_text):
+        """Turn old_text, typed earlier with the cursor still after it, into new_text on every device.
+
+        Only the changes are sent; returns {serial: DeviceSendResult} where
+        `total_chars` and `sent_chars` count inserted characters.
+        """
+        script = EditScript.from_texts(old_text, new_text)
+        return self.run_units(dict.fromkeys(self.shells, script), self.send_edits, total_chars=script.inserted_chars)
+
+    def run_keys(self, markup):
+        """Type text with "{ENTER}"-style special keys on every device; returns {serial: DeviceSendResult}.
+
+        Raises ValueError for an unknown key name before anything is sent.
+        """
+        script = KeyScript.from_markup(markup)
+        return self.run_units(dict.fromkeys(self.shells, script), self.send_keys, total_chars=script.chars)
+
+    def run_payload(self, payload, job_id=None, resume=False):
+        """Send prepared (unit, command) broadcasts, e.g. from TextStore.payload(), to every device.
+
+        Returns {serial: DeviceSendResult}. The broadcasts go out back to
+        back as in a bulk chunk mode; `job_id` and `resume` work as in run().
+        """
+        return self.run_units(
+            dict.fromkeys(self.shells, payload),
+            self.send_payload,
+            total_chars=sum(len(unit) for unit, command in payload),
+            job_id=job_id,
+            resume=resume
+        )
+
+    def run_sources(self, sources, total_chars=None, job_id=None, resume=False):
+        """Stream {serial: iterable of text pieces} to the devices, e.g. from open_text_sources()."""
+        return self.run_units(sources, self.send_text, total_chars, job_id, resume)
+
+    def run_units(self, sources, send, total_chars=None, job_id=None, resume=False):
+        """Run send(sources[serial], result, started) for every device at once; returns {serial: DeviceSendResult}.
+
+        `send` is the strategy: send_text for text pieces, send_payload for
+        prepared broadcasts, send_edits for an EditScript and send_keys for
+        a KeyScript.
+        """
+        self.stop_event.clear()
+        self.job_id = job_id if self.journal else None
+        if self.job_id and not resume:
+            self.journal.discard(self.job_id)
+        self.results = {
+            serial: DeviceSendResult(serial, total_chars, getattr(sources[serial], "total_bytes", None))
+            for serial in self.shells
+        }
+        if self.job_id and resume:
+            for serial, result in self.results.items():
+                result.resumed_from, result.sent_bytes = self.journal.offset(self.job_id, serial)
+                result.sent_chars = result.resumed_from
+        workers = [
+            threading.Thread(target=self.send_to_device, args=(sources[serial], send, result), daemon=True)
+            for serial, result in self.results.items()
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.perf_counter() - started
+        return self.results
+
+    def aggregate_rate(self):
+        """Characters per second delivered across all devices (not counting resumed offsets)."""
+        sent = sum(result.sent_chars - result.resumed_from for result in self.results.values())
+        elapsed = self.elapsed or max((r.elapsed for r in self.results.values()), default=0.0)
+        return sent / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from .encoding import TextChunker, TextEncoder
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".autoinput", "history.sqlite3")
+
+# Stored texts plus cached payloads above this size evict the least recently used history entries
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# SQLite reads the database through a memory map of up to this many bytes
+MMAP_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (
+    key TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    chars INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    name TEXT UNIQUE,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS texts_last_used ON texts (last_used);
+CREATE TABLE IF NOT EXISTS payloads (
+    key TEXT NOT NULL REFERENCES texts (key) ON DELETE CASCADE,
+    chunk_mode TEXT NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    units TEXT NOT NULL,
+    commands TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (key, chunk_mode, chunk_size)
+);
+"""
+
+class TextStore:
+    """Sent texts and named snippets in an SQLite file, keyed by the hash of their content.
+
+    The same text is stored once however often it is sent; add() stores
+    it and used() counts a completed send. A `name` turns an entry into a snippet that can be
+    recalled by name. payload() caches the encoded broadcasts of a text
+    for a chunk mode and size next to it, so sending a stored text again
+    needs neither the editor nor the encoder. When texts and payloads
+    together exceed `max_bytes`, the least recently used unnamed entries
+    are evicted, then the least recently used payloads (they can be
+    rebuilt). Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute(f"PRAGMA mmap_size = {MMAP_BYTES}")
+        self.db.execute("PRAGMA journal_mode = WAL")  # The GUI and the command line may use the store at once
+        self.db.executescript(SCHEMA)
+
+    @staticmethod
+    def key(text):
+        """Content key of text: the SHA-256 of its NFC form, in hex."""
+        return hashlib.sha256(unicodedata.normalize('NFC', text).encode('utf-8')).hexdigest()
+
+    def add(self, text, name=None):
+        """Store text if it is new and return its key; `name` makes it a snippet.
+
+        Nothing is counted as used: call used() once a send has completed.
+        """
+        text = unicodedata.normalize('NFC', text)
+        key = self.key(text)
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR IGNORE INTO texts (key, text, chars, bytes, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, text, len(text), len(text.encode('utf-8')), now, now)
+            )
+            if name:
+                self.db.execute("UPDATE texts SET name = NULL WHERE name = ?", (name,))
+                self.db.execute("UPDATE texts SET name = ? WHERE key = ?", (name, key))
+            self.evict(keep=key)
+        return key
+
+    def get(self, key):
+        """The text stored under key, or None; counts as a use for eviction."""
+        with self.lock, self.db:
+            row = self.db.execute("SELECT text FROM texts WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.db.execute("UPDATE texts SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def used(self, key):
+        """Count a completed send of the text stored under key."""
+        with self.lock, self.db:
+            self.db.execute("UPDATE texts SET last_used = ?, uses = uses + 1 WHERE key = ?", (time.time(), key))
+
+    def resolve(self, reference):
+        """Key of the snippet named reference, or of the one entry whose key starts with it.
+
+        Raises KeyError if there is no such entry or the prefix is ambiguous.
+        """
+        with self.lock:
+            row = self.db.execute("SELECT key FROM texts WHERE name = ?", (reference,)).fetchone()
+            if row:
+                return row[0]
+            rows = self.db.execute(
+                "SELECT key FROM texts WHERE key >= ? AND key < ? LIMIT 2",
+                # Keys are lowercase hex, which sorts before "g"
+                (reference, reference + "g")
+            ).fetchall()
+        if len(rows) != 1 or not reference:
+            raise KeyError(f"{'ambiguous' if len(rows) > 1 else 'no'} history entry {reference!r}")
+        return rows[0][0]
+
+    def entries(self, limit=100, preview_chars=80):
+        """Snippets first, then history by most recent use: a list of dicts without the full text."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT key, name, chars, bytes, created, last_used, uses, substr(text, 1, ?) FROM texts "
+                "ORDER BY name IS NULL, name, last_used DESC LIMIT ?",
+                (preview_chars, limit)
+            ).fetchall()
+        fields = ("key", "name", "chars", "bytes", "created", "last_used", "uses", "preview")
+        return [dict(zip(fields, row)) for row in rows]
+
+    def rename(self, key, name):
+        """Name an entry, making it a snippet; an empty name makes it plain history again."""
+        with self.lock, self.db:
+            if name:
+                self.db.execute("UPDATE texts SET name = NULL WHERE name = ?", (name,))
+            self.db.execute("UPDATE texts SET name = ? WHERE key = ?", (name or None, key))
+
+    def remove(self, key):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM texts WHERE key = ?", (key,))
+
+    def payload(self, key, chunk_mode, chunk_size):
+        """(unit, command) pairs of ADB_INPUT_B64 broadcasts for a stored text, built once and then cached.
+
+        `chunk_mode` is one of TextChunker.MODES. Raises KeyError if the
+        text is not in the store.
+        """
+        if chunk_mode not in TextChunker.MODES:
+            raise ValueError(f"Unknown chunk mode: {chunk_mode}")
+        now = time.time()
+        with self.lock, self.db:
+            row = self.db.execute(
+                "SELECT units, commands FROM payloads WHERE key = ? AND chunk_mode = ? AND chunk_size = ?",
+                (key, chunk_mode, chunk_size)
+            ).fetchone()
+            if row:
+                self.db.execute(
+                    "UPDATE payloads SET last_used = ? WHERE key = ? AND chunk_mode = ? AND chunk_size = ?",
+                    (now, key, chunk_mode, chunk_size)
+                )
+                self.db.execute("UPDATE texts SET last_used = ? WHERE key = ?", (now, key))
+                return list(zip(json.loads(row[0]), row[1].split("\n")))
+            row = self.db.execute("SELECT text FROM texts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(f"no history entry {key!r}")
+        # Encode outside the lock; another thread may cache the same payload meanwhile
+        units = list(TextChunker(chunk_size, chunk_mode).chunks(row[0]))
+        commands = [TextEncoder.encode_broadcast(unit) for unit in units]
+        units_json = json.dumps(units, ensure_ascii=False)
+        commands_text = "\n".join(commands)
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO payloads (key, chunk_mode, chunk_size, units, commands, bytes, last_used) "
+                "SELECT ?, ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM texts WHERE key = ?)",
+                (key, chunk_mode, chunk_size, units_json, commands_text,
+                 len(units_json.encode('utf-8')) + len(commands_text), now, key)
+            )
+            self.db.execute("UPDATE texts SET last_used = ? WHERE key = ?", (now, key))
+            self.evict(keep=key)
+        return list(zip(units, commands))
+
+    def size(self):
+        """Bytes of stored text and cached payloads."""
+        with self.lock:
+            return self._size()
+
+    def _size(self):
+        texts, = self.db.execute("SELECT COALESCE(SUM(bytes), 0) FROM texts").fetchone()
+        payloads, = self.db.execute("SELECT COALESCE(SUM(bytes), 0) FROM payloads").fetchone()
+        return texts + payloads
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the store fits max_bytes (call with the lock held).
+
+        Snippets and the entry `keep` stay; their payloads may go.
+        """
+        excess = self._size() - self.max_bytes
+        if excess <= 0:
+            return
+        rows = self.db.execute(
+            "SELECT key, bytes + (SELECT COALESCE(SUM(bytes), 0) FROM payloads WHERE payloads.key = texts.key) "
+            "FROM texts WHERE name IS NULL AND key != ? ORDER BY last_used",
+            (keep or "",)
+        ).fetchall()
+        for key, size in rows:
+            if excess <= 0:
+                return
+            self.db.execute("DELETE FROM texts WHERE key = ?", (key,))
+            excess -= size
+        rows = self.db.execute("SELECT key, chunk_mode, chunk_size, bytes FROM payloads ORDER BY last_used").fetchall()
+        for key, chunk_mode, chunk_size, size in rows:
+            if excess <= 0:
+                return
+            self.db.execute(
+                "DELETE FROM payloads WHERE key = ? AND chunk_mode = ? AND chunk_size = ?", (key, chunk_mode, chunk_size)
+            )
+            excess -= size
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".autoinput", "journal")
+
+class SendJournal:
+    """Remembers how far each device got through a send, so it can be resumed later.
+
+    One small JSON file per job holds the confirmed character and byte
+    offsets per device serial. Progress is written at most every
+    `min_interval` seconds while a send runs and immediately when it fails,
+    stops or finishes; a job's file is removed once every device is done.
+    """
+
+    def __init__(self, directory=DEFAULT_JOURNAL_DIR, min_interval=0.25):
+        self.directory = directory
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.last_write = {}
+
+    @staticmethod
+    def text_job_id(text):
+        """Job id for typing text; the same text always maps to the same job."""
+        digest = hashlib.sha256(unicodedata.normalize('NFC', text).encode('utf-8'))
+        return SendJournal.digest_job_id(digest.hexdigest())
+
+    @staticmethod
+    def digest_job_id(digest):
+        """Job id for a text with the given SHA-256 hex digest, such as a TextStore key."""
+        return "text-" + digest[:20]
+
+    @staticmethod
+    def file_job_id(path):
+        """Job id for streaming a file; changes when the file is modified."""
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return "file-" + hashlib.sha256(key.encode('utf-8')).hexdigest()[:20]
+
+    def path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def load(self, job_id):
+        """Return {serial: {"chars": n, "bytes": n}} for job_id (cached after the first read)."""
+        with self.lock:
+            return self._load(job_id)
+
+    def _load(self, job_id):
+        if job_id not in self.jobs:
+            try:
+                with open(self.path(job_id), encoding="utf-8") as f:
+                    self.jobs[job_id] = json.load(f).get("devices", {})
+            except (OSError, ValueError):
+                self.jobs[job_id] = {}
+        return self.jobs[job_id]
+
+    def offset(self, job_id, serial):
+        """Confirmed (chars, bytes) of job_id on serial; (0, 0) if there is nothing to resume."""
+        entry = self.load(job_id).get(serial)
+        if not entry:
+            return 0, 0
+        return entry.get("chars", 0), entry.get("bytes", 0)
+
+    def record(self, job_id, serial, chars, size, force=False):
+        """Note that serial has confirmed `chars` characters (`size` bytes) of job_id."""
+        with self.lock:
+            self._load(job_id)[serial] = {"chars": chars, "bytes": size}
+            now = time.monotonic()
+            if force or now - self.last_write.get(job_id, 0.0) >= self.min_interval:
+                self.last_write[job_id] = now
+                self._write(job_id)
+
+    def complete(self, job_id, serial):
+        """Forget serial's progress once it has received the whole job."""
+        with self.lock:
+            self._load(job_id).pop(serial, None)
+            self._write(job_id)
+
+    def discard(self, job_id):
+        """Forget job_id entirely, e.g. to start it over."""
+        with self.lock:
+            self.jobs[job_id] = {}
+            self._write(job_id)
+
+    def _write(self, job_id):
+        devices = self.jobs.get(job_id)
+        path = self.path(job_id)
+        try:
+            if not devices:
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            # Write a new file and swap it in, so a crash never leaves a torn journal
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"job": job_id, "updated": time.time(), "devices": devices}, f)
+            os.replace(temp_path, path)
+        except OSError:
+            # Journaling is best effort and must never break a send
+            pass
@@ -0,0 +1,120 @@
+import re
+import unicodedata
+
+from .encoding import MAX_BROADCAST_COMMAND_LENGTH, TextChunker, TextEncoder
+
+# Key names usable in markup, mapped to Android KeyEvent codes
+KEYCODES = {
+    "BACK": 4,
+    "UP": 19,
+    "DOWN": 20,
+    "LEFT": 21,
+    "RIGHT": 22,
+    "TAB": 61,
+    "SPACE": 62,
+    "ENTER": 66,
+    "BACKSPACE": 67,
+    "PAGEUP": 92,
+    "PAGEDOWN": 93,
+    "ESC": 111,
+    "DELETE": 112,
+    "HOME": 122,
+    "END": 123,
+}
+
+# "{{" is a literal brace; "{NAME}" or "{NAME n}" presses a key n times
+KEY_PATTERN = re.compile(r"\{\{|\{([A-Za-z]+)(?: (\d+))?\}")
+
+# Joins the commands packed into one shell line; a failing command stops the rest of the line
+COMMAND_SEPARATOR = " && "
+
+class KeyScript:
+    """Text with special keys, compiled into as few shell commands as possible.
+
+    Markup is "{ENTER}", "{TAB}", "{BACKSPACE}" and the other KEYCODES
+    names (any case), optionally with a repeat count as in "{TAB 3}";
+    "{{" types a literal "{". Other braces are typed as they are.
+
+    `segments` are ("text", text) and ("keys", [keycode, ...]) pairs. Text
+    goes out as ADB_INPUT_B64 broadcasts and a run of keys as a single
+    `input keyevent` with several codes; batches() then packs consecutive
+    commands into shell lines of up to the command length limit, so a form
+    with a few fields takes a round trip or two instead of one per key.
+    """
+
+    def __init__(self, segments):
+        self.segments = segments
+
+    @classmethod
+    def from_markup(cls, markup):
+        """Parse markup; raises ValueError for an unknown key name."""
+        segments = []
+        position = 0
+        for match in KEY_PATTERN.finditer(markup):
+            cls.append_text(segments, markup[position:match.start()])
+            position = match.end()
+            if match.group(0) == "{{":
+                cls.append_text(segments, "{")
+                continue
+            name = match.group(1).upper()
+            if name not in KEYCODES:
+                raise ValueError(f"Unknown key {match.group(0)} at character {match.start()}; "
+                                 f"write {{{{ for a literal brace")
+            codes = [KEYCODES[name]] * int(match.group(2) or 1)
+            if segments and segments[-1][0] == "keys":
+                segments[-1][1].extend(codes)
+            elif codes:
+                segments.append(("keys", codes))
+        cls.append_text(segments, markup[position:])
+        return cls([(kind, unicodedata.normalize('NFC', value) if kind == "text" else value)
+                    for kind, value in segments])
+
+    @staticmethod
+    def append_text(segments, text):
+        if not text:
+            return
+        if segments and segments[-1][0] == "text":
+            segments[-1] = ("text", segments[-1][1] + text)
+        else:
+            segments.append(("text", text))
+
+    @property
+    def chars(self):
+        return sum(len(value) for kind, value in self.segments if kind == "text")
+
+    @property
+    def keys(self):
+        return sum(len(value) for kind, value in self.segments if kind == "keys")
+
+    def parts(self, chunk_size=500, max_command_length=MAX_BROADCAST_COMMAND_LENGTH):
+        """Yield (device-side command, characters typed) for every broadcast and keyevent call, in order."""
+        chunker = TextChunker(chunk_size, "chars", max_command_length)
+        for kind, value in self.segments:
+            if kind == "text":
+                for chunk in chunker.stream_chunks([value]):
+                    yield TextEncoder.encode_broadcast(chunk), len(chunk)
+                continue
+            command = "input keyevent"
+            for code in value:
+                if len(command) + len(str(code)) + 1 > max_command_length:
+                    yield command, 0
+                    command = "input keyevent"
+                command += f" {code}"
+            yield command, 0
+
+    def batches(self, chunk_size=500, max_command_length=MAX_BROADCAST_COMMAND_LENGTH):
+        """The script as shell lines that each fit the length limit: (line, characters typed) pairs."""
+        batches, batch, length, chars = [], [], 0, 0
+        for command, typed in self.parts(chunk_size, max_command_length):
+            if batch and length + len(COMMAND_SEPARATOR) + len(command) > max_command_length:
+                batches.append((COMMAND_SEPARATOR.join(batch), chars))
+                batch, length, chars = [], 0, 0
+            length += len(command) + (len(COMMAND_SEPARATOR) if batch else 0)
+            batch.append(command)
+            chars += typed
+        if batch:
+            batches.append((COMMAND_SEPARATOR.join(batch), chars))
+        return batches
+
+    def describe(self):
+        return f"{self.chars} characters and {self.keys} special key(s)"
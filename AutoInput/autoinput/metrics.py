@@ -0,0 +1,146 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+STAGE_HELP = "Time spent in each stage of the send path."
+
+COUNTER_HELP = {
+    "chars_sent": "Characters confirmed by the device.",
+    "bytes_sent": "UTF-8 bytes confirmed by the device.",
+    "broadcasts": "Broadcast commands issued, including retries and retransmits.",
+    "retries": "Reconnect attempts after a device became unreachable.",
+    "retransmits": "Acknowledged-delivery chunks sent again after a timeout.",
+    "device_errors": "Sends that ended with an error on a device.",
+}
+
+class NullMetrics:
+    """Stand-in used when instrumentation is off; every call does nothing.
+
+    It is falsy, so hot paths can skip taking timestamps with `if metrics:`.
+    """
+    enabled = False
+
+    def __bool__(self):
+        return False
+
+    def observe(self, stage, seconds, **labels):
+        pass
+
+    def count(self, name, value=1, **labels):
+        pass
+
+    def close(self):
+        pass
+
+NULL_METRICS = NullMetrics()
+
+class Metrics:
+    """Per-stage histograms and counters of the send path, with optional JSONL tracing.
+
+    Stages are timed with observe("encode", seconds, serial=...) and events
+    counted with count("chars_sent", n, serial=...). With `trace_path` every
+    observation is also appended to that file as one JSON object per line.
+    write_prometheus() exports everything in the Prometheus text format.
+    """
+    enabled = True
+
+    def __init__(self, trace_path=None):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (stage, labels) -> [bucket counts..., +Inf count, sum]
+        self.counters = {}    # (name, labels) -> value
+        self.trace = open(trace_path, "a", encoding="utf-8") if trace_path else None
+
+    def __bool__(self):
+        return True
+
+    def observe(self, stage, seconds, **labels):
+        key = (stage, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(STAGE_BUCKETS) + 1) + [0.0]
+            histogram[bisect.bisect_left(STAGE_BUCKETS, seconds)] += 1
+            histogram[-1] += seconds
+            if self.trace:
+                self.trace.write(json.dumps({"ts": time.time(), "stage": stage, "ms": seconds * 1000.0, **labels}) + "\n")
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            if self.trace:
+                self.trace.write(json.dumps({"ts": time.time(), "counter": name, "value": value, **labels}) + "\n")
+
+    def stage_totals(self):
+        """Return {stage: (count, total seconds)} summed over all labels."""
+        totals = {}
+        with self.lock:
+            for (stage, _), histogram in self.histograms.items():
+                count, seconds = totals.get(stage, (0, 0.0))
+                totals[stage] = (count + sum(histogram[:-1]), seconds + histogram[-1])
+        return totals
+
+    def describe(self):
+        """Multi-line breakdown of where the time went, largest stage first."""
+        totals = sorted(self.stage_totals().items(), key=lambda item: item[1][1], reverse=True)
+        lines = [f"{'stage':<12}{'count':>10}{'total s':>12}{'mean ms':>12}"]
+        for stage, (count, seconds) in totals:
+            lines.append(f"{stage:<12}{count:>10}{seconds:>12.3f}{seconds / count * 1000.0 if count else 0.0:>12.3f}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (
+            f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+            for name, value in pairs
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    def prometheus_text(self):
+        lines = [
+            f"# HELP autoinput_stage_seconds {STAGE_HELP}",
+            "# TYPE autoinput_stage_seconds histogram",
+        ]
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for (stage, labels), histogram in histograms:
+            labels = (("stage", stage),) + labels
+            cumulative = 0
+            for bound, bucket in zip(STAGE_BUCKETS, histogram):
+                cumulative += bucket
+                lines.append(f"autoinput_stage_seconds_bucket{self.format_labels(labels, [('le', repr(bound))])} {cumulative}")
+            cumulative += histogram[len(STAGE_BUCKETS)]
+            lines.append(f"autoinput_stage_seconds_bucket{self.format_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"autoinput_stage_seconds_sum{self.format_labels(labels)} {histogram[-1]}")
+            lines.append(f"autoinput_stage_seconds_count{self.format_labels(labels)} {cumulative}")
+        described = set()
+        for (name, labels), value in counters:
+            metric = f"autoinput_{name}_total"
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {metric} {COUNTER_HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{self.format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write all metrics in the Prometheus text format (atomically, for textfile collectors)."""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def close(self):
+        with self.lock:
+            if self.trace:
+                self.trace.close()
+                self.trace = None
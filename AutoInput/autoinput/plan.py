@@ -0,0 +1,83 @@
+import queue
+import threading
+import time
+
+from .encoding import TextEncoder
+
+# Commands the producer may encode ahead of the sender
+DEFAULT_PLAN_AHEAD = 1024
+
+# Most commands handed over at once; a queue hand-off costs more than encoding one character
+PLAN_BATCH = 64
+
+class CommandPlan:
+    """Encodes send units into broadcast commands on a producer thread, ahead of the sender.
+
+    Iterating yields (unit, command) pairs in order. The producer pulls
+    `units` (so reading and chunking move off the send thread too), encodes
+    each one and queues it, at most `ahead` commands ahead; the sender
+    only takes ready commands off the queue. Commands are handed over in
+    batches of up to PLAN_BATCH, or sooner when the sender has run out, so
+    the hand-off costs less than the encoding it saves. With `per_char` units are
+    grapheme clusters and go through the memoized
+    TextEncoder.encode_grapheme. An error in the producer is raised from
+    the iteration. close() stops the producer, e.g. when a send is stopped
+    before the units run out.
+    """
+    DONE = object()
+
+    def __init__(self, units, per_char=False, ahead=DEFAULT_PLAN_AHEAD, metrics=None, serial=None):
+        self.units = units
+        self.encode = TextEncoder.encode_grapheme if per_char else TextEncoder.encode_broadcast
+        self.queue = queue.Queue(maxsize=max(1, ahead // PLAN_BATCH))
+        self.metrics = metrics
+        self.serial = serial
+        self.closed = threading.Event()
+        self.thread = None
+
+    def produce(self):
+        metrics = self.metrics
+        encode = self.encode
+        batch = []
+        try:
+            for unit in self.units:
+                encoded_at = time.perf_counter()
+                batch.append((unit, encode(unit)))
+                if metrics:
+                    metrics.observe("encode", time.perf_counter() - encoded_at, serial=self.serial)
+                if len(batch) >= PLAN_BATCH or self.queue.empty():
+                    if not self.put(batch):
+                        return
+                    batch = []
+            if batch and not self.put(batch):
+                return
+            self.put(self.DONE)
+        except Exception as e:
+            # Units read before the error still go out
+            if not batch or self.put(batch):
+                self.put(e)
+
+    def put(self, item):
+        """Queue item, waiting for room; False once the plan is closed."""
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.produce, daemon=True)
+            self.thread.start()
+        while True:
+            item = self.queue.get()
+            if item is self.DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+
+    def close(self):
+        self.closed.set()
@@ -0,0 +1,90 @@
+import unicodedata
+
+from .encoding import TextChunker, iter_graphemes, last_safe_boundary
+
+# Characters shown at a time by a paged preview
+DEFAULT_PAGE_CHARS = 20000
+
+# Assumed adb round trip per broadcast when nothing has been measured yet
+DEFAULT_ROUND_TRIP = 0.03
+
+# Assumed adb sync throughput for push mode (USB 2.0 in practice)
+PUSH_BYTES_PER_SECOND = 20 * 1024 * 1024
+
+class TextPages:
+    """Splits a long text into pages, so a preview only ever renders one of them.
+
+    Pages hold about `page_chars` characters and end after a newline when
+    there is one in their second half, otherwise between two grapheme
+    clusters. Finding the boundaries does not copy the text; page() slices
+    out just the requested page.
+    """
+
+    def __init__(self, text, page_chars=DEFAULT_PAGE_CHARS):
+        self.text = text
+        self.starts = [0]
+        start = 0
+        while len(text) - start > page_chars:
+            end = start + page_chars
+            newline = text.rfind("\n", start + page_chars // 2, end)
+            if newline != -1:
+                end = newline + 1
+            else:
+                window_start = max(start + 1, end - 64)
+                boundary = last_safe_boundary(text[window_start:end + 1])
+                if boundary:
+                    end = window_start + boundary
+            self.starts.append(end)
+            start = end
+
+    def __len__(self):
+        return len(self.starts)
+
+    def page(self, index):
+        start = self.starts[index]
+        end = self.starts[index + 1] if index + 1 < len(self.starts) else len(self.text)
+        return self.text[start:end]
+
+    def span(self, index):
+        """First and last character offset of a page, for "characters x-y of z" labels."""
+        end = self.starts[index + 1] if index + 1 < len(self.starts) else len(self.text)
+        return self.starts[index], end
+
+class SendEstimate:
+    """What sending a text would take in each send mode.
+
+    `broadcasts` and `seconds` map FanOutSender chunk modes (None for one
+    broadcast per user-perceived character, "chars", "words", "lines" and
+    "push") to the number of broadcasts and an estimated duration.
+    Per-character sends are paced by the mean of `delay_range` (ms) or the
+    `round_trip`, whichever is longer; bulk chunks go out back to back.
+    Counting chunks means chunking the whole text, so build this off the
+    UI thread for large input.
+    """
+
+    def __init__(self, text, chunk_size=500, delay_range=(50, 150), round_trip=DEFAULT_ROUND_TRIP):
+        text = unicodedata.normalize('NFC', text)
+        self.chars = len(text)
+        self.graphemes = sum(1 for _ in iter_graphemes(text))
+        self.bytes = len(text.encode('utf-8'))
+        self.broadcasts = {None: self.graphemes, "push": 1 if text else 0}
+        for mode in TextChunker.MODES:
+            self.broadcasts[mode] = sum(1 for _ in TextChunker(chunk_size, mode).chunks(text))
+        delay = sum(delay_range) / 2000.0
+        self.seconds = {
+            mode: count * round_trip for mode, count in self.broadcasts.items()
+        }
+        self.seconds[None] = self.graphemes * max(delay, round_trip)
+        self.seconds["push"] = self.bytes / PUSH_BYTES_PER_SECOND + round_trip
+
+    @staticmethod
+    def format_seconds(seconds):
+        if seconds < 60:
+            return f"{seconds:.1f} s"
+        if seconds < 3600:
+            return f"{seconds / 60:.1f} min"
+        return f"{seconds / 3600:.1f} h"
+
+    def describe(self, mode):
+        count = self.broadcasts[mode]
+        return f"{count} broadcast{'' if count == 1 else 's'}, about {self.format_seconds(self.seconds[mode])}"
@@ -0,0 +1,295 @@
+import re
+import time
+import uuid
+from collections import namedtuple
+
+from .adb import AdbClient, AdbError
+from .encoding import TextEncoder
+from .metrics import NULL_METRICS
+
+SESSION_ID_LENGTH = 8
+
+# Extra command length of a sequenced broadcast over a plain one, including the trailing " &"
+SEQUENCE_OVERHEAD = (
+    len(TextEncoder.encode_sequenced("", "0" * SESSION_ID_LENGTH, 10 ** 9))
+    - len(TextEncoder.encode_broadcast(""))
+    + len(" &")
+)
+
+# How often waits wake up to check for a stop request
+POLL_INTERVAL = 0.1
+
+ACK_PATTERN = re.compile(r'Broadcast completed: result=(-?\d+)(?:, data="(.*)")?')
+
+class ProtocolError(AdbError):
+    """ADBKeyboard refused or never acknowledged a chunk; retrying the session will not help."""
+
+# Reply of ADBKeyboard to one ADB_INPUT_SEQ broadcast. `kind` is "ACK",
+# "BUSY" or "NAK", or None when the receiver sent no reply data at all
+# (an ADBKeyboard build without ADB_INPUT_SEQ support).
+Ack = namedtuple("Ack", "kind session seq next detail")
+
+def parse_ack(line):
+    """Parse a `Broadcast completed` line printed by `am broadcast`; returns an Ack or None."""
+    match = ACK_PATTERN.search(line)
+    if not match:
+        return None
+    if match.group(2) is None:
+        return Ack(None, None, None, None, f"result={match.group(1)}")
+    fields = match.group(2).split(" ", 3) + ["", "", ""]
+    kind, session, seq, rest = fields[:4]
+    try:
+        seq = int(seq)
+        next_seq = int(rest) if kind == "ACK" else None
+    except ValueError:
+        return Ack("NAK", session, None, None, match.group(2))
+    return Ack(kind, session, seq, next_seq, rest if kind != "ACK" else "")
+
+class AdbBroadcastTransport:
+    """Shell session on one device that pipelines ADB_INPUT_SEQ broadcasts.
+
+    Each broadcast is started in the background, so several can be in flight
+    at once; ADBKeyboard's replies come back as `Broadcast completed` lines
+    on the same connection.
+    """
+
+    def __init__(self, serial=None, client=None):
+        self.serial = serial
+        self.client = client or AdbClient()
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        # Imported here: asyncio is slow to import and only acknowledged sends need it
+        import asyncio
+
+        # The handshake is short and blocking; the session itself is asyncio
+        sock = await asyncio.get_running_loop().run_in_executor(None, self.client.open_shell, self.serial)
+        sock.settimeout(None)
+        self.reader, self.writer = await asyncio.open_connection(sock=sock)
+
+    async def send(self, session, seq, text):
+        command = TextEncoder.encode_sequenced(text, session, seq)
+        self.writer.write(f"{command} &\n".encode("utf-8"))
+        await self.writer.drain()
+
+    async def receive(self):
+        """Return the next reply from the device, or None when the session has ended."""
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return None
+            ack = parse_ack(line.decode("utf-8", errors="replace"))
+            if ack is not None:
+                return ack
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.writer = None
+
+class DeliveryStats:
+    """Counters of one acknowledged send."""
+
+    def __init__(self):
+        self.chunks = 0
+        self.retransmits = 0
+        self.out_of_order = 0
+        self.duplicates = 0
+        self.max_in_flight = 0
+
+    def summary(self):
+        return {
+            "chunks": self.chunks,
+            "retransmits": self.retransmits,
+            "out_of_order": self.out_of_order,
+            "duplicates": self.duplicates,
+            "max_in_flight": self.max_in_flight,
+        }
+
+    def describe(self):
+        return (f"{self.chunks} chunks acknowledged, up to {self.max_in_flight} in flight, "
+                f"{self.retransmits} retransmitted, {self.out_of_order} out of order, "
+                f"{self.duplicates} duplicate acks")
+
+class WindowedSender:
+    """Sends sequence-numbered chunks with a sliding window of unacknowledged broadcasts.
+
+    Up to `window` chunks past the last one ADBKeyboard has committed are in
+    flight at a time, so sends are pipelined instead of waiting a round trip
+    each. A chunk that is not acknowledged within `ack_timeout` seconds is
+    sent again, up to `max_retries` times. The receiver puts chunks back in
+    order and drops repeats, so lost, reordered and duplicated broadcasts
+    are all tolerated. `transport` is an AdbBroadcastTransport or anything
+    with the same open/send/receive/close coroutines. `metrics`
+    (autoinput.metrics.Metrics) records send times, acknowledgement
+    latencies and counters.
+    """
+
+    def __init__(self, transport, window=8, ack_timeout=2.0, max_retries=5, metrics=None):
+        self.transport = transport
+        self.metrics = metrics or NULL_METRICS
+        self.window = max(1, int(window))
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.session = None
+        self.stats = None
+        self.next_seq = 0
+        self.committed = 0
+        self.uncommitted = {}  # seq -> text of chunks sent but not committed yet
+
+    async def deliver(self, units, **kwargs):
+        """Open the transport, send units and close it again; returns DeliveryStats."""
+        await self.transport.open()
+        try:
+            return await self.send(units, **kwargs)
+        finally:
+            await self.transport.close()
+
+    async def receive_acks(self, acks):
+        while True:
+            ack = await self.transport.receive()
+            await acks.put(ack)
+            if ack is None:
+                return
+
+    async def send(self, units, result=None, on_progress=None, stop_event=None, resume=False):
+        """Deliver an iterable of text chunks in order; returns DeliveryStats.
+
+        `result` (a DeviceSendResult) is updated as chunks are committed on
+        the device, and `on_progress` is called with it. Sending stops early
+        when the threading.Event `stop_event` is set. With `resume` a broken
+        send carries on over a new transport in the same session: chunks
+        the device had not committed go out again under their old sequence
+        numbers, so the receiver drops any it already has.
+        """
+        import asyncio
+
+        if not resume or self.session is None:
+            self.session = uuid.uuid4().hex[:SESSION_ID_LENGTH]
+            self.stats = DeliveryStats()
+            self.next_seq = 0
+            self.committed = 0
+            self.uncommitted = {}
+        stats = self.stats
+        metrics = self.metrics
+        labels = {"serial": result.serial} if result is not None else {}
+        if result is not None:
+            result.delivery = stats
+        units = iter(units)
+        # seq -> [text, first sent, last sent, attempts]; carried over chunks are due at once
+        in_flight = {seq: [text, time.monotonic(), float("-inf"), 1] for seq, text in self.uncommitted.items()}
+        highest_acked = -1
+        exhausted = False
+        acks = asyncio.Queue()
+        receiver = asyncio.create_task(self.receive_acks(acks))
+        started = time.perf_counter()
+        try:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                # Keep the window full; it is measured from the last committed chunk
+                while not exhausted and self.next_seq - self.committed < self.window:
+                    text = next(units, None)
+                    if text is None:
+                        exhausted = True
+                        break
+                    # Track the chunk first: if the send fails it is replayed on resume
+                    seq = self.next_seq
+                    now = time.monotonic()
+                    in_flight[seq] = [text, now, now, 1]
+                    self.uncommitted[seq] = text
+                    self.next_seq += 1
+                    stats.max_in_flight = max(stats.max_in_flight, len(in_flight))
+                    await self.transmit(seq, text, labels)
+                if exhausted and self.committed == self.next_seq:
+                    break
+
+                # Wait for a reply until the oldest unacknowledged chunk is due again
+                now = time.monotonic()
+                if not in_flight:
+                    raise ProtocolError(
+                        f"ADBKeyboard acknowledged chunks but stopped committing at chunk {self.committed}"
+                    )
+                due = min(entry[2] for entry in in_flight.values()) + self.ack_timeout
+                try:
+                    ack = await asyncio.wait_for(acks.get(), timeout=min(max(due - now, 0), POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    await self.retransmit_overdue(in_flight, stats, labels)
+                    continue
+
+                if ack is None:
+                    raise AdbError("adb shell session closed")
+                if ack.kind is None:
+                    raise ProtocolError(f"ADBKeyboard did not acknowledge the broadcast ({ack.detail}); "
+                                        "please install a version that supports ADB_INPUT_SEQ")
+                if ack.session != self.session or ack.kind == "BUSY":
+                    continue
+                if ack.kind == "NAK":
+                    raise ProtocolError(f"ADBKeyboard rejected chunk {ack.seq}: {ack.detail}")
+
+                entry = in_flight.pop(ack.seq, None)
+                if entry is None:
+                    stats.duplicates += 1
+                else:
+                    stats.chunks += 1
+                    if ack.seq < highest_acked:
+                        stats.out_of_order += 1
+                    highest_acked = max(highest_acked, ack.seq)
+                    latency = time.monotonic() - entry[1]
+                    if result is not None:
+                        result.stats.add(latency)
+                    if metrics:
+                        metrics.observe("ack", latency, **labels)
+                # Everything below `next` is committed, even if its own ack was lost
+                for seq in [seq for seq in in_flight if seq < ack.next]:
+                    del in_flight[seq]
+                    stats.chunks += 1
+                while self.committed < ack.next:
+                    text = self.uncommitted.pop(self.committed)
+                    self.committed += 1
+                    size = len(text.encode('utf-8'))
+                    if result is not None:
+                        result.sent_chars += len(text)
+                        result.sent_bytes += size
+                    if metrics:
+                        metrics.count("chars_sent", len(text), **labels)
+                        metrics.count("bytes_sent", size, **labels)
+                if result is not None:
+                    result.elapsed = time.perf_counter() - started
+                    if on_progress:
+                        on_progress(result)
+        finally:
+            receiver.cancel()
+        return stats
+
+    async def transmit(self, seq, text, labels):
+        metrics = self.metrics
+        if not metrics:
+            await self.transport.send(self.session, seq, text)
+            return
+        metrics.count("broadcasts", **labels)
+        sent_at = time.perf_counter()
+        await self.transport.send(self.session, seq, text)
+        metrics.observe("send", time.perf_counter() - sent_at, **labels)
+
+    async def retransmit_overdue(self, in_flight, stats, labels):
+        now = time.monotonic()
+        for seq, entry in sorted(in_flight.items()):
+            if now - entry[2] < self.ack_timeout:
+                continue
+            if entry[3] > self.max_retries:
+                raise ProtocolError(f"chunk {seq} was not acknowledged after {entry[3]} attempts")
+            await self.transmit(seq, entry[0], labels)
+            entry[2] = time.monotonic()
+            entry[3] += 1
+            stats.retransmits += 1
+            self.metrics.count("retransmits", **labels)
+
+async def send_acknowledged(serial, units, window=8, client=None, **kwargs):
+    """Open a transport to serial, deliver units with a WindowedSender and close it again."""
+    return await WindowedSender(AdbBroadcastTransport(serial, client), window).deliver(units, **kwargs)
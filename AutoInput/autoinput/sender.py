@@ -0,0 +1,197 @@
+from .adaptive import AimdController
+from .adb import AdbClient, AdbError, DeviceInfoCache
+from .encoding import TextChunker
+from .fanout import FanOutSender
+from .stream import DEFAULT_BLOCK_SIZE, open_text_sources
+from .transport import PersistentAdbShell, SubprocessAdbShell
+
+# Send mode names mapped to TextChunker modes (None sends one broadcast per character).
+# "auto" sizes character chunks adaptively, as fast as each device keeps up, and
+# "push" transfers the whole text as a file (see FanOutSender).
+SEND_MODES = {
+    "char": None,
+    "chunk": "chars",
+    "words": "words",
+    "lines": "lines",
+    "auto": "chars",
+    "push": "push",
+}
+
+class Sender:
+    """Types text on one or more devices without a GUI.
+
+    Example:
+        with Sender(serials=["emulator-5554"], mode="chunk") as sender:
+            results = sender.send("Hello from a script")
+
+    Without serials the text goes to every online device. Persistent shells
+    stay open between send() calls until close(). `timing` is a model from
+    autoinput.timing; by default keys are spaced uniformly within
+    `delay_range` (ms). In bulk modes `ack_window` pipelines chunks with
+    acknowledged delivery, which needs ADBKeyboard with ADB_INPUT_SEQ.
+    With a `journal` (SendJournal) progress is kept on disk and
+    `resume=True` continues an interrupted send. `metrics`
+    (autoinput.metrics.Metrics) records per-stage timings and counters, and
+    a `recorder` (autoinput.trace.SendRecorder) writes a replayable trace.
+
+    Mode "auto" finds the fastest safe pace per device with an
+    AimdController; with a `rate_memory` (RateMemory) the converged pace is
+    remembered per device model and reused by the next send.
+    """
+
+    def __init__(self, serials=None, mode="char", chunk_size=500, delay_range=(50, 150),
+                 persistent=True, client=None, on_progress=None, timing=None, ack_window=None,
+                 journal=None, metrics=None, rate_memory=None, recorder=None):
+        if mode not in SEND_MODES:
+            raise ValueError(f"Unknown send mode: {mode}")
+        self.serials = list(serials) if serials else None
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.delay_range = delay_range
+        self.timing = timing
+        self.ack_window = ack_window
+        self.journal = journal
+        self.metrics = metrics
+        self.rate_memory = rate_memory
+        self.recorder = recorder
+        self.rate_keys = {}
+        self.persistent = persistent
+        self.client = client or AdbClient()
+        self.on_progress = on_progress
+        self.device_info = DeviceInfoCache(self.client)
+        self.shells = {}
+        self.fanout = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def online_serials(self):
+        return [serial for serial, state in self.client.devices() if state == "device"]
+
+    def target_serials(self):
+        if self.serials:
+            return self.serials
+        serials = self.online_serials()
+        if not serials:
+            raise AdbError("no devices/emulators found")
+        return serials
+
+    def shell(self, serial):
+        """Return the shell transport for serial, reusing persistent shells."""
+        if not self.persistent:
+            return SubprocessAdbShell(serial)
+        shell = self.shells.get(serial)
+        if shell is None:
+            shell = PersistentAdbShell(serial, client=self.client)
+            self.shells[serial] = shell
+        return shell
+
+    def rate_key(self, serial):
+        """Device model key for remembered rates; the serial itself if the model cannot be read."""
+        try:
+            return self.rate_memory.device_key(self.device_info.get(serial))
+        except AdbError:
+            return serial
+
+    def rate_controllers(self, serials):
+        if self.mode != "auto":
+            return None
+        if self.rate_memory is None:
+            return {serial: AimdController() for serial in serials}
+        self.rate_keys = {serial: self.rate_key(serial) for serial in serials}
+        return {serial: self.rate_memory.controller(key) for serial, key in self.rate_keys.items()}
+
+    def remember_rates(self, results):
+        if self.rate_memory is None:
+            return
+        for serial, result in results.items():
+            if result.adaptive and serial in self.rate_keys:
+                self.rate_memory.remember(self.rate_keys[serial], result.adaptive)
+
+    def create_fanout(self, serials):
+        self.fanout = FanOutSender(
+            {serial: self.shell(serial) for serial in serials},
+            chunk_mode=SEND_MODES[self.mode],
+            chunk_size=self.chunk_size,
+            delay_range=self.delay_range,
+            on_progress=self.on_progress,
+            timing=self.timing,
+            ack_window=self.ack_window,
+            journal=self.journal,
+            metrics=self.metrics,
+            controllers=self.rate_controllers(serials),
+            recorder=self.recorder
+        )
+        return self.fanout
+
+    def send(self, text, resume=False):
+        """Type text on every target device; returns {serial: DeviceSendResult}."""
+        results = self.create_fanout(self.target_serials()).run(text, resume=resume)
+        self.remember_rates(results)
+        return results
+
+    def send_stored(self, store, key, resume=False):
+        """Type the text stored under key in a TextStore (autoinput.history).
+
+        In the bulk chunk modes the broadcasts are cached in the store, so
+        sending the same text again skips chunking and encoding. Other
+        modes read the text and send it as send() does. The entry counts as
+        used once a device has received all of it. Raises KeyError if the
+        store has no such entry.
+        """
+        chunk_mode = SEND_MODES[self.mode]
+        if self.mode == "auto" or self.ack_window or chunk_mode not in TextChunker.MODES:
+            text = store.get(key)
+            if text is None:
+                raise KeyError(f"no history entry {key!r}")
+            results = self.send(text, resume=resume)
+        else:
+            payload = store.payload(key, chunk_mode, self.chunk_size)
+            job_id = self.journal.digest_job_id(key) if self.journal else None
+            results = self.create_fanout(self.target_serials()).run_payload(payload, job_id=job_id, resume=resume)
+        if any(result.completed for result in results.values()):
+            store.used(key)
+        return results
+
+    def send_changes(self, old_text, new_text):
+        """Turn old_text, sent earlier, into new_text by typing only the changes.
+
+        The cursor must still be right after old_text on every device. Needs
+        ADBKeyboard with ADB_EDIT; results count inserted characters.
+        """
+        return self.create_fanout(self.target_serials()).run_edits(old_text, new_text)
+
+    def send_keys(self, markup):
+        """Type text with special keys in "{ENTER}" markup (see autoinput.keys).
+
+        Text goes out in chunks of `chunk_size` whatever the mode, and runs
+        of keys as `input keyevent` calls. Raises ValueError for an unknown
+        key name before anything is sent.
+        """
+        return self.create_fanout(self.target_serials()).run_keys(markup)
+
+    def send_file(self, path, block_size=DEFAULT_BLOCK_SIZE, resume=False):
+        """Stream a UTF-8 file ('-' for stdin) to every target device with flat memory use.
+
+        Progress is reported in characters and bytes sent; `total_chars` of the
+        results is None because the length is not known up front. Stdin
+        cannot be read twice, so it is never journaled or resumed.
+        """
+        serials = self.target_serials()
+        job_id = self.journal.file_job_id(path) if self.journal and path != "-" else None
+        sources = open_text_sources(path, len(serials), block_size)
+        results = self.create_fanout(serials).run_sources(dict(zip(serials, sources)), job_id=job_id, resume=resume)
+        self.remember_rates(results)
+        return results
+
+    def stop(self):
+        if self.fanout:
+            self.fanout.stop()
+
+    def close(self):
+        for shell in self.shells.values():
+            shell.close()
+        self.shells.clear()
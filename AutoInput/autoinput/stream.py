@@ -0,0 +1,165 @@
+import codecs
+import os
+import queue
+import sys
+import threading
+import unicodedata
+
+from .encoding import iter_graphemes, last_safe_boundary
+
+# Bytes read from the input per block
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+# Text held back for want of a safe cut is capped at this many blocks
+MAX_PENDING_BLOCKS = 4
+
+class TextSource:
+    """Reads UTF-8 text from a binary stream block by block.
+
+    Iterating yields NFC-normalized pieces that end on grapheme boundaries,
+    so pieces can be encoded and sent as soon as they are read. Only one
+    block and a few trailing characters are held in memory at a time;
+    input with no safe cut for MAX_PENDING_BLOCKS blocks (a long run of
+    combining marks or flags) is cut at a grapheme boundary instead.
+    `bytes_read` counts input consumed so far; `total_bytes` is the input
+    size when known (regular files), otherwise None.
+    """
+
+    def __init__(self, stream, block_size=DEFAULT_BLOCK_SIZE, total_bytes=None, close=False):
+        self.stream = stream
+        self.block_size = block_size
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.should_close = close
+
+    @classmethod
+    def open(cls, path, block_size=DEFAULT_BLOCK_SIZE):
+        """Open a file for streaming; '-' reads from stdin."""
+        if path == "-":
+            return cls(sys.stdin.buffer, block_size)
+        stream = open(path, "rb")
+        return cls(stream, block_size, total_bytes=os.fstat(stream.fileno()).st_size, close=True)
+
+    def __iter__(self):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        at_start = True
+        try:
+            while True:
+                block = self.stream.read(self.block_size)
+                if not block:
+                    break
+                self.bytes_read += len(block)
+                pending += decoder.decode(block)
+                if at_start and pending:
+                    at_start = False
+                    if pending.startswith("\ufeff"):
+                        pending = pending[1:]  # Drop a UTF-8 byte order mark
+                # Keep the tail back: the next block may extend its last character
+                split = last_safe_boundary(pending)
+                if not split and len(pending) > MAX_PENDING_BLOCKS * self.block_size:
+                    split = self.forced_boundary(pending)
+                if split:
+                    yield unicodedata.normalize('NFC', pending[:split])
+                    pending = pending[split:]
+            pending += decoder.decode(b"", final=True)
+            if pending:
+                yield unicodedata.normalize('NFC', pending)
+        finally:
+            self.close()
+
+    @staticmethod
+    def forced_boundary(text):
+        """Start of the last grapheme cluster of text; just before the last character if it is all one cluster."""
+        last = ""
+        for last in iter_graphemes(text):
+            pass
+        return len(text) - len(last) or len(text) - 1
+
+    def close(self):
+        if self.should_close:
+            self.stream.close()
+
+class TeeReader:
+    """One consumer's view of a stream shared through tee_source()."""
+
+    def __init__(self, maxsize):
+        self.pieces = queue.Queue(maxsize=maxsize)
+        self.closed = False
+        self.total_bytes = None
+
+    def __iter__(self):
+        try:
+            while True:
+                piece = self.pieces.get()
+                if piece is None:
+                    return
+                yield piece
+        finally:
+            self.close()
+
+    def close(self):
+        # A consumer that stops early must not stall the others
+        self.closed = True
+
+def tee_source(source, count, maxsize=4):
+    """Split one TextSource (e.g. stdin) into `count` readers with bounded buffers.
+
+    A reader that falls `maxsize` pieces behind makes the producer wait, which
+    keeps memory flat; readers that stop iterating are skipped.
+    """
+    readers = [TeeReader(maxsize) for _ in range(count)]
+
+    def produce():
+        for piece in source:
+            for reader in readers:
+                while not reader.closed:
+                    try:
+                        reader.pieces.put(piece, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+            if all(reader.closed for reader in readers):
+                return
+        for reader in readers:
+            while not reader.closed:
+                try:
+                    reader.pieces.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    threading.Thread(target=produce, daemon=True).start()
+    return readers
+
+def skip_chars(pieces, count):
+    """Yield text pieces with the first `count` characters left out, to resume a send."""
+    for piece in pieces:
+        if count >= len(piece):
+            count -= len(piece)
+            continue
+        yield piece[count:]
+        count = 0
+
+def skip_units(payload, count):
+    """Yield (unit, command) pairs with the first `count` characters left out, to resume a send.
+
+    A unit that was only partly sent comes back as its remainder with
+    command None, to be encoded again.
+    """
+    for unit, command in payload:
+        if count >= len(unit):
+            count -= len(unit)
+            continue
+        yield (unit[count:], None) if count else (unit, command)
+        count = 0
+
+def open_text_sources(path, count, block_size=DEFAULT_BLOCK_SIZE):
+    """Return `count` independent piece iterables over path ('-' for stdin).
+
+    Files are simply opened once per consumer; stdin can only be read once,
+    so it is shared through tee_source().
+    """
+    if path != "-" or count == 1:
+        return [TextSource.open(path, block_size) for _ in range(count)]
+    return tee_source(TextSource.open(path, block_size), count)
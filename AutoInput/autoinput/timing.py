@@ -0,0 +1,174 @@
+import json
+import math
+import random
+import time
+
+class UniformTiming:
+    """Intervals drawn uniformly from min_ms to max_ms."""
+
+    def __init__(self, min_ms=50, max_ms=150, rng=None):
+        self.min_ms = min_ms
+        self.max_ms = max(min_ms, max_ms)
+        self.rng = rng or random.Random()
+
+    def interval(self, previous, char):
+        """Seconds to wait between typing previous and char."""
+        return self.rng.uniform(self.min_ms, self.max_ms) / 1000.0
+
+    def describe(self):
+        return f"uniform {self.min_ms:.0f}-{self.max_ms:.0f}ms"
+
+class LogNormalTiming:
+    """Right-skewed, human-like intervals: mostly quick keys with occasional pauses.
+
+    The median is the geometric mean of min_ms and max_ms and samples are
+    clamped to that range, so the same speed sliders apply to every model.
+    """
+
+    def __init__(self, min_ms=50, max_ms=150, sigma=0.4, rng=None):
+        self.min_ms = max(min_ms, 0.001)
+        self.max_ms = max(self.min_ms, max_ms)
+        self.sigma = sigma
+        self.mu = math.log(math.sqrt(self.min_ms * self.max_ms))
+        self.rng = rng or random.Random()
+
+    def interval(self, previous, char):
+        sample = self.rng.lognormvariate(self.mu, self.sigma)
+        return min(max(sample, self.min_ms), self.max_ms) / 1000.0
+
+    def describe(self):
+        return f"log-normal {self.min_ms:.0f}-{self.max_ms:.0f}ms"
+
+class BigramTiming:
+    """Intervals that depend on the pair of characters being typed.
+
+    `intervals` maps two-character strings to mean delays in ms (e.g. loaded
+    from a JSON file with load_intervals()); samples vary by `jitter` around
+    that mean. Other pairs use the `base` model, typed a bit quicker for
+    repeated keys and slower after word and sentence breaks.
+    """
+
+    def __init__(self, base=None, intervals=None, jitter=0.15, rng=None):
+        self.base = base or UniformTiming()
+        self.intervals = intervals or {}
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+
+    @staticmethod
+    def load_intervals(path):
+        """Read a {"th": 80, ...} table of per-bigram delays in ms."""
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+        return {str(pair): float(ms) for pair, ms in table.items()}
+
+    @staticmethod
+    def factor(previous, char):
+        if previous is None:
+            return 1.0
+        if previous == char:
+            return 0.7
+        if previous in ".!?\n":
+            return 2.0
+        if previous.isspace():
+            return 1.3
+        return 1.0
+
+    def interval(self, previous, char):
+        mean_ms = self.intervals.get(previous + char) if previous else None
+        if mean_ms is None:
+            return self.base.interval(previous, char) * self.factor(previous, char)
+        return max(0.0, self.rng.gauss(mean_ms, mean_ms * self.jitter)) / 1000.0
+
+    def describe(self):
+        return f"bigram ({len(self.intervals)} pairs) over {self.base.describe()}"
+
+TIMING_MODELS = {
+    "uniform": UniformTiming,
+    "lognormal": LogNormalTiming,
+    "bigram": BigramTiming,
+}
+
+def make_timing_model(name, delay_range=(50, 150), intervals=None, rng=None):
+    """Build a timing model by name from the min/max delay range in ms.
+
+    Pass a seeded random.Random as `rng` for delays that repeat from run to run.
+    """
+    if name not in TIMING_MODELS:
+        raise ValueError(f"Unknown timing model: {name}")
+    if name == "bigram":
+        return BigramTiming(UniformTiming(*delay_range, rng=rng), intervals, rng=rng)
+    return TIMING_MODELS[name](*delay_range, rng=rng)
+
+class TimingDrift:
+    """Compares the intervals a timing model asked for with the ones achieved."""
+
+    def __init__(self):
+        self.targets = []
+        self.actuals = []
+        self.late = 0
+
+    def add(self, target, actual):
+        self.targets.append(target)
+        self.actuals.append(actual)
+
+    def summary(self):
+        """Return count, mean target/actual interval and error statistics in milliseconds."""
+        count = len(self.targets)
+        if not count:
+            return {"count": 0, "target_mean_ms": 0.0, "actual_mean_ms": 0.0,
+                    "mean_error_ms": 0.0, "p99_abs_error_ms": 0.0, "late": 0}
+        errors = sorted(abs(a - t) for t, a in zip(self.targets, self.actuals))
+        return {
+            "count": count,
+            "target_mean_ms": sum(self.targets) / count * 1000.0,
+            "actual_mean_ms": sum(self.actuals) / count * 1000.0,
+            "mean_error_ms": (sum(self.actuals) - sum(self.targets)) / count * 1000.0,
+            "p99_abs_error_ms": errors[int(0.99 * (count - 1))] * 1000.0,
+            "late": self.late,
+        }
+
+    def describe(self):
+        stats = self.summary()
+        text = (f"interval {stats['actual_mean_ms']:.1f} ms avg vs {stats['target_mean_ms']:.1f} ms target, "
+                f"drift {stats['mean_error_ms']:+.1f} ms (p99 {stats['p99_abs_error_ms']:.1f} ms)")
+        if stats["late"]:
+            text += f", {stats['late']} late"
+        return text
+
+class DeadlineScheduler:
+    """Paces keystrokes on monotonic deadlines instead of sleeping after each send.
+
+    The time a send takes counts towards the interval, so the spacing of
+    sends follows the timing model rather than model plus round trip. When a
+    send overruns its interval the next key goes out at once and the schedule
+    restarts from there instead of bursting to catch up.
+    """
+
+    def __init__(self, model, drift=None, clock=time.monotonic):
+        self.model = model
+        self.drift = drift if drift is not None else TimingDrift()
+        self.clock = clock
+        self.deadline = None
+        self.last_sent = None
+        self.previous = None
+
+    def wait(self, char, stop_event):
+        """Block until char is due; returns False if stop_event is set meanwhile."""
+        if self.deadline is None:
+            # The first key goes out immediately
+            self.deadline = self.last_sent = self.clock()
+            self.previous = char
+            return not stop_event.is_set()
+        target = self.model.interval(self.previous[-1:], char)
+        self.deadline += target
+        remaining = self.deadline - self.clock()
+        if remaining > 0 and stop_event.wait(remaining):
+            return False
+        now = self.clock()
+        if now - self.deadline > 0.001:
+            self.drift.late += 1
+            self.deadline = now
+        self.drift.add(target, now - self.last_sent)
+        self.last_sent = now
+        self.previous = char
+        return not stop_event.is_set()
@@ -0,0 +1,180 @@
+import json
+import subprocess
+import threading
+import time
+
+from .adb import AdbError
+from .encoding import TextEncoder
+from .transport import LatencyStats
+
+# Version number in the header line of a trace
+TRACE_VERSION = 1
+
+class SendRecorder:
+    """Writes every unit a FanOutSender sends to a JSONL trace, for TraceReplayer.
+
+    The first line is a header, {"trace": 1, "started": <epoch seconds>}
+    plus any `settings` (mode, delays, seed, ...). Then there is a line per
+    attempt: {"t": seconds since the recorder was created, "serial": ...}
+    with "unit" (the text of a broadcast) or "command" (a prepared shell
+    line: edits or special keys), and "rtt" in seconds once the device
+    confirmed it or "error" if it did not. Safe to share between the
+    worker threads of a send.
+    """
+
+    def __init__(self, path, **settings):
+        self.path = path
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.file = open(path, "w", encoding="utf-8")
+        self.write({"trace": TRACE_VERSION, "started": time.time(), **settings})
+
+    def write(self, event):
+        line = json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self.file:
+                self.file.write(line)
+
+    def record(self, serial, sent_at, round_trip=None, unit=None, command=None, error=None):
+        """Record one attempt that went out at perf_counter() time `sent_at`."""
+        event = {"t": round(sent_at - self.started, 6), "serial": serial}
+        if unit is not None:
+            event["unit"] = unit
+        else:
+            event["command"] = command
+        if error is None:
+            event["rtt"] = round(round_trip, 6)
+        else:
+            event["error"] = str(error)
+        self.write(event)
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+def load_trace(path):
+    """Read a trace; returns (header, events) where events are the confirmed sends in time order.
+
+    Failed attempts are left out: the retry that followed them is in the
+    trace as well. Raises ValueError if the file is not a trace.
+    """
+    header = None
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if header is None:
+                if event.get("trace") != TRACE_VERSION:
+                    raise ValueError(f"{path} is not an AutoInput trace (version {TRACE_VERSION})")
+                header = event
+            elif "error" not in event:
+                events.append(event)
+    if header is None:
+        raise ValueError(f"{path} is empty")
+    events.sort(key=lambda event: event["t"])
+    return header, events
+
+class ReplayResult:
+    """What replaying a trace on one device achieved."""
+
+    def __init__(self, serial, total=0):
+        self.serial = serial
+        self.total = total
+        self.sent = 0
+        self.sent_chars = 0
+        self.errors = 0
+        self.error = None
+        self.elapsed = 0.0
+        self.stats = LatencyStats()
+        self.lateness = LatencyStats()
+
+    def describe(self):
+        text = f"{self.sent}/{self.total} sends, {self.sent_chars} characters in {self.elapsed:.2f} s"
+        if self.sent:
+            text += f", round trip {self.stats.summary()['mean_ms']:.1f} ms avg"
+        if self.lateness.samples:
+            lateness = self.lateness.summary()
+            text += f", behind schedule {lateness['mean_ms']:.1f} ms avg (max {lateness['max_ms']:.1f} ms)"
+        if self.errors:
+            text += f", {self.errors} refused"
+        return text
+
+class TraceReplayer:
+    """Sends the units of a recorded trace again, one worker thread per target device.
+
+    `shells` maps target serials to shell transports and `targets` maps each
+    serial in the trace to the target serials that replay its events (by
+    default every serial replays on itself); one recorded device can drive
+    several targets for a load test. Events go out at their recorded time,
+    counted from the first event of the trace, divided by `speed`; with
+    speed None they go out back to back. A unit the device refuses is
+    counted and the replay carries on; a lost connection ends that device's
+    replay. With a `recorder` the replay is recorded in turn.
+    """
+
+    def __init__(self, events, shells, targets=None, speed=1.0, recorder=None):
+        self.events = events
+        self.shells = shells
+        self.targets = targets or {serial: [serial] for serial in {event["serial"] for event in events}}
+        self.speed = speed
+        self.recorder = recorder
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        """Replay on every target and wait for all workers; returns {serial: ReplayResult}."""
+        plans = {serial: [] for serial in self.shells}
+        for event in self.events:
+            for target in self.targets.get(event["serial"], ()):
+                plans[target].append(event)
+        origin = self.events[0]["t"] if self.events else 0.0
+        started = time.perf_counter()
+        results = {serial: ReplayResult(serial, len(events)) for serial, events in plans.items()}
+        threads = [
+            threading.Thread(target=self.replay_device, args=(plans[serial], results[serial], origin, started),
+                             daemon=True)
+            for serial in plans
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def replay_device(self, events, result, origin, started):
+        shell = self.shells[result.serial]
+        try:
+            for event in events:
+                if self.speed:
+                    due = started + (event["t"] - origin) / self.speed
+                    if self.stop_event.wait(max(0.0, due - time.perf_counter())):
+                        return
+                    result.lateness.add(max(0.0, time.perf_counter() - due))
+                elif self.stop_event.is_set():
+                    return
+                unit = event.get("unit")
+                command = event["command"] if unit is None else TextEncoder.encode_broadcast(unit)
+                sent_at = time.perf_counter()
+                returncode, output = shell.run(command)
+                round_trip = time.perf_counter() - sent_at
+                error = None
+                if returncode != 0:
+                    error = subprocess.CalledProcessError(returncode, command, output)
+                    result.errors += 1
+                else:
+                    result.sent += 1
+                    result.sent_chars += len(unit) if unit is not None else 0
+                    result.stats.add(round_trip)
+                if self.recorder:
+                    self.recorder.record(result.serial, sent_at, round_trip, unit=unit, command=event.get("command"),
+                                         error=error)
+        except (AdbError, OSError, subprocess.SubprocessError) as e:
+            result.error = e
+        finally:
+            result.elapsed = time.perf_counter() - started
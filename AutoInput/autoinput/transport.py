@@ -0,0 +1,217 @@
+import queue
+import re
+import socket
+import subprocess
+import threading
+import time
+
+from .adb import AdbError
+
+class LatencyStats:
+    """Collects per-command send latencies so delivery paths can be compared."""
+
+    def __init__(self):
+        self.samples = []
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        """Return count, mean, p50, p99 and max latency in milliseconds."""
+        if not self.samples:
+            return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(self.samples)
+        count = len(ordered)
+        return {
+            "count": count,
+            "mean_ms": sum(ordered) / count * 1000.0,
+            "p50_ms": ordered[int(0.50 * (count - 1))] * 1000.0,
+            "p99_ms": ordered[int(0.99 * (count - 1))] * 1000.0,
+            "max_ms": ordered[-1] * 1000.0,
+        }
+
+    def describe(self, label, unit="char"):
+        stats = self.summary()
+        return f"{stats['mean_ms']:.1f} ms/{unit} avg, p99 {stats['p99_ms']:.1f} ms ({label})"
+
+class CommandTimeout(AdbError):
+    """A command reached the device but its result did not come back in time.
+
+    It may have run, so resending it could type its text twice.
+    """
+
+class PersistentAdbShell:
+    """Long-lived `adb shell` session that runs commands written to its stdin.
+
+    Each command is followed by an `echo` of a unique marker and the exit code,
+    so the caller gets a per-command result without spawning a new process.
+    If the session turns out to be dead before the command is written, it is
+    restarted and the command written to the new one. A command that was
+    written is never resent: the session is dropped and the caller gets an
+    AdbError, or CommandTimeout if the result did not arrive in time.
+    With an AdbClient the session is a socket to the adb server; without one
+    it is an `adb shell` child process.
+    """
+    MARKER = "__AUTOINPUT_DONE__"
+
+    def __init__(self, serial=None, timeout=10.0, client=None):
+        self.serial = serial
+        self.timeout = timeout
+        self.client = client
+        self.process = None
+        self.socket = None
+        self.stdin = None
+        self.lines = None
+        self.ended = None
+        self.counter = 0
+        self.reconnects = 0
+        self.lock = threading.Lock()
+
+    def adb_command(self):
+        command = ["adb"]
+        if self.serial:
+            command += ["-s", self.serial]
+        return command + ["shell"]
+
+    def is_alive(self):
+        if self.ended is not None and self.ended.is_set():
+            return False
+        if self.socket is not None:
+            return True
+        return self.process is not None and self.process.poll() is None
+
+    def is_open(self):
+        return self.socket is not None or self.process is not None
+
+    def connect(self):
+        """Open the shell session and start a reader thread for its output."""
+        self.close()
+        if self.client is not None:
+            self.socket = self.client.open_shell(self.serial)
+            self.socket.settimeout(None)
+            self.stdin = self.socket.makefile("w", encoding="utf-8", newline="\n")
+            stdout = self.socket.makefile("r", encoding="utf-8", errors="replace")
+        else:
+            self.process = subprocess.Popen(
+                self.adb_command(),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+                bufsize=1
+            )
+            self.stdin = self.process.stdin
+            stdout = self.process.stdout
+        self.lines = queue.Queue()
+        self.ended = threading.Event()
+        reader = threading.Thread(
+            target=self._read_output,
+            args=(stdout, self.lines, self.ended),
+            daemon=True
+        )
+        reader.start()
+
+    @staticmethod
+    def _read_output(stream, lines, ended):
+        try:
+            for line in stream:
+                lines.put(line.rstrip("\r\n"))
+        except (OSError, ValueError):
+            pass
+        ended.set()
+        lines.put(None)  # End of stream
+
+    def close(self):
+        if self.stdin is not None:
+            try:
+                self.stdin.close()
+            except OSError:
+                pass
+            self.stdin = None
+        if self.socket is not None:
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.socket.close()
+            self.socket = None
+        if self.process is not None:
+            try:
+                self.process.terminate()
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+            self.process = None
+
+    def _write(self, command):
+        """Write command and its marker echo to the session; returns the marker."""
+        self.counter += 1
+        token = f"{self.MARKER}{self.counter}"
+        self.stdin.write(f"{command}; echo {token} $?\n")
+        self.stdin.flush()
+        return token
+
+    def _wait(self, command, token):
+        output = []
+        deadline = time.monotonic() + self.timeout
+        pattern = re.compile(rf"{token} (\d+)$")
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(command, self.timeout)
+            try:
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(command, self.timeout)
+            if line is None:
+                raise AdbError("adb shell session closed")
+            match = pattern.search(line)
+            if match:
+                return int(match.group(1)), "\n".join(output)
+            output.append(line)
+
+    def run(self, command):
+        """Run a device-side command and return (returncode, output)."""
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if not self.is_alive():
+                        if self.is_open():
+                            self.reconnects += 1
+                        self.connect()
+                    token = self._write(command)
+                    break
+                except (OSError, AdbError) as e:
+                    # The command never left: start over and write it to a new session
+                    self.close()
+                    self.reconnects += 1
+                    if attempt:
+                        raise AdbError(f"adb shell session failed: {e}") from e
+            try:
+                return self._wait(command, token)
+            except subprocess.TimeoutExpired as e:
+                # A late marker would be read as the next command's result
+                self.close()
+                raise CommandTimeout(f"no result from the device within {self.timeout:g} s; "
+                                     "the command may have run") from e
+            except AdbError:
+                self.close()
+                raise
+
+class SubprocessAdbShell:
+    """Runs every command in its own `adb shell` process (the original per-character path)."""
+
+    def __init__(self, serial=None):
+        self.serial = serial
+
+    def run(self, command):
+        """Run a device-side command and return (returncode, output)."""
+        target = ["-s", self.serial] if self.serial else []
+        # An argv list: the command line goes to the device's shell untouched, not through the host's
+        result = subprocess.run(["adb", *target, "shell", command], capture_output=True, text=True)
+        return result.returncode, result.stderr
+
+    def close(self):
+        pass
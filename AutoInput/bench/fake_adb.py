@@ -0,0 +1,67 @@
+"""Stand-in for the `adb` executable, used by the benchmarks.
+
+Like the real client it is a fresh process per invocation that forwards
+to the adb server (here: fake_adb_server.py, found through
+ANDROID_ADB_SERVER_PORT), so the per-character subprocess path pays a
+realistic spawn and connect cost. Supports `version`, `start-server`,
+`devices` and `shell`, with `-s <serial>`.
+"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autoinput import AdbClient, AdbError
+
+def interactive_shell(client, serial):
+    sock = client.open_shell(serial)
+
+    def pump_output():
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+
+    reader = threading.Thread(target=pump_output, daemon=True)
+    reader.start()
+    for line in sys.stdin.buffer:
+        sock.sendall(line)
+    sock.shutdown(1)
+    reader.join()
+
+def main(argv):
+    serial = None
+    if argv[:1] == ["-s"]:
+        serial, argv = argv[1], argv[2:]
+    if not argv:
+        print("usage: adb [-s SERIAL] version|start-server|devices|shell [COMMAND...]", file=sys.stderr)
+        return 1
+
+    client = AdbClient()
+    command, args = argv[0], argv[1:]
+    try:
+        if command == "version":
+            print(f"Android Debug Bridge version 1.0.{client.version()}")
+        elif command == "start-server":
+            client.version()
+        elif command == "devices":
+            print("List of devices attached")
+            for device_serial, state in client.devices():
+                print(f"{device_serial}\t{state}")
+        elif command == "shell" and args:
+            sys.stdout.write(client.shell(" ".join(args), serial))
+        elif command == "shell":
+            interactive_shell(client, serial)
+        else:
+            print(f"adb: unknown command {command}", file=sys.stderr)
+            return 1
+    except AdbError as e:
+        print(f"adb: error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
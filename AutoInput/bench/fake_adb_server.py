@@ -0,0 +1,408 @@
+"""In-process stand-in for the adb server and the devices behind it.
+
+Speaks the adb smart-socket protocol well enough for AutoInput: host
+services, transports, one-shot and interactive shells, and file pushes over
+sync. Devices execute a tiny subset of the Android shell (am broadcast,
+getprop, echo, input, rm, sleep) and record the text ADBKeyboard would have
+committed, including acknowledged ADB_INPUT_SEQ broadcasts, pushed
+ADB_INPUT_FILE files, ADB_EDIT cursor edits (through a fake input
+connection, refused like on a device when no field has focus) and the
+typing keys of `input keyevent`.
+"""
+import base64
+import shlex
+import socket
+import struct
+import threading
+import time
+
+from fake_receiver import EditReceiver, SequencedReceiver
+
+DEFAULT_PROPS = {
+    "ro.product.model": "Pixel Fake",
+    "ro.product.manufacturer": "Fake",
+    "ro.build.version.release": "14",
+    "ro.build.version.sdk": "34",
+    "ro.product.cpu.abi": "arm64-v8a",
+    "ro.sf.lcd_density": "420",
+}
+
+# Key codes that type a character, as `input keyevent` arguments
+KEY_TEXT = {"61": "\t", "62": " ", "66": "\n"}
+
+class FakeInputConnection:
+    """The focused text field of a FakeDevice: its typed text and the cursor, in UTF-16 units."""
+
+    def __init__(self, device):
+        self.device = device
+
+    def units(self):
+        return "".join(self.device.typed).encode("utf-16-le")
+
+    def cursor(self):
+        return len(self.units()) // 2 - self.device.cursor_back
+
+    def units_before_cursor(self):
+        return self.cursor()
+
+    def units_after_cursor(self):
+        return self.device.cursor_back
+
+    def set_selection(self, position):
+        self.device.cursor_back = len(self.units()) // 2 - position
+
+    def commit_text(self, text):
+        units, cursor = self.units(), self.cursor()
+        self.device.typed[:] = [(units[:cursor * 2] + text.encode("utf-16-le") + units[cursor * 2:]).decode("utf-16-le")]
+
+    def delete_before(self, count):
+        units, cursor = self.units(), self.cursor()
+        self.device.typed[:] = [(units[:(cursor - count) * 2] + units[cursor * 2:]).decode("utf-16-le")]
+
+class FakeDevice:
+    """A device that records committed text and answers a few shell commands."""
+
+    def __init__(self, serial, props=None, state="device"):
+        self.serial = serial
+        self.state = state
+        self.props = dict(DEFAULT_PROPS, **(props or {}))
+        self.typed = []
+        self.keyevents = []
+        self.broadcasts = 0
+        self.files = {}  # remote path -> pushed bytes
+        self.cursor_back = 0  # UTF-16 units between the cursor and the end of the text; typing appends
+        self.broadcast_delay = 0.0  # Seconds every broadcast takes after it took effect, like a busy device
+        self.lock = threading.Lock()
+        self.receiver = SequencedReceiver(self.typed.append)
+        # A text field has focus, so ADBKeyboardService has bound its connection
+        self.editor = EditReceiver()
+        self.editor.start_input(FakeInputConnection(self))
+
+    @property
+    def text(self):
+        with self.lock:
+            return "".join(self.typed)
+
+    def getprop(self, args):
+        if args:
+            return self.props.get(args[0], "") + "\n"
+        return "".join(f"[{key}]: [{value}]\n" for key, value in sorted(self.props.items()))
+
+    def broadcast(self, args):
+        action = None
+        extras = {}
+        i = 0
+        while i < len(args):
+            if args[i] == "-a":
+                action = args[i + 1]
+                i += 2
+            elif args[i] in ("--es", "--ei", "--ez"):
+                extras[args[i + 1]] = args[i + 2]
+                i += 3
+            else:
+                i += 1
+        result = "result=0"
+        with self.lock:
+            self.broadcasts += 1
+            if action == "ADB_INPUT_B64" and "msg" in extras:
+                self.typed.append(base64.b64decode(extras["msg"]).decode("utf-8"))
+            elif action == "ADB_INPUT_SEQ" and {"session", "seq", "msg"} <= extras.keys():
+                text = base64.b64decode(extras["msg"]).decode("utf-8")
+                result = f'result=-1, data="{self.receiver.receive(extras["session"], int(extras["seq"]), text)}"'
+            elif action == "ADB_INPUT_FILE" and "path" in extras:
+                data = self.files.get(extras["path"])
+                if data is None:
+                    result = f'result=0, data="ERR 0 {extras["path"]}: No such file"'
+                else:
+                    text = data.decode("utf-8")
+                    self.typed.append(text)
+                    if extras.get("delete") == "true":
+                        del self.files[extras["path"]]
+                    result = f'result=-1, data="OK {len(text)}"'
+            elif action == "ADB_EDIT" and "ops" in extras:
+                data = self.editor.receive(extras["ops"])
+                result = f'result={-1 if data.startswith("OK") else 0}, data="{data}"'
+        if self.broadcast_delay:
+            time.sleep(self.broadcast_delay)
+        return (
+            f"Broadcasting: Intent {{ act={action} flg=0x400000 }}\n"
+            f"Broadcast completed: {result}\n"
+        )
+
+    def press(self, code):
+        """Apply a key event to the typed text: ENTER, TAB and SPACE type, BACKSPACE deletes."""
+        if code in KEY_TEXT:
+            self.typed.append(KEY_TEXT[code])
+        elif code == "67":
+            text = "".join(self.typed)
+            self.typed[:] = [text[:-1]]
+
+    def execute(self, argv, last_status):
+        """Run one simple command; returns (output, status)."""
+        if not argv:
+            return "", last_status
+        name, args = argv[0], argv[1:]
+        if name == "echo":
+            return " ".join(str(last_status) if a == "$?" else a for a in args) + "\n", 0
+        if name == "true":
+            return "", 0
+        if name == "false":
+            return "", 1
+        if name == "sleep":
+            time.sleep(float(args[0]))
+            return "", 0
+        if name == "getprop":
+            return self.getprop(args), 0
+        if name == "am" and args[:1] == ["broadcast"]:
+            return self.broadcast(args[1:]), 0
+        if name == "rm":
+            with self.lock:
+                for path in args:
+                    self.files.pop(path, None)
+            return "", 0
+        if name == "input" and args[:1] == ["keyevent"]:
+            with self.lock:
+                self.keyevents.extend(args[1:])
+                for code in args[1:]:
+                    self.press(code)
+            return "", 0
+        return f"/system/bin/sh: {name}: inaccessible or not found\n", 127
+
+    def run_line(self, line, last_status=0):
+        """Run a `;`-separated command line; returns (output, status).
+
+        Background jobs (`&`) simply run in turn; after a failing command,
+        the rest of an `&&` list is skipped.
+        """
+        lexer = shlex.shlex(line, posix=True, punctuation_chars=";&")
+        lexer.whitespace_split = True
+        lexer.commenters = ""
+        output = []
+        argv = []
+        status = last_status
+        skipping = False
+        for token in list(lexer) + [";"]:
+            if token in (";", "&", "&&"):
+                if not skipping:
+                    text, status = self.execute(argv, status)
+                    output.append(text)
+                skipping = token == "&&" and status != 0
+                argv = []
+            else:
+                argv.append(token)
+        return "".join(output), status
+
+class FakeAdbServer:
+    """Threaded TCP server that mimics the adb server on a free local port."""
+
+    def __init__(self, devices=None, host="127.0.0.1", port=0):
+        self.devices = {d.serial: d for d in (devices or [FakeDevice("emulator-5554")])}
+        self.listener = socket.create_server((host, port))
+        self.host, self.port = self.listener.getsockname()[:2]
+        self.running = False
+        self.thread = None
+        self.changed = threading.Condition()
+        self.generation = 0
+        self.sessions = {}  # serial -> open shell connections
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.changed:
+            self.changed.notify_all()
+        try:
+            self.listener.close()
+        except OSError:
+            pass
+
+    def serve(self):
+        while self.running:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def read_exact(conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("client went away")
+            data += chunk
+        return data
+
+    def read_request(self, conn):
+        size = int(self.read_exact(conn, 4), 16)
+        return self.read_exact(conn, size).decode("utf-8")
+
+    @staticmethod
+    def okay(conn, payload=None):
+        data = b"OKAY"
+        if payload is not None:
+            body = payload.encode("utf-8")
+            data += f"{len(body):04x}".encode("ascii") + body
+        conn.sendall(data)
+
+    @staticmethod
+    def fail(conn, message):
+        body = message.encode("utf-8")
+        conn.sendall(b"FAIL" + f"{len(body):04x}".encode("ascii") + body)
+
+    def add_device(self, device):
+        with self.changed:
+            self.devices[device.serial] = device
+            self.generation += 1
+            self.changed.notify_all()
+
+    def remove_device(self, serial):
+        """Unplug a device: it leaves the device list and its open shells are cut off."""
+        with self.changed:
+            self.devices.pop(serial, None)
+            self.generation += 1
+            self.changed.notify_all()
+            connections = self.sessions.pop(serial, set())
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def track_devices(self, conn):
+        self.okay(conn)
+        seen = -1
+        while self.running:
+            with self.changed:
+                while self.generation == seen and self.running:
+                    self.changed.wait(0.2)
+                seen = self.generation
+                body = self.devices_payload().encode("utf-8")
+            conn.sendall(f"{len(body):04x}".encode("ascii") + body)
+
+    def devices_payload(self):
+        return "".join(f"{d.serial}\t{d.state}\n" for d in self.devices.values())
+
+    def handle(self, conn):
+        try:
+            with conn:
+                device = None
+                while True:
+                    request = self.read_request(conn)
+                    if request == "host:version":
+                        self.okay(conn, "0029")
+                        return
+                    if request == "host:track-devices":
+                        self.track_devices(conn)
+                        return
+                    if request == "host:devices":
+                        self.okay(conn, self.devices_payload())
+                        return
+                    if request.startswith("host:transport"):
+                        device = self.select_device(conn, request)
+                        if device is None:
+                            return
+                        self.okay(conn)
+                        continue
+                    if request.startswith("shell:") and device is not None:
+                        self.okay(conn)
+                        self.shell(conn, device, request[len("shell:"):])
+                        return
+                    if request == "sync:" and device is not None:
+                        self.okay(conn)
+                        self.sync(conn, device)
+                        return
+                    self.fail(conn, f"unknown host service '{request}'")
+                    return
+        except (ConnectionError, OSError, ValueError):
+            pass
+
+    def select_device(self, conn, request):
+        online = [d for d in self.devices.values() if d.state == "device"]
+        if request == "host:transport-any":
+            if len(online) != 1:
+                self.fail(conn, "more than one device/emulator" if online else "no devices/emulators found")
+                return None
+            return online[0]
+        serial = request.split(":", 2)[2]
+        device = self.devices.get(serial)
+        if device is None or device.state != "device":
+            self.fail(conn, f"device '{serial}' not found")
+            return None
+        return device
+
+    def shell(self, conn, device, command):
+        with self.changed:
+            self.sessions.setdefault(device.serial, set()).add(conn)
+        try:
+            self.run_shell(conn, device, command)
+        finally:
+            with self.changed:
+                self.sessions.get(device.serial, set()).discard(conn)
+
+    def run_shell(self, conn, device, command):
+        if command and command != "sh":
+            output, _ = device.run_line(command)
+            conn.sendall(output.encode("utf-8"))
+            return
+        status = 0
+        reader = conn.makefile("r", encoding="utf-8", newline="\n")
+        for line in reader:
+            output, status = device.run_line(line.rstrip("\n"), status)
+            conn.sendall(output.encode("utf-8"))
+
+    def sync(self, conn, device):
+        """Serve SEND requests of the sync protocol; other requests end the session."""
+        while True:
+            request = self.read_exact(conn, 4)
+            length = struct.unpack("<I", self.read_exact(conn, 4))[0]
+            if request != b"SEND":
+                return
+            path = self.read_exact(conn, length).decode("utf-8").rsplit(",", 1)[0]
+            data = []
+            while True:
+                kind = self.read_exact(conn, 4)
+                size = struct.unpack("<I", self.read_exact(conn, 4))[0]
+                if kind == b"DONE":
+                    break
+                if kind != b"DATA" or size > 64 * 1024:
+                    message = b"invalid sync packet"
+                    conn.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+                    return
+                data.append(self.read_exact(conn, size))
+            with device.lock:
+                device.files[path] = b"".join(data)
+            conn.sendall(b"OKAY" + struct.pack("<I", 0))
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake adb server with fake devices.")
+    parser.add_argument("--port", type=int, default=0, help="port to listen on (default: any free port)")
+    parser.add_argument("--devices", type=int, default=1, help="number of fake devices")
+    args = parser.parse_args()
+
+    devices = [FakeDevice(f"fake-{i:02d}") for i in range(args.devices)]
+    server = FakeAdbServer(devices, port=args.port)
+    server.start()
+    # The parent process reads the port from the first line
+    print(server.port, flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
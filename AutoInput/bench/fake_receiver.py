@@ -0,0 +1,164 @@
+"""Fake ADBKeyboard receiver for exercising acknowledged delivery without a device.
+
+SequencedReceiver mirrors the ADB_INPUT_SEQ handling in ADBKeyboard.java
+and EditReceiver its ADB_EDIT handling, through the input connection that
+ADBKeyboardService binds.
+FakeReceiverTransport stands in for AdbBroadcastTransport in-process and
+can drop, delay, reorder and duplicate broadcasts and acknowledgements:
+
+    transport = FakeReceiverTransport(drop_rate=0.1, jitter=0.02, seed=1)
+    stats = asyncio.run(WindowedSender(transport, window=16).send(chunks))
+    assert transport.receiver.text == "".join(chunks)
+"""
+import asyncio
+import base64
+import os
+import random
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autoinput.protocol import parse_ack
+
+class SequencedReceiver:
+    """Commits sequence-numbered chunks in order, like ADBKeyboard's ADB_INPUT_SEQ action."""
+    MAX_PENDING = 256
+
+    def __init__(self, commit=None):
+        self.committed = []
+        self.commit = commit or self.committed.append
+        self.session = None
+        self.next = 0
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    @property
+    def text(self):
+        return "".join(self.committed)
+
+    def receive(self, session, seq, text):
+        """Handle one broadcast; returns the reply data sent back to `am broadcast`."""
+        with self.lock:
+            if session != self.session:
+                self.session, self.next, self.pending = session, 0, {}
+            if seq >= self.next + self.MAX_PENDING:
+                return f"BUSY {session} {seq}"
+            if seq >= self.next:
+                self.pending.setdefault(seq, text)
+            while self.next in self.pending:
+                self.commit(self.pending.pop(self.next))
+                self.next += 1
+            return f"ACK {session} {seq} {self.next}"
+
+class EditReceiver:
+    """Applies ADB_EDIT scripts through the bound input connection, like ADBKeyboard.receiveEdits.
+
+    start_input() and finish_input() bind and release the connection of the
+    focused field, as ADBKeyboardService does in onStartInput and
+    onFinishInput; without one every script is refused. The connection
+    needs units_before_cursor(), units_after_cursor(), cursor(),
+    set_selection(), commit_text() and delete_before() in UTF-16 units.
+    """
+
+    def __init__(self):
+        self.connection = None
+
+    def start_input(self, connection):
+        self.connection = connection
+
+    def finish_input(self):
+        self.connection = None
+
+    def receive(self, ops):
+        """Handle one broadcast; returns the reply data sent back to `am broadcast`."""
+        ic = self.connection
+        if ops is None or ic is None:
+            return "ERR 0 " + ("missing ops" if ops is None else "no input field")
+        script = []
+        # How much text the script needs on each side of the cursor
+        before = after = needed_before = needed_after = 0
+        try:
+            for token in ops.split(";"):
+                kind, argument = token[:1], token[1:]
+                if kind == "I":
+                    text = base64.b64decode(argument).decode("utf-8")
+                    before += len(text.encode("utf-16-le")) // 2
+                    script.append((kind, text))
+                    continue
+                if kind not in ("L", "R", "D"):
+                    raise ValueError(f"unknown edit {token}")
+                count = int(argument)
+                if kind == "L":
+                    before, after = before - count, after + count
+                elif kind == "R":
+                    before, after = before + count, after - count
+                else:
+                    before -= count
+                needed_before = max(needed_before, -before)
+                needed_after = max(needed_after, -after)
+                script.append((kind, count))
+        except ValueError as e:
+            return f"ERR 0 {e}"
+        if ic.units_before_cursor() < needed_before or ic.units_after_cursor() < needed_after:
+            return "ERR 0 the text around the cursor is not the text sent before"
+        cursor = ic.cursor()
+        for kind, value in script:
+            if kind == "I":
+                ic.commit_text(value)
+                cursor += len(value.encode("utf-16-le")) // 2
+            elif kind == "D":
+                ic.delete_before(value)
+                cursor -= value
+            else:
+                cursor += value if kind == "R" else -value
+                ic.set_selection(cursor)
+        return f"OK {len(script)}"
+
+class FakeReceiverTransport:
+    """In-process transport to a SequencedReceiver over an unreliable link.
+
+    Every broadcast takes `latency` plus up to `jitter` seconds, so a jitter
+    larger than the gap between sends reorders them. `drop_rate`,
+    `ack_drop_rate` and `duplicate_rate` lose broadcasts, lose replies and
+    deliver broadcasts twice.
+    """
+
+    def __init__(self, receiver=None, latency=0.001, jitter=0.0, drop_rate=0.0, ack_drop_rate=0.0,
+                 duplicate_rate=0.0, seed=None):
+        self.receiver = receiver or SequencedReceiver()
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.ack_drop_rate = ack_drop_rate
+        self.duplicate_rate = duplicate_rate
+        self.rng = random.Random(seed)
+        self.replies = None
+        self.handles = []
+        self.broadcasts = 0
+
+    async def open(self):
+        self.replies = asyncio.Queue()
+
+    async def send(self, session, seq, text):
+        self.broadcasts += 1
+        copies = 2 if self.rng.random() < self.duplicate_rate else 1
+        for _ in range(copies):
+            if self.rng.random() < self.drop_rate:
+                continue
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            handle = asyncio.get_running_loop().call_later(delay, self.deliver, session, seq, text)
+            self.handles.append(handle)
+
+    def deliver(self, session, seq, text):
+        data = self.receiver.receive(session, seq, text)
+        if self.rng.random() >= self.ack_drop_rate:
+            self.replies.put_nowait(parse_ack(f'Broadcast completed: result=-1, data="{data}"'))
+
+    async def receive(self):
+        return await self.replies.get()
+
+    async def close(self):
+        for handle in self.handles:
+            handle.cancel()
+        self.handles.clear()
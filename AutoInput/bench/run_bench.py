@@ -0,0 +1,272 @@
+"""Measure AutoInput send throughput and latency against fake adb stand-ins.
+
+Starts fake_adb_server.py in a child process and puts fake_adb.py on PATH
+as `adb`, then runs every delivery path over several text sizes and
+scripts. Results are written as JSON so runs can be compared over time:
+
+    python bench/run_bench.py --output bench_results.json
+    python bench/run_bench.py --baseline bench_results.json   # fail on regressions
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from autoinput import (
+    AdbClient,
+    CommandPlan,
+    FanOutSender,
+    LatencyStats,
+    PersistentAdbShell,
+    SubprocessAdbShell,
+    TextEncoder,
+    iter_graphemes,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SAMPLES = {
+    "ascii": "The quick brown fox jumps over the lazy dog. ",
+    "cjk": "天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏。",
+    "emoji": "👍🎉👨‍👩‍👧🇺🇸😀🔥👋🏽❤️ ",
+}
+PATHS = ("segment", "encode", "plan", "subprocess", "persistent", "bulk", "acked", "push", "multi-device")
+
+def make_text(script, size):
+    """Return `size` user-perceived characters of the sample script."""
+    graphemes = iter_graphemes(SAMPLES[script] * (size // len(SAMPLES[script]) + 1))
+    return "".join(itertools.islice(graphemes, size))
+
+class FakeAdbEnvironment:
+    """Runs the fake adb server and exposes fake_adb.py as `adb` on PATH."""
+
+    def __init__(self, devices):
+        self.device_count = devices
+        self.server = None
+        self.bin_dir = None
+        self.saved_env = {}
+
+    def __enter__(self):
+        self.server = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, "fake_adb_server.py"), "--devices", str(self.device_count)],
+            stdout=subprocess.PIPE,
+            text=True
+        )
+        port = self.server.stdout.readline().strip()
+        self.bin_dir = tempfile.TemporaryDirectory()
+        fake_adb = os.path.join(BENCH_DIR, "fake_adb.py")
+        if os.name == "nt":
+            with open(os.path.join(self.bin_dir.name, "adb.bat"), "w") as f:
+                f.write(f'@"{sys.executable}" "{fake_adb}" %*\n')
+        else:
+            wrapper = os.path.join(self.bin_dir.name, "adb")
+            with open(wrapper, "w") as f:
+                f.write(f'#!/bin/sh\nexec "{sys.executable}" "{fake_adb}" "$@"\n')
+            os.chmod(wrapper, 0o755)
+        self.set_env("ANDROID_ADB_SERVER_PORT", port)
+        self.set_env("PATH", self.bin_dir.name + os.pathsep + os.environ.get("PATH", ""))
+        return self
+
+    def set_env(self, name, value):
+        self.saved_env[name] = os.environ.get(name)
+        os.environ[name] = value
+
+    def __exit__(self, *exc):
+        for name, value in self.saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        self.server.terminate()
+        self.server.wait()
+        self.bin_dir.cleanup()
+
+    def serials(self):
+        return [serial for serial, state in AdbClient().devices() if state == "device"]
+
+def cpu_seconds():
+    """CPU time of this process plus finished child processes (adb spawns)."""
+    total = time.process_time()
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+def summarize(path, script, size, text, devices, elapsed, cpu, stats, units, errors):
+    chars = len(text) * devices
+    latency = stats.summary()
+    chars_per_unit = chars / units if units else 0.0
+    return {
+        "path": path,
+        "script": script,
+        "size": size,
+        "code_points": len(text),
+        "devices": devices,
+        "chars": chars,
+        "units": units,
+        "elapsed_s": round(elapsed, 6),
+        "chars_per_sec": round(chars / elapsed, 2) if elapsed else 0.0,
+        "unit_p50_ms": round(latency["p50_ms"], 4),
+        "unit_p99_ms": round(latency["p99_ms"], 4),
+        "char_mean_ms": round(latency["mean_ms"] / chars_per_unit, 4) if chars_per_unit else 0.0,
+        "cpu_us_per_char": round(cpu / chars * 1e6, 3) if chars else 0.0,
+        "errors": errors,
+    }
+
+def bench_segment(script, size, text, repeat=1000):
+    """Grapheme segmentation alone: the text is split `repeat` times in a row (repeats included in chars)."""
+    stats = LatencyStats()
+    iter_graphemes(text)  # The segmenter is compiled on first use; do not measure that
+    cpu_started = cpu_seconds()
+    started = time.perf_counter()
+    units = 0
+    for _ in range(repeat):
+        segmented_at = time.perf_counter()
+        units += sum(1 for _ in iter_graphemes(text))
+        stats.add(time.perf_counter() - segmented_at)
+    elapsed = time.perf_counter() - started
+    return summarize("segment", script, size, text * repeat, 1, elapsed, cpu_seconds() - cpu_started, stats, units, 0)
+
+def bench_encode(script, size, text):
+    stats = LatencyStats()
+    cpu_started = cpu_seconds()
+    started = time.perf_counter()
+    graphemes = list(iter_graphemes(text))
+    for grapheme in graphemes:
+        encoded_at = time.perf_counter()
+        TextEncoder.encode_single_char(grapheme)
+        stats.add(time.perf_counter() - encoded_at)
+    TextEncoder.encode_for_adb(text)
+    elapsed = time.perf_counter() - started
+    return summarize("encode", script, size, text, 1, elapsed, cpu_seconds() - cpu_started, stats, len(graphemes), 0)
+
+def bench_plan(script, size, text):
+    """Per-character commands as the send loop gets them from a CommandPlan (compare with "encode").
+
+    Latency is the wait for each ready command; CPU time includes the
+    producer thread. The grapheme cache starts empty.
+    """
+    TextEncoder.encode_grapheme.cache_clear()
+    stats = LatencyStats()
+    cpu_started = cpu_seconds()
+    started = time.perf_counter()
+    units = 0
+    taken_at = time.perf_counter()
+    for _ in CommandPlan(iter_graphemes(text), per_char=True):
+        now = time.perf_counter()
+        stats.add(now - taken_at)
+        taken_at = now
+        units += 1
+    elapsed = time.perf_counter() - started
+    return summarize("plan", script, size, text, 1, elapsed, cpu_seconds() - cpu_started, stats, units, 0)
+
+def bench_send(path, script, size, text, serials, client):
+    if path == "subprocess":
+        shells = {serial: SubprocessAdbShell(serial) for serial in serials}
+    else:
+        shells = {serial: PersistentAdbShell(serial, client=client) for serial in serials}
+    chunk_mode = "push" if path == "push" else "chars" if path in ("bulk", "acked") else None
+    ack_window = 8 if path == "acked" else None
+    sender = FanOutSender(shells, chunk_mode=chunk_mode, chunk_size=500, ack_window=ack_window)
+    try:
+        # Open the shells first so connection setup is not measured
+        for shell in shells.values():
+            shell.run("true")
+        cpu_started = cpu_seconds()
+        results = sender.run(text)
+        cpu = cpu_seconds() - cpu_started
+    finally:
+        for shell in shells.values():
+            shell.close()
+    stats = LatencyStats()
+    for result in results.values():
+        stats.samples.extend(result.stats.samples)
+    errors = sum(1 for result in results.values() if result.error)
+    return summarize(path, script, size, text, len(serials), sender.elapsed, cpu, stats, len(stats.samples), errors)
+
+def compare(results, baseline_path, tolerance):
+    """Print throughput changes against a baseline run; returns the number of regressions."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {
+            (row["path"], row["script"], row["size"], row["devices"]): row
+            for row in json.load(f)["results"]
+        }
+    regressions = 0
+    for row in results:
+        old = baseline.get((row["path"], row["script"], row["size"], row["devices"]))
+        if not old or not old["chars_per_sec"]:
+            continue
+        ratio = row["chars_per_sec"] / old["chars_per_sec"]
+        flag = ""
+        if ratio < 1 - tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{row['path']:>12} {row['script']:>6} {row['size']:>6}: {ratio:6.2f}x baseline{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--scripts", nargs="+", choices=list(SAMPLES), default=list(SAMPLES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--devices", type=int, default=4, help="fake devices for the multi-device path")
+    parser.add_argument("--max-subprocess-chars", type=int, default=200,
+                        help="skip larger inputs on the (slow) subprocess path")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed throughput drop before a row counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    with FakeAdbEnvironment(args.devices) as env:
+        client = AdbClient()
+        serials = env.serials()
+        for path, script, size in itertools.product(args.paths, args.scripts, args.sizes):
+            if path == "subprocess" and size > args.max_subprocess_chars:
+                continue
+            text = make_text(script, size)
+            if path == "segment":
+                row = bench_segment(script, size, text)
+            elif path == "encode":
+                row = bench_encode(script, size, text)
+            elif path == "plan":
+                row = bench_plan(script, size, text)
+            else:
+                targets = serials if path == "multi-device" else serials[:1]
+                row = bench_send(path, script, size, text, targets, client)
+            results.append(row)
+            print(f"{path:>12} {script:>6} {size:>6}: {row['chars_per_sec']:>12.1f} chars/s  "
+                  f"p50 {row['unit_p50_ms']:.3f} ms  p99 {row['unit_p99_ms']:.3f} ms  "
+                  f"{row['cpu_us_per_char']:.1f} us CPU/char")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        return 1 if compare(results, args.baseline, args.tolerance) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
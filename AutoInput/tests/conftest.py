@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+
+from fake_adb_server import FakeAdbServer, FakeDevice
+
+from autoinput import AdbClient
+
+@pytest.fixture
+def server():
+    with FakeAdbServer([FakeDevice("fake-01"), FakeDevice("fake-02")]) as server:
+        yield server
+
+@pytest.fixture
+def client(server):
+    return AdbClient(port=server.port, timeout=5.0)
@@ -0,0 +1,63 @@
+from autoinput import AimdController, FanOutSender, PersistentAdbShell, RateMemory
+
+class SmallBroadcastShell:
+    """A device that refuses broadcasts longer than `limit` characters."""
+
+    def __init__(self, shell, limit):
+        self.shell = shell
+        self.limit = limit
+        self.refused = 0
+
+    def run(self, command):
+        if len(command) > self.limit:
+            self.refused += 1
+            return 1, "Error: command too long"
+        return self.shell.run(command)
+
+def test_slow_start_doubles_until_the_first_congestion():
+    controller = AimdController(max_rtt=1.0)
+    for _ in range(5):
+        controller.on_success(0.01, controller.chunk_size)
+    assert controller.chunk_size == 32
+    controller.on_success(2.0, 32)
+    assert (controller.chunk_size, controller.threshold) == (16, 16)
+    controller.on_success(0.01, 16)
+    assert controller.chunk_size == 16 + controller.increase
+
+def test_congestion_at_the_smallest_chunk_spaces_broadcasts_out():
+    controller = AimdController(interval_step=0.01, max_interval=0.04)
+    for _ in range(3):
+        controller.on_failure()
+    assert controller.chunk_size == 1
+    assert controller.interval == 0.04 and controller.throttled
+    controller.on_success(0.01, 1)
+    assert controller.interval == 0.04 - 0.04 / 16 and not controller.throttled
+
+def test_remembered_rates_start_the_next_controller(tmp_path):
+    path = str(tmp_path / "rates.json")
+    controller = AimdController(chunk_size=64)
+    controller.samples = 3
+    RateMemory(path, min_samples=20).remember("Fake Pixel (Android 14)", controller)
+    assert RateMemory(path).controller("Fake Pixel (Android 14)").chunk_size == 1
+    controller.samples = 20
+    RateMemory(path, min_samples=20).remember("Fake Pixel (Android 14)", controller)
+    restored = RateMemory(path).controller("Fake Pixel (Android 14)")
+    assert (restored.chunk_size, restored.threshold) == (64, 64)
+
+def test_device_key_names_the_model():
+    info = {"id": "fake-01", "manufacturer": "Fake", "model": "Pixel Fake", "version": "14"}
+    assert RateMemory.device_key(info) == "Fake Pixel Fake (Android 14)"
+    assert RateMemory.device_key({"id": "fake-01"}) == "fake-01"
+
+def test_adaptive_send_backs_off_from_chunks_the_device_refuses(server, client):
+    text = "adaptive " * 100
+    shell = SmallBroadcastShell(PersistentAdbShell("fake-01", client=client), limit=200)
+    controller = AimdController()
+    try:
+        results = FanOutSender({"fake-01": shell}, chunk_mode="chars", controllers={"fake-01": controller}).run(text)
+    finally:
+        shell.shell.close()
+    assert results["fake-01"].completed
+    assert server.devices["fake-01"].text == text
+    assert shell.refused > 0 and controller.slowdowns >= shell.refused
+    assert results["fake-01"].adaptive is controller
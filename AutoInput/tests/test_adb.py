@@ -0,0 +1,113 @@
+import socket
+import time
+import unicodedata
+
+import pytest
+from fake_adb_server import FakeDevice
+
+from autoinput import AdbClient, AdbError, CommandTimeout, FanOutSender, PersistentAdbShell
+
+def test_devices_lists_every_device_with_its_state(server, client):
+    server.add_device(FakeDevice("fake-03", state="offline"))
+    assert client.devices() == [("fake-01", "device"), ("fake-02", "device"), ("fake-03", "offline")]
+
+def test_version(client):
+    assert client.version() == 0x29
+
+def test_shell_runs_a_command_on_the_chosen_device(client):
+    assert client.shell("getprop ro.product.model", serial="fake-02") == "Pixel Fake\n"
+
+def test_unknown_device_is_an_adb_error(client):
+    with pytest.raises(AdbError, match="device 'nope' not found"):
+        client.shell("true", serial="nope")
+
+def test_any_device_is_ambiguous_with_several_connected(client):
+    with pytest.raises(AdbError, match="more than one device"):
+        client.shell("true")
+
+def test_unreachable_server_is_an_adb_error():
+    with socket.create_server(("127.0.0.1", 0)) as listener:
+        port = listener.getsockname()[1]
+    with pytest.raises(AdbError, match="Cannot reach adb server"):
+        AdbClient(port=port, timeout=1.0).devices()
+
+def test_persistent_shell_returns_status_and_output(client):
+    shell = PersistentAdbShell("fake-01", client=client)
+    try:
+        assert shell.run("echo hello") == (0, "hello")
+        assert shell.run("false") == (1, "")
+        assert shell.reconnects == 0
+    finally:
+        shell.close()
+
+def test_persistent_shell_reconnects_after_the_session_drops(server, client):
+    shell = PersistentAdbShell("fake-01", client=client)
+    try:
+        shell.run("true")
+        device = server.devices["fake-01"]
+        server.remove_device("fake-01")
+        assert shell.ended.wait(5)
+        server.add_device(device)
+        assert shell.run("echo back") == (0, "back")
+        assert shell.reconnects >= 1
+    finally:
+        shell.close()
+
+def test_persistent_shell_gives_up_when_the_device_is_gone(server, client):
+    shell = PersistentAdbShell("fake-01", client=client)
+    try:
+        shell.run("true")
+        server.remove_device("fake-01")
+        assert shell.ended.wait(5)
+        with pytest.raises(AdbError, match="adb shell session failed"):
+            shell.run("true")
+    finally:
+        shell.close()
+
+def test_persistent_shell_does_not_resend_a_command_that_timed_out(client):
+    shell = PersistentAdbShell("fake-01", timeout=0.2, client=client)
+    try:
+        with pytest.raises(CommandTimeout):
+            shell.run("sleep 0.5")
+        # The late marker of the first command must not answer the next one
+        assert shell.run("echo next") == (0, "next")
+    finally:
+        shell.close()
+
+def test_fanout_does_not_retype_a_broadcast_whose_reply_was_late(server, client):
+    device = server.devices["fake-01"]
+    device.broadcast_delay = 0.4
+    shell = PersistentAdbShell("fake-01", timeout=0.2, client=client)
+    try:
+        results = FanOutSender({"fake-01": shell}, chunk_mode="chars", retry_delay=0.01).run("typed once")
+    finally:
+        shell.close()
+    assert isinstance(results["fake-01"].error, CommandTimeout)
+    assert results["fake-01"].retries == 0
+    time.sleep(0.5)
+    assert device.text == "typed once"
+
+@pytest.mark.parametrize("chunk_mode", [None, "chars", "words"])
+def test_fanout_types_the_text_on_every_device(server, client, chunk_mode):
+    # A decomposed accent arrives NFC-normalized
+    text = "Hello, \u4e16\u754c! \U0001f468\u200d\U0001f469\u200d\U0001f467 e\u0301t\u00e9\nsecond line"
+    shells = {serial: PersistentAdbShell(serial, client=client) for serial in server.devices}
+    try:
+        results = FanOutSender(shells, chunk_mode=chunk_mode, chunk_size=7).run(text)
+    finally:
+        for shell in shells.values():
+            shell.close()
+    for serial, result in results.items():
+        assert result.completed and result.error is None
+        assert result.sent_chars == result.total_chars
+        assert server.devices[serial].text == unicodedata.normalize("NFC", text)
+
+def test_fanout_reports_a_missing_device_without_stopping_the_others(server, client):
+    shells = {serial: PersistentAdbShell(serial, client=client) for serial in ("fake-01", "gone")}
+    try:
+        results = FanOutSender(shells, chunk_mode="chars", max_retries=1, retry_delay=0.01).run("abc")
+    finally:
+        for shell in shells.values():
+            shell.close()
+    assert results["fake-01"].completed and server.devices["fake-01"].text == "abc"
+    assert isinstance(results["gone"].error, AdbError) and results["gone"].sent_chars == 0
@@ -0,0 +1,156 @@
+import http.client
+import json
+import socket
+import time
+
+import pytest
+
+from autoinput import RateMemory
+from autoinput.daemon import SendDaemon, SendJob, UnixJobServer
+
+@pytest.fixture
+def daemon(client, tmp_path):
+    daemon = SendDaemon(client, rate_memory=RateMemory(str(tmp_path / "rates.json")))
+    daemon.start()
+    assert daemon.wait_for_devices() == ["fake-01", "fake-02"]
+    yield daemon
+    daemon.close()
+
+def snapshots(daemon, job_id, timeout=10.0):
+    """Follow a job, failing the test instead of hanging if it never finishes."""
+    deadline = time.monotonic() + timeout
+    for snapshot in daemon.watch(job_id, heartbeat=0.2):
+        assert time.monotonic() < deadline, f"{job_id} is still {snapshot['state']}"
+        yield snapshot
+
+def finish(daemon, job_id):
+    for snapshot in snapshots(daemon, job_id):
+        if snapshot["state"] in SendJob.FINISHED:
+            return snapshot
+
+def http_request(server, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    try:
+        connection.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = connection.getresponse()
+        return response.status, response.read().decode("utf-8")
+    finally:
+        connection.close()
+
+def test_a_job_is_typed_on_every_device(server, daemon):
+    reply = daemon.handle({"op": "send", "text": "hello daemon", "mode": "chunk"})
+    assert reply["ok"] and reply["state"] in ("queued", "running")
+    snapshot = finish(daemon, reply["job"])
+    assert snapshot["state"] == "done"
+    assert {serial: device["sent_chars"] for serial, device in snapshot["devices"].items()} == {
+        "fake-01": 12, "fake-02": 12
+    }
+    assert [device.text for device in server.devices.values()] == ["hello daemon"] * 2
+
+def test_higher_priority_jobs_run_first(server, daemon):
+    server.devices["fake-01"].broadcast_delay = 0.05
+    request = {"mode": "chunk", "chunk_size": 1, "serials": ["fake-01"]}
+    first = daemon.submit(dict(request, text="AAAA"))
+    low = daemon.submit(dict(request, text="LLLL"))
+    high = daemon.submit(dict(request, text="HHHH", priority=5))
+    for job in (first, low, high):
+        assert finish(daemon, job.id)["state"] == "done"
+    text = server.devices["fake-01"].text
+    assert sorted(text) == sorted("AAAALLLLHHHH")
+    assert text.index("H") < text.index("L") and text.index("A") < text.index("L")
+
+def test_cancel_stops_a_running_job_and_skips_a_queued_one(server, daemon):
+    server.devices["fake-01"].broadcast_delay = 0.02
+    request = {"mode": "chunk", "chunk_size": 1, "serials": ["fake-01"]}
+    running = daemon.submit(dict(request, text="r" * 200))
+    queued = daemon.submit(dict(request, text="queued"))
+    for snapshot in snapshots(daemon, running.id):
+        if snapshot["devices"]["fake-01"]["sent_chars"] >= 3:
+            break
+    assert daemon.handle({"op": "cancel", "job": queued.id})["ok"]
+    assert daemon.handle({"op": "cancel", "job": running.id})["ok"]
+    assert finish(daemon, running.id)["state"] == "cancelled"
+    assert finish(daemon, queued.id)["devices"]["fake-01"]["state"] == "cancelled"
+    assert 3 <= len(server.devices["fake-01"].text) < 200
+    assert "queued" not in server.devices["fake-01"].text
+
+def test_bad_requests_are_answered_with_an_error(daemon):
+    assert daemon.handle({"op": "status", "job": "job-404"}) == {"ok": False, "error": "unknown job 'job-404'"}
+    assert not daemon.handle({"op": "send", "text": ""})["ok"]
+    assert not daemon.handle({"op": "send", "text": "x", "mode": "telepathy"})["ok"]
+    assert daemon.handle({"op": "send", "text": "x", "serials": ["nope"]})["error"] == "device not connected: nope"
+    assert not daemon.handle({"op": "send", "text": "{NOPE}", "keys": True})["ok"]
+    assert not daemon.handle({"op": "dance"})["ok"]
+
+def test_a_failing_job_does_not_stop_the_device_worker(server, daemon, monkeypatch):
+    run_job = daemon.run_job
+    calls = []
+
+    def fail_once(job, worker):
+        calls.append(job.id)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        run_job(job, worker)
+
+    monkeypatch.setattr(daemon, "run_job", fail_once)
+    broken = daemon.submit({"text": "lost", "serials": ["fake-01"]})
+    snapshot = finish(daemon, broken.id)
+    assert snapshot["state"] == "failed"
+    assert snapshot["devices"]["fake-01"]["error"] == "boom"
+    assert finish(daemon, daemon.submit({"text": "next", "serials": ["fake-01"]}).id)["state"] == "done"
+    assert server.devices["fake-01"].text == "next"
+
+def test_devices_lists_the_workers(daemon):
+    reply = daemon.handle({"op": "devices"})
+    assert [device["serial"] for device in reply["devices"]] == ["fake-01", "fake-02"]
+    assert all(device["model"] == "Pixel Fake" for device in reply["devices"])
+
+def test_http_routes(server, daemon):
+    http_server = daemon.serve_http(0)
+    status, body = http_request(http_server, "POST", "/jobs", {"text": "over http", "serials": ["fake-02"]})
+    assert status == 201
+    job_id = json.loads(body)["job"]
+    status, body = http_request(http_server, "GET", f"/jobs/{job_id}/events")
+    events = [json.loads(line) for line in body.splitlines()]
+    assert status == 200 and events[-1]["state"] == "done"
+    assert server.devices["fake-02"].text == "over http"
+    status, body = http_request(http_server, "GET", f"/jobs/{job_id}")
+    assert status == 200 and json.loads(body)["state"] == "done"
+    assert http_request(http_server, "GET", "/devices")[0] == 200
+    assert http_request(http_server, "DELETE", f"/jobs/{job_id}")[0] == 200
+
+def test_http_errors(daemon):
+    http_server = daemon.serve_http(0)
+    status, body = http_request(http_server, "GET", "/jobs/job-404/events")
+    assert (status, json.loads(body)) == (404, {"ok": False, "error": "unknown job 'job-404'"})
+    assert http_request(http_server, "GET", "/jobs/job-404")[0] == 404
+    assert http_request(http_server, "DELETE", "/jobs/job-404")[0] == 404
+    assert http_request(http_server, "POST", "/jobs", {"text": ""})[0] == 400
+    assert http_request(http_server, "GET", "/nowhere")[0] == 404
+
+@pytest.mark.skipif(UnixJobServer is None, reason="no Unix sockets on this platform")
+def test_unix_socket_requests(server, daemon, tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    daemon.serve_unix(path)
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(path)
+        sock.settimeout(10)
+        stream = sock.makefile("rw", encoding="utf-8")
+
+        def ask(request):
+            stream.write(json.dumps(request) + "\n")
+            stream.flush()
+            return json.loads(stream.readline())
+
+        job_id = ask({"op": "send", "text": "over unix", "serials": ["fake-01"]})["job"]
+        stream.write(json.dumps({"op": "watch", "job": job_id}) + "\n")
+        stream.flush()
+        while json.loads(stream.readline())["state"] != "done":
+            pass
+        assert ask({"op": "status", "job": job_id})["state"] == "done"
+        assert ask({"op": "watch", "job": "job-404"}) == {"ok": False, "error": "unknown job 'job-404'"}
+        assert ask({"op": "devices"})["ok"]
+        stream.write("not json\n")
+        stream.flush()
+        assert not json.loads(stream.readline())["ok"]
+    assert server.devices["fake-01"].text == "over unix"
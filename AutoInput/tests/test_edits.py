@@ -0,0 +1,93 @@
+import random
+import unicodedata
+
+import pytest
+from fake_adb_server import FakeDevice
+
+from autoinput import EditScript, FanOutSender, PersistentAdbShell
+from autoinput.diff import diff
+
+ALPHABET = ["a", "b", "c", " ", "\n", "\u00e9", "e\u0301", "\U0001F600", "\U0001F1EB\U0001F1F7", "\ud55c"]
+
+def random_edit(rng, text):
+    graphemes = list(text)
+    for _ in range(rng.randrange(1, 6)):
+        start = rng.randrange(len(graphemes) + 1)
+        end = min(len(graphemes), start + rng.randrange(4))
+        graphemes[start:end] = rng.choices(ALPHABET, k=rng.randrange(4))
+    return graphemes
+
+def apply_hunks(old, new, hunks):
+    result = list(old)
+    for old_start, old_end, new_start, new_end in reversed(hunks):
+        result[old_start:old_end] = new[new_start:new_end]
+    return result
+
+def edited_device(old, script):
+    device = FakeDevice("edit-01")
+    device.typed.append(unicodedata.normalize("NFC", old))
+    reply = device.editor.receive(";".join(token for token, _ in script.tokens()))
+    return device, reply
+
+@pytest.mark.parametrize("seed", range(20))
+def test_diff_hunks_rebuild_the_new_sequence(seed):
+    rng = random.Random(seed)
+    old = rng.choices("abcde", k=rng.randrange(60))
+    new = random_edit(rng, old)
+    hunks = diff(old, new)
+    assert apply_hunks(old, new, hunks) == new
+    assert all(a[1] <= b[0] for a, b in zip(hunks, hunks[1:]))
+
+def test_diff_replaces_the_middle_past_max_cost():
+    old, new = list("x" + "a" * 50 + "y"), list("x" + "b" * 50 + "y")
+    assert diff(old, new, max_cost=10) == [(1, 51, 1, 51)]
+    assert diff(old, old) == []
+
+@pytest.mark.parametrize("seed", range(20))
+def test_edit_script_turns_the_typed_text_into_the_new_text(seed):
+    rng = random.Random(seed)
+    graphemes = rng.choices(ALPHABET, k=rng.randrange(40))
+    old, new = "".join(graphemes), "".join(random_edit(rng, graphemes))
+    script = EditScript.from_texts(old, new)
+    device, reply = edited_device(old, script)
+    assert reply.startswith("OK")
+    assert device.text == unicodedata.normalize("NFC", new)
+    assert device.cursor_back == 0
+
+def test_edit_script_counts_utf16_units():
+    script = EditScript.from_texts("a\U0001F600b", "ab")
+    assert script.ops == [("left", 1), ("delete", 2), ("right", 1)]
+    assert edited_device("a\U0001F600b", script)[0].text == "ab"
+
+def test_receiver_refuses_a_script_for_other_text():
+    script = EditScript.from_texts("hello world", "hello, world")
+    device, reply = edited_device("world", script)
+    assert reply == "ERR 0 the text around the cursor is not the text sent before"
+    assert device.text == "world"
+
+def run_edits(server, client, old, new):
+    shells = {serial: PersistentAdbShell(serial, client=client) for serial in server.devices}
+    try:
+        return FanOutSender(shells).run_edits(old, new)
+    finally:
+        for shell in shells.values():
+            shell.close()
+
+def test_fanout_edits_the_text_on_every_device(server, client):
+    old, new = "The quick brown fox", "The quick red fox jumps"
+    for device in server.devices.values():
+        device.typed.append(old)
+    results = run_edits(server, client, old, new)
+    for serial, result in results.items():
+        assert result.completed and result.error is None
+        assert result.sent_chars == result.edits.inserted_chars
+        assert server.devices[serial].text == new
+
+def test_fanout_edits_need_a_focused_field(server, client):
+    device = server.devices["fake-01"]
+    device.typed.append("draft")
+    device.editor.finish_input()
+    results = run_edits(server, client, "draft", "final draft")
+    assert "no input field" in str(results["fake-01"].error)
+    assert device.text == "draft"
+    assert results["fake-02"].error is not None  # Nothing was typed there
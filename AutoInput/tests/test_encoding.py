@@ -0,0 +1,107 @@
+import base64
+import random
+import re
+
+import pytest
+
+from autoinput import MAX_BROADCAST_COMMAND_LENGTH, FanOutSender, PersistentAdbShell, TextChunker, TextEncoder, iter_graphemes
+from autoinput.encoding import _is_regional_indicator, _joins
+
+WORDS = "The quick brown fox jumps over the lazy dog.\nPack my box with five dozen liquor jugs.\n" * 20
+
+# Characters whose clusters are hard to get right: marks, joiners, modifiers, flags, Hangul jamo and CR LF
+TRICKY = [
+    "a", " ", "\r", "\n", "\u0301", "\u0308", "\u200d", "\ufe0f", "\U0001f3fd", "\U0001f468", "\u2764",
+    "\U0001f1eb", "\U0001f1f7", "\u1100", "\u1161", "\u11a8", "\uac00", "\uac01", "\u4e16", "\U000e0067",
+]
+
+def reference_graphemes(text):
+    """Clusters by the per-code-point rules of _joins(), which the compiled patterns must match."""
+    clusters = []
+    previous = None
+    regional_run = 0
+    for char in text:
+        if clusters and _joins(previous, char, regional_run):
+            clusters[-1] += char
+        else:
+            clusters.append(char)
+            regional_run = 0
+        regional_run = regional_run + 1 if _is_regional_indicator(char) else 0
+        previous = char
+    return clusters
+
+def decode(command):
+    return base64.b64decode(re.search(r'--es msg "([^"]*)"', command).group(1)).decode("utf-8")
+
+def test_chars_mode_cuts_every_size_graphemes():
+    text = "é" * 25 + "\U0001f44d\U0001f3fd" * 25
+    chunks = list(TextChunker(10, "chars").chunks(text))
+    assert [len(list(iter_graphemes(chunk))) for chunk in chunks] == [10] * 5
+    assert "".join(chunks) == "é" * 25 + "\U0001f44d\U0001f3fd" * 25
+
+def test_words_mode_never_splits_a_word():
+    chunks = list(TextChunker(30, "words").chunks(WORDS))
+    assert "".join(chunks) == WORDS
+    assert all(len(chunk) <= 30 and (chunk[-1].isspace() or chunk is chunks[-1]) for chunk in chunks)
+
+def test_lines_mode_ends_chunks_on_line_breaks():
+    chunks = list(TextChunker(100, "lines").chunks(WORDS))
+    assert "".join(chunks) == WORDS
+    assert all(chunk.endswith("\n") for chunk in chunks)
+
+def test_a_word_longer_than_a_chunk_is_split_between_graphemes():
+    word = "\U0001f1eb\U0001f1f7" * 12
+    chunks = list(TextChunker(5, "words").chunks(word + " end"))
+    assert "".join(chunks) == word + " end"
+    assert chunks == ["\U0001f1eb\U0001f1f7" * 5] * 2 + ["\U0001f1eb\U0001f1f7" * 2 + " ", "end"]
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError, match="Unknown chunk mode"):
+        TextChunker(10, "sentences")
+
+@pytest.mark.parametrize("mode", TextChunker.MODES)
+def test_every_chunk_fits_one_broadcast_command(mode):
+    text = "世界" * 3000 + " " + "\U0001f600" * 2000
+    commands = TextEncoder.encode_chunks(text, size=100000, mode=mode)
+    assert all(len(command) - len("adb shell ") <= MAX_BROADCAST_COMMAND_LENGTH for command in commands)
+    assert "".join(decode(command) for command in commands) == text
+
+def test_bulk_mode_sends_one_broadcast_per_chunk(server, client):
+    shell = PersistentAdbShell("fake-01", client=client)
+    try:
+        results = FanOutSender({"fake-01": shell}, chunk_mode="chars", chunk_size=100).run("x" * 1000)
+    finally:
+        shell.close()
+    device = server.devices["fake-01"]
+    assert results["fake-01"].completed
+    assert device.text == "x" * 1000
+    assert device.broadcasts == 10
+
+@pytest.mark.parametrize("seed", range(50))
+def test_graphemes_follow_the_cluster_rules(seed):
+    rng = random.Random(seed)
+    text = "".join(rng.choices(TRICKY, k=200))
+    assert list(iter_graphemes(text)) == reference_graphemes(text)
+
+@pytest.mark.parametrize("cluster", [
+    "e\u0301\u0308",
+    "\U0001f468\u200d\U0001f469\u200d\U0001f467",
+    "\U0001f44d\U0001f3fd",
+    "\U0001f1eb\U0001f1f7",
+    "\u1100\u1161\u11a8",
+    "\r\n",
+    "\U0001f3f4\U000e0067\U000e0062\U000e0073\U000e0063\U000e0074\U000e007f",
+], ids=["marks", "zwj family", "skin tone", "flag", "jamo", "crlf", "tag sequence"])
+def test_a_cluster_is_one_grapheme(cluster):
+    assert list(iter_graphemes("x" + cluster + "y")) == ["x", cluster, "y"]
+
+def test_per_character_mode_sends_one_broadcast_per_cluster(server, client):
+    text = "a\U0001f468\u200d\U0001f469\u200d\U0001f467\U0001f1eb\U0001f1f7e\u0301"
+    shell = PersistentAdbShell("fake-01", client=client)
+    try:
+        results = FanOutSender({"fake-01": shell}).run(text)
+    finally:
+        shell.close()
+    device = server.devices["fake-01"]
+    assert results["fake-01"].completed
+    assert device.typed == ["a", "\U0001f468\u200d\U0001f469\u200d\U0001f467", "\U0001f1eb\U0001f1f7", "\u00e9"]
@@ -0,0 +1,85 @@
+import itertools
+import types
+
+import pytest
+
+from autoinput import Sender, TextEncoder
+from autoinput import history
+from autoinput.history import TextStore
+
+@pytest.fixture
+def store(monkeypatch):
+    # A clock that ticks on every call keeps the LRU order deterministic
+    clock = itertools.count(1000)
+    monkeypatch.setattr(history, "time", types.SimpleNamespace(time=lambda: float(next(clock))))
+    store = TextStore(":memory:")
+    yield store
+    store.close()
+
+def uses(store, key):
+    return next(entry["uses"] for entry in store.entries() if entry["key"] == key)
+
+def test_same_text_is_stored_once(store):
+    key = store.add("café")
+    assert store.add("café") == key
+    assert store.get(key) == "café"
+    assert len(store.entries()) == 1
+
+def test_only_completed_sends_are_counted(store):
+    key = store.add("draft")
+    assert uses(store, key) == 0
+    store.used(key)
+    store.add("draft")
+    assert uses(store, key) == 1
+
+def test_resolve_by_name_and_key_prefix(store):
+    key = store.add("hello", name="greeting")
+    assert store.resolve("greeting") == key
+    assert store.resolve(key[:6]) == key
+    with pytest.raises(KeyError):
+        store.resolve("zz")
+    with pytest.raises(KeyError):
+        store.resolve("")
+
+def test_eviction_drops_the_least_recently_used_text_and_keeps_snippets(store):
+    store.max_bytes = 100
+    snippet = store.add("s" * 40, name="sig")
+    first = store.add("a" * 30)
+    second = store.add("b" * 30)
+    store.get(first)
+    third = store.add("c" * 30)
+    assert store.get(second) is None
+    assert [store.get(key) is not None for key in (snippet, first, third)] == [True, True, True]
+    assert store.size() <= store.max_bytes
+
+def test_payload_is_cached_and_evicted_before_snippets(store):
+    key = store.add("word " * 60, name="long")
+    payload = store.payload(key, "words", 50)
+    assert "".join(unit for unit, _ in payload) == "word " * 60
+    assert all(command == TextEncoder.encode_broadcast(unit) for unit, command in payload)
+    assert store.payload(key, "words", 50) == payload
+    assert store.db.execute("SELECT COUNT(*) FROM payloads").fetchone()[0] == 1
+    store.max_bytes = store.size() - 1
+    store.evict()
+    assert store.db.execute("SELECT COUNT(*) FROM payloads").fetchone()[0] == 0
+    assert store.get(key) == "word " * 60
+
+def test_send_stored_counts_a_use_only_after_the_send(server, client, store):
+    key = store.add("stored text " * 20)
+    with Sender(serials=list(server.devices), mode="chunk", chunk_size=50, client=client) as sender:
+        sender.send_stored(store, key)
+        with pytest.raises(KeyError):
+            sender.send_stored(store, "0" * 64)
+    assert uses(store, key) == 1
+    for device in server.devices.values():
+        assert device.text == "stored text " * 20
+
+def test_failed_send_stored_is_not_counted(server, client, store):
+    key = store.add("never typed")
+    server.remove_device("fake-01")
+    with Sender(serials=["fake-01"], mode="chunk", client=client) as sender:
+        # Give up at the first reconnect instead of waiting through the backoff
+        sender.on_progress = lambda result: result.reconnecting and sender.stop()
+        results = sender.send_stored(store, key)
+    assert not results["fake-01"].completed
+    assert uses(store, key) == 0
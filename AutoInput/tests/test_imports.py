@@ -0,0 +1,19 @@
+import subprocess
+import sys
+
+import pytest
+from conftest import ROOT
+
+@pytest.mark.parametrize("module", ["http.server", "socketserver"])
+def test_cli_starts_without_loading_the_daemon(module):
+    code = f"import sys, autoinput.cli; sys.exit({module!r} in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=ROOT).returncode == 0
+
+def test_cli_starts_without_loading_sqlite():
+    code = "import sys, autoinput.cli; sys.exit('sqlite3' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=ROOT).returncode == 0
+
+def test_gui_starts_without_loading_sqlite():
+    pytest.importorskip("tkinter")
+    code = "import sys, autoInput; sys.exit('sqlite3' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=ROOT).returncode == 0
@@ -0,0 +1,61 @@
+from autoinput import FanOutSender, PersistentAdbShell, SendJournal
+
+TEXT = "".join(f"line {i}\n" for i in range(40))
+
+def open_shells(server, client):
+    return {serial: PersistentAdbShell(serial, client=client) for serial in server.devices}
+
+def close_shells(shells):
+    for shell in shells.values():
+        shell.close()
+
+def test_progress_survives_a_new_journal(tmp_path):
+    journal = SendJournal(str(tmp_path))
+    job_id = journal.text_job_id(TEXT)
+    journal.record(job_id, "fake-01", 12, 14, force=True)
+    assert SendJournal(str(tmp_path)).offset(job_id, "fake-01") == (12, 14)
+    journal.complete(job_id, "fake-01")
+    assert SendJournal(str(tmp_path)).offset(job_id, "fake-01") == (0, 0)
+    assert not list(tmp_path.iterdir())
+
+def test_resume_sends_only_what_is_left(server, client, tmp_path):
+    journal = SendJournal(str(tmp_path))
+    journal.record(journal.text_job_id(TEXT), "fake-01", 30, 30, force=True)
+    shells = open_shells(server, client)
+    try:
+        results = FanOutSender(shells, chunk_mode="chars", chunk_size=8, journal=journal).run(TEXT, resume=True)
+    finally:
+        close_shells(shells)
+    assert results["fake-01"].resumed_from == 30 and results["fake-01"].completed
+    assert server.devices["fake-01"].text == TEXT[30:]
+    assert server.devices["fake-02"].text == TEXT
+    assert not list(tmp_path.iterdir())
+
+def test_an_interrupted_send_resumes_where_the_device_stopped(server, client, tmp_path):
+    journal = SendJournal(str(tmp_path))
+    device = server.devices["fake-01"]
+
+    def unplug(result):
+        if result.serial == "fake-01" and result.sent_chars >= 40 and "fake-01" in server.devices:
+            server.remove_device("fake-01")
+
+    shells = open_shells(server, client)
+    try:
+        results = FanOutSender(shells, chunk_mode="chars", chunk_size=8, journal=journal, on_progress=unplug,
+                               max_retries=0).run(TEXT)
+    finally:
+        close_shells(shells)
+    stopped_at = results["fake-01"].sent_chars
+    assert results["fake-01"].error is not None and 40 <= stopped_at < len(TEXT)
+    assert journal.offset(journal.text_job_id(TEXT), "fake-01")[0] == stopped_at
+
+    server.add_device(device)
+    shells = open_shells(server, client)
+    try:
+        results = FanOutSender(shells, chunk_mode="chars", chunk_size=8, journal=SendJournal(str(tmp_path))).run(
+            TEXT, resume=True)
+    finally:
+        close_shells(shells)
+    assert results["fake-01"].resumed_from == stopped_at and results["fake-01"].completed
+    assert device.text == TEXT
+    assert server.devices["fake-02"].text == TEXT * 2
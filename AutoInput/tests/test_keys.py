@@ -0,0 +1,60 @@
+import subprocess
+
+import pytest
+
+from autoinput import FanOutSender, KeyScript, PersistentAdbShell, SubprocessAdbShell
+from autoinput import transport
+
+def test_markup_merges_keys_and_keeps_literal_braces():
+    script = KeyScript.from_markup("a{{b}{TAB 2}{enter}c{1}")
+    assert script.segments == [("text", "a{b}"), ("keys", [61, 61, 66]), ("text", "c{1}")]
+    assert (script.chars, script.keys) == (8, 3)
+
+def test_unknown_keys_are_refused():
+    with pytest.raises(ValueError, match="Unknown key"):
+        KeyScript.from_markup("{NOPE}")
+
+def test_batches_fit_the_command_length_and_count_every_character():
+    script = KeyScript.from_markup("field{TAB}" * 40)
+    batches = script.batches(max_command_length=300)
+    assert len(batches) > 1
+    assert all(len(line) <= 300 for line, chars in batches)
+    assert sum(chars for line, chars in batches) == script.chars
+
+def test_a_form_is_typed_on_the_device(server, client):
+    shell = PersistentAdbShell("fake-01", client=client)
+    try:
+        result = FanOutSender({"fake-01": shell}).run_keys("name{TAB}mail{ENTER}")["fake-01"]
+    finally:
+        shell.close()
+    device = server.devices["fake-01"]
+    assert result.completed and result.sent_chars == 8
+    assert device.keyevents == ["61", "66"]
+    assert device.text == "name\tmail\n"
+
+def test_a_failing_command_stops_the_rest_of_its_line(server, client):
+    device = server.devices["fake-01"]
+    execute = device.execute
+    device.execute = lambda argv, status: ("", 1) if argv[:1] == ["input"] else execute(argv, status)
+    shell = PersistentAdbShell("fake-01", client=client)
+    try:
+        result = FanOutSender({"fake-01": shell}).run_keys("one{TAB}two")["fake-01"]
+    finally:
+        shell.close()
+    assert isinstance(result.error, subprocess.CalledProcessError)
+    assert result.sent_chars == 0
+    assert device.text == "one"
+
+def test_subprocess_shell_keeps_the_command_away_from_the_host_shell(monkeypatch):
+    calls = []
+
+    def run(argv, **kwargs):
+        calls.append((argv, kwargs))
+        return subprocess.CompletedProcess(argv, 0, "", "")
+
+    monkeypatch.setattr(transport.subprocess, "run", run)
+    command = "am broadcast -a ADB_INPUT_B64 --es msg YQ== && input keyevent 66; touch /tmp/host"
+    assert SubprocessAdbShell("fake-01").run(command) == (0, "")
+    argv, kwargs = calls[0]
+    assert argv == ["adb", "-s", "fake-01", "shell", command]
+    assert not kwargs.get("shell")
@@ -0,0 +1,54 @@
+import json
+
+from autoinput import FanOutSender, Metrics, NullMetrics, PersistentAdbShell
+
+def test_null_metrics_are_falsy_and_ignore_everything():
+    metrics = NullMetrics()
+    assert not metrics
+    metrics.observe("encode", 0.1, serial="x")
+    metrics.count("chars_sent", 3)
+
+def test_histograms_are_cumulative_in_the_prometheus_text(tmp_path):
+    metrics = Metrics()
+    metrics.observe("encode", 0.0002, serial="a")
+    metrics.observe("encode", 0.003, serial="a")
+    metrics.count("chars_sent", 5, serial="a")
+    metrics.count("chars_sent", 2, serial="a")
+    path = tmp_path / "metrics.prom"
+    metrics.write_prometheus(str(path))
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert 'autoinput_stage_seconds_bucket{stage="encode",serial="a",le="0.00025"} 1' in lines
+    assert 'autoinput_stage_seconds_bucket{stage="encode",serial="a",le="0.005"} 2' in lines
+    assert 'autoinput_stage_seconds_count{stage="encode",serial="a"} 2' in lines
+    assert 'autoinput_chars_sent_total{serial="a"} 7' in lines
+    assert "# TYPE autoinput_chars_sent_total counter" in lines
+    assert list(tmp_path.iterdir()) == [path]
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.count("retries", serial='a"b\\c')
+    assert 'autoinput_retries_total{serial="a\\"b\\\\c"} 1' in metrics.prometheus_text()
+
+def test_trace_has_one_json_line_per_event(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    metrics = Metrics(str(path))
+    metrics.observe("roundtrip", 0.002, serial="a")
+    metrics.count("broadcasts", serial="a")
+    metrics.close()
+    events = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(event.get("stage"), event.get("counter")) for event in events] == [("roundtrip", None), (None, "broadcasts")]
+    assert events[0]["ms"] == 2.0
+
+def test_a_send_records_every_stage_and_counter(server, client):
+    metrics = Metrics()
+    shell = PersistentAdbShell("fake-01", client=client)
+    try:
+        FanOutSender({"fake-01": shell}, chunk_mode="chars", chunk_size=4, metrics=metrics).run("twelve chars")
+    finally:
+        shell.close()
+    totals = metrics.stage_totals()
+    assert {"read", "encode", "roundtrip"} <= totals.keys()
+    assert totals["roundtrip"][0] == 3
+    assert metrics.counters[("chars_sent", (("serial", "fake-01"),))] == 12
+    assert metrics.counters[("broadcasts", (("serial", "fake-01"),))] == 3
+    assert metrics.describe().splitlines()[0].split() == ["stage", "count", "total", "s", "mean", "ms"]
@@ -0,0 +1,78 @@
+import itertools
+
+import pytest
+
+from autoinput import CommandPlan, FanOutSender, Metrics, PersistentAdbShell, TextEncoder
+from autoinput import fanout as fanout_module
+from autoinput.plan import PLAN_BATCH
+
+def test_commands_come_out_in_order():
+    units = [f"chunk {i} " for i in range(PLAN_BATCH * 5 + 3)]
+    plan = CommandPlan(iter(units), ahead=PLAN_BATCH * 2)
+    assert list(plan) == [(unit, TextEncoder.encode_broadcast(unit)) for unit in units]
+    plan.thread.join(5)
+    assert not plan.thread.is_alive()
+
+def test_per_char_units_use_the_grapheme_cache():
+    TextEncoder.encode_grapheme.cache_clear()
+    units = ["a", "b", "\U0001f44d\U0001f3fd"] * 100
+    assert [command for unit, command in CommandPlan(units, per_char=True)] == [
+        TextEncoder.encode_broadcast(unit) for unit in units
+    ]
+    info = TextEncoder.encode_grapheme.cache_info()
+    assert (info.misses, info.hits) == (3, 297)
+
+def test_a_producer_error_is_raised_after_the_units_before_it():
+    def units():
+        yield "one"
+        yield "two"
+        raise OSError("read failed")
+
+    pairs = []
+    with pytest.raises(OSError, match="read failed"):
+        for pair in CommandPlan(units()):
+            pairs.append(pair)
+    assert [unit for unit, command in pairs] == ["one", "two"]
+
+def test_close_stops_a_producer_waiting_for_room():
+    pulled = itertools.count()
+    units = (f"unit {next(pulled)}" for _ in itertools.repeat(None))
+    plan = CommandPlan(units, ahead=PLAN_BATCH)
+    for pair in plan:
+        break
+    plan.close()
+    plan.thread.join(5)
+    assert not plan.thread.is_alive()
+    assert next(pulled) <= PLAN_BATCH * 4
+
+def test_encoding_is_timed_per_unit():
+    metrics = Metrics()
+    list(CommandPlan(["x"] * 10, metrics=metrics, serial="fake-01"))
+    assert metrics.stage_totals()["encode"][0] == 10
+
+def test_a_stopped_send_leaves_no_producer_behind(server, client, monkeypatch):
+    plans = []
+
+    class RecordedPlan(CommandPlan):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            plans.append(self)
+
+    monkeypatch.setattr(fanout_module, "CommandPlan", RecordedPlan)
+    server.devices["fake-01"].broadcast_delay = 0.01
+    shell = PersistentAdbShell("fake-01", client=client)
+    fanout = FanOutSender({"fake-01": shell}, delay_range=(0, 0))
+
+    def stop_after_a_few(result):
+        if result.sent_chars >= 5:
+            fanout.stop()
+
+    fanout.on_progress = stop_after_a_few
+    try:
+        result = fanout.run("s" * 5000)["fake-01"]
+    finally:
+        shell.close()
+    assert result.stopped and 5 <= result.sent_chars < 5000
+    [plan] = plans
+    plan.thread.join(5)
+    assert not plan.thread.is_alive()
@@ -0,0 +1,39 @@
+import pytest
+
+from autoinput import SendEstimate, TextPages
+
+def test_pages_end_after_a_newline_and_join_to_the_text():
+    text = "".join(f"line {i:05d} of the preview\n" for i in range(5000))
+    pages = TextPages(text, page_chars=1000)
+    assert len(pages) > 100
+    assert "".join(pages.page(i) for i in range(len(pages))) == text
+    assert all(pages.page(i).endswith("\n") and len(pages.page(i)) <= 1000 for i in range(len(pages)))
+
+def test_pages_without_newlines_are_cut_between_graphemes():
+    text = "\U0001f44d\U0001f3fd" * 3000
+    pages = TextPages(text, page_chars=999)
+    assert "".join(pages.page(i) for i in range(len(pages))) == text
+    assert all(len(pages.page(i)) % 2 == 0 for i in range(len(pages)))
+
+def test_span_gives_the_character_offsets_of_a_page():
+    pages = TextPages("a" * 250, page_chars=100)
+    assert [pages.span(i) for i in range(len(pages))] == [(0, 100), (100, 200), (200, 250)]
+
+def test_a_short_text_is_one_page():
+    pages = TextPages("short")
+    assert len(pages) == 1 and pages.page(0) == "short"
+
+def test_estimate_counts_broadcasts_per_mode():
+    text = "\u00e9" * 10 + " word" * 200
+    estimate = SendEstimate(text, chunk_size=100, delay_range=(100, 100), round_trip=0.01)
+    assert estimate.chars == 1010
+    assert estimate.graphemes == 1010
+    assert estimate.broadcasts[None] == 1010
+    assert estimate.broadcasts["chars"] == 11
+    assert estimate.broadcasts["push"] == 1
+    assert estimate.seconds[None] == pytest.approx(1010 * 0.1)
+    assert estimate.seconds["chars"] == pytest.approx(11 * 0.01)
+    assert estimate.describe("push").startswith("1 broadcast, about 0.0 s")
+
+def test_format_seconds():
+    assert [SendEstimate.format_seconds(s) for s in (5, 90, 7200)] == ["5.0 s", "1.5 min", "2.0 h"]
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from fake_receiver import FakeReceiverTransport, SequencedReceiver
+
+from autoinput import FanOutSender, PersistentAdbShell, WindowedSender, parse_ack
+
+CHUNKS = [f"chunk {i:03d} " for i in range(200)]
+
+def test_parse_ack():
+    ack = parse_ack('Broadcast completed: result=-1, data="ACK ab12cd34 7 8"')
+    assert (ack.kind, ack.session, ack.seq, ack.next) == ("ACK", "ab12cd34", 7, 8)
+    assert parse_ack('Broadcast completed: result=0').kind is None
+    assert parse_ack("Broadcasting: Intent { act=ADB_INPUT_SEQ }") is None
+
+def test_receiver_commits_in_order_and_drops_repeats():
+    receiver = SequencedReceiver()
+    assert receiver.receive("s", 1, "b") == "ACK s 1 0"
+    assert receiver.receive("s", 0, "a") == "ACK s 0 2"
+    assert receiver.receive("s", 0, "a") == "ACK s 0 2"
+    assert receiver.text == "ab"
+    assert receiver.receive("s", 2 + SequencedReceiver.MAX_PENDING, "z").startswith("BUSY")
+
+@pytest.mark.parametrize("link", [
+    {},
+    {"drop_rate": 0.1},
+    {"ack_drop_rate": 0.1},
+    {"duplicate_rate": 0.2},
+    {"jitter": 0.01},
+    {"drop_rate": 0.05, "ack_drop_rate": 0.05, "duplicate_rate": 0.1, "jitter": 0.005},
+], ids=["clean", "lost", "lost acks", "duplicated", "reordered", "everything"])
+def test_windowed_sender_delivers_exactly_once_over_a_lossy_link(link):
+    transport = FakeReceiverTransport(seed=1, **link)
+    stats = asyncio.run(WindowedSender(transport, window=16, ack_timeout=0.05, max_retries=20).deliver(CHUNKS))
+    assert transport.receiver.text == "".join(CHUNKS)
+    assert stats.chunks == len(CHUNKS)
+    assert stats.max_in_flight <= 16
+
+def test_fanout_sends_acknowledged_chunks_through_the_fake_device(server, client):
+    text = "".join(CHUNKS)
+    shells = {serial: PersistentAdbShell(serial, client=client) for serial in server.devices}
+    try:
+        results = FanOutSender(shells, chunk_mode="chars", chunk_size=50, ack_window=8).run(text)
+    finally:
+        for shell in shells.values():
+            shell.close()
+    for serial, result in results.items():
+        assert result.completed and result.error is None
+        assert result.delivery.chunks == len(text) // 50
+        assert server.devices[serial].text == text
@@ -0,0 +1,40 @@
+from autoinput import AdbClient, AdbError, FanOutSender, PersistentAdbShell, ProtocolError
+
+TEXT = "A whole book, pushed as a file.\n" * 500
+
+class BroadcastFailsClient(AdbClient):
+    """Loses the connection on the ADB_INPUT_FILE broadcast, after the push went through."""
+
+    def shell(self, command, serial=None):
+        if "ADB_INPUT_FILE" in command:
+            raise AdbError("adb server closed the connection")
+        return super().shell(command, serial)
+
+def push(server, client, serial="fake-01"):
+    shell = PersistentAdbShell(serial, client=client)
+    try:
+        return FanOutSender({serial: shell}, chunk_mode="push").run(TEXT)[serial]
+    finally:
+        shell.close()
+
+def test_pushed_file_is_typed_and_removed(server, client):
+    result = push(server, client)
+    device = server.devices["fake-01"]
+    assert result.completed
+    assert (result.sent_chars, result.sent_bytes) == (len(TEXT), len(TEXT.encode("utf-8")))
+    assert device.text == TEXT
+    assert device.files == {}
+
+def test_staged_file_is_removed_when_adbkeyboard_cannot_type_it(server, client):
+    device = server.devices["fake-01"]
+    device.broadcast = lambda args: "Broadcast completed: result=0\n"  # An ADBKeyboard without ADB_INPUT_FILE
+    result = push(server, client)
+    assert isinstance(result.error, ProtocolError)
+    assert device.files == {}
+
+def test_staged_file_is_removed_when_the_broadcast_fails(server):
+    result = push(server, BroadcastFailsClient(port=server.port, timeout=5.0))
+    device = server.devices["fake-01"]
+    assert isinstance(result.error, AdbError)
+    assert device.text == ""
+    assert device.files == {}
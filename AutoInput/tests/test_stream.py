@@ -0,0 +1,40 @@
+import io
+import unicodedata
+
+import pytest
+
+from autoinput import TextChunker, TextSource
+from autoinput.stream import MAX_PENDING_BLOCKS
+
+BLOCK_SIZE = 1024
+
+def stream_pieces(text, block_size=BLOCK_SIZE):
+    return list(TextSource(io.BytesIO(text.encode("utf-8")), block_size))
+
+def test_pieces_join_to_the_normalized_text():
+    text = "Café 世界 \U0001f44d\U0001f3fd\n" * 2000
+    pieces = stream_pieces(text)
+    assert len(pieces) > 1
+    assert "".join(pieces) == unicodedata.normalize("NFC", text)
+
+@pytest.mark.parametrize("text", [
+    "a" + "\u0301" * 50000,
+    "\U0001f1fa\U0001f1f8" * 20000,
+    "\U0001f468\u200d" * 20000 + "\U0001f467",
+], ids=["combining marks", "flags", "zwj sequence"])
+def test_text_without_safe_cuts_is_held_back_only_up_to_the_cap(text):
+    pieces = stream_pieces(text)
+    assert max(len(piece) for piece in pieces) <= (MAX_PENDING_BLOCKS + 1) * BLOCK_SIZE
+    assert "".join(pieces) == unicodedata.normalize("NFC", text)
+
+def test_flags_stay_paired_when_cut_without_a_safe_boundary():
+    pieces = stream_pieces("\U0001f1fa\U0001f1f8" * 20000)
+    assert all(len(piece) % 2 == 0 for piece in pieces)
+
+@pytest.mark.parametrize("mode", TextChunker.MODES)
+def test_streamed_chunks_fit_the_byte_budget(mode):
+    chunker = TextChunker(400, mode, max_command_length=600)
+    text = ("世界" * 150 + " word\n") * 50
+    chunks = list(chunker.stream_chunks(stream_pieces(text, block_size=97)))
+    assert "".join(chunks) == text
+    assert all(len(chunk.encode("utf-8")) <= chunker.max_bytes for chunk in chunks)
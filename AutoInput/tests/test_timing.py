@@ -0,0 +1,97 @@
+import random
+import threading
+
+import pytest
+
+from autoinput import (
+    BigramTiming,
+    DeadlineScheduler,
+    FanOutSender,
+    LogNormalTiming,
+    PersistentAdbShell,
+    UniformTiming,
+    make_timing_model,
+)
+
+class FakeClock:
+    """A monotonic clock that only moves when a test or a wait moves it; also the stop event."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.waits = []
+
+    def __call__(self):
+        return self.now
+
+    def is_set(self):
+        return False
+
+    def wait(self, seconds):
+        self.waits.append(seconds)
+        self.now += seconds
+        return False
+
+class FixedTiming:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def interval(self, previous, char):
+        return self.seconds
+
+@pytest.mark.parametrize("model", [UniformTiming, LogNormalTiming])
+def test_intervals_stay_within_the_delay_range(model):
+    timing = model(40, 120, rng=random.Random(3))
+    intervals = [timing.interval("a", "b") for _ in range(2000)]
+    assert 0.040 <= min(intervals) and max(intervals) <= 0.120
+
+def test_a_seeded_model_repeats_its_delays():
+    first, second = (make_timing_model("lognormal", (50, 150), rng=random.Random(7)) for _ in range(2))
+    assert [first.interval("a", "b") for _ in range(50)] == [second.interval("a", "b") for _ in range(50)]
+
+def test_bigram_timing_uses_the_table_and_slows_down_after_breaks():
+    timing = BigramTiming(FixedTiming(0.1), {"th": 80.0}, jitter=0.0)
+    assert timing.interval("t", "h") == pytest.approx(0.080)
+    assert timing.interval(".", "T") == pytest.approx(0.2)
+    assert timing.interval("e", "e") == pytest.approx(0.07)
+
+def test_unknown_timing_model_is_rejected():
+    with pytest.raises(ValueError, match="Unknown timing model"):
+        make_timing_model("gaussian")
+
+def test_scheduler_counts_the_round_trip_towards_the_interval():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(FixedTiming(0.1), clock=clock)
+    assert scheduler.wait("a", clock)
+    clock.now += 0.03  # The send of "a" took 30 ms
+    assert scheduler.wait("b", clock)
+    assert clock.waits == [pytest.approx(0.07)]
+    assert scheduler.drift.actuals == [pytest.approx(0.1)]
+    assert scheduler.drift.late == 0
+
+def test_scheduler_does_not_burst_after_an_overrun():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(FixedTiming(0.1), clock=clock)
+    scheduler.wait("a", clock)
+    clock.now += 0.35  # A slow send overran three intervals
+    assert scheduler.wait("b", clock)
+    assert scheduler.drift.late == 1
+    assert scheduler.wait("c", clock)
+    assert clock.waits == [pytest.approx(0.1)]
+
+def test_scheduler_stops_while_waiting():
+    stop = threading.Event()
+    stop.set()
+    scheduler = DeadlineScheduler(FixedTiming(0.1))
+    assert not scheduler.wait("a", stop)
+    assert not scheduler.wait("b", stop)
+
+def test_per_character_send_follows_the_timing_model(server, client):
+    shell = PersistentAdbShell("fake-01", client=client)
+    try:
+        results = FanOutSender({"fake-01": shell}, timing=FixedTiming(0.005)).run("paced")
+    finally:
+        shell.close()
+    drift = results["fake-01"].timing
+    assert server.devices["fake-01"].text == "paced"
+    assert drift.targets == [0.005] * 4
+    assert all(actual >= 0.004 for actual in drift.actuals)
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from autoinput import FanOutSender, PersistentAdbShell, SendRecorder, TraceReplayer, load_trace
+
+class ScriptedShell:
+    """Answers every command with the next status, 0 once they run out."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.commands = []
+
+    def run(self, command):
+        self.commands.append(command)
+        return (self.statuses.pop(0) if self.statuses else 0), ""
+
+def shells(client, *serials):
+    return {serial: PersistentAdbShell(serial, client=client) for serial in serials}
+
+def close(opened):
+    for shell in opened.values():
+        shell.close()
+
+def test_a_recorded_send_replays_to_the_same_text(server, client, tmp_path):
+    path = str(tmp_path / "send.jsonl")
+    recorder = SendRecorder(path, mode="chars")
+    source = shells(client, "fake-01")
+    try:
+        fanout = FanOutSender(source, chunk_mode="chars", chunk_size=4, recorder=recorder)
+        assert fanout.run("recorded text, ")["fake-01"].completed
+        assert fanout.run_keys("then keys{TAB}and more{ENTER}")["fake-01"].completed
+    finally:
+        close(source)
+        recorder.close()
+    header, events = load_trace(path)
+    assert header["mode"] == "chars"
+    assert any("unit" in event for event in events) and any("command" in event for event in events)
+    target = shells(client, "fake-02")
+    try:
+        results = TraceReplayer(events, target, targets={"fake-01": ["fake-02"]}, speed=None).run()
+    finally:
+        close(target)
+    assert results["fake-02"].sent == len(events) and results["fake-02"].error is None
+    assert server.devices["fake-02"].text == server.devices["fake-01"].text == "recorded text, then keys\tand more\n"
+
+def test_failed_attempts_are_left_out_of_the_events(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    recorder = SendRecorder(str(path))
+    recorder.record("a", recorder.started + 0.2, 0.01, unit="late")
+    recorder.record("a", recorder.started + 0.1, error=OSError("refused"), unit="early")
+    recorder.record("a", recorder.started + 0.1, 0.01, unit="early")
+    recorder.close()
+    header, events = load_trace(str(path))
+    assert header["trace"] == 1
+    assert [event["unit"] for event in events] == ["early", "late"]
+
+def test_other_files_are_not_traces(tmp_path):
+    path = tmp_path / "other.jsonl"
+    path.write_text(json.dumps({"hello": 1}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="not an AutoInput trace"):
+        load_trace(str(path))
+    path.write_text("", encoding="utf-8")
+    with pytest.raises(ValueError, match="empty"):
+        load_trace(str(path))
+
+def test_one_device_drives_several_targets_and_refusals_are_counted():
+    events = [{"t": 1.0 + i / 10, "serial": "rec", "unit": unit} for i, unit in enumerate(["ab", "c", "de"])]
+    targets = {"x": ScriptedShell(), "y": ScriptedShell([0, 1])}
+    results = TraceReplayer(events, targets, targets={"rec": ["x", "y"]}, speed=None).run()
+    assert (results["x"].sent, results["x"].sent_chars, results["x"].errors) == (3, 5, 0)
+    assert (results["y"].sent, results["y"].sent_chars, results["y"].errors) == (2, 4, 1)
+    assert len(targets["y"].commands) == 3
+
+def test_events_go_out_at_their_recorded_time_divided_by_speed():
+    events = [{"t": 5.0, "serial": "a", "unit": "x"}, {"t": 5.4, "serial": "a", "unit": "y"}]
+    result = TraceReplayer(events, {"a": ScriptedShell()}, speed=2.0).run()["a"]
+    assert result.sent == 2
+    assert 0.2 <= result.elapsed < 1.0
+
+def test_a_replay_can_be_recorded(tmp_path):
+    path = str(tmp_path / "replay.jsonl")
+    recorder = SendRecorder(path, replay=True)
+    events = [{"t": 0.0, "serial": "a", "unit": "x"}, {"t": 0.0, "serial": "a", "command": "input keyevent 66"}]
+    TraceReplayer(events, {"a": ScriptedShell([0, 1])}, speed=None, recorder=recorder).run()
+    recorder.close()
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]["replay"] is True
+    assert [("unit" in line, "error" in line) for line in lines[1:]] == [(True, False), (False, True)]